@@ -0,0 +1,91 @@
+import csv, io, os
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from .storage import get_storage
+
+# Admin user directory: search, keyset pages and CSV export, read straight from storage.
+# - Search matches the start of email, login_id or name (ASCII case-insensitive) through
+#   prefix indexes, so a page costs about the same at 100 or 100k users.
+# - Pages are keyset (email > last email of the previous page), never offset, so deep pages
+#   don't rescan everything before them.
+# - Exports walk the same keyset in EXPORT_BATCH rows and stream one CSV chunk per batch;
+#   memory stays at one batch whatever the table size.
+#
+# Supabase indexes (a btree can't serve ilike; trigram GIN indexes serve prefix ilike):
+# create extension if not exists pg_trgm;
+# create index if not exists app_users_email_trgm on app_users using gin (email gin_trgm_ops);
+# create index if not exists app_users_login_trgm on app_users using gin (login_id gin_trgm_ops);
+# create index if not exists app_users_name_trgm on app_users using gin (name gin_trgm_ops);
+
+ADMIN_PAGE_SIZE = int(os.getenv("ADMIN_PAGE_SIZE", "100"))
+EXPORT_BATCH = int(os.getenv("ADMIN_EXPORT_BATCH", "1000"))
+MAX_QUERY_LEN = 100
+
+USER_CSV_COLUMNS = ("id", "email", "login_id", "name", "role", "email_verified", "created_at", "status", "plan", "active_until")
+SUBSCRIPTION_CSV_COLUMNS = ("id", "user_id", "email", "plan", "status", "current_period_end", "created_at")
+
+def _status(row: Dict[str, Any], now_iso: str) -> str:
+    until = row.get("active_until")
+    if not until:
+        return "none"
+    return "active" if str(until) > now_iso else "expired"
+
+async def search_users(q: Optional[str] = None, status: str = "active", after: Optional[str] = None,
+                       limit: int = ADMIN_PAGE_SIZE) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    One page of users ordered by email and the cursor for the next page (None on the last).
+    status='active' keeps entitled users only; 'all' lists everyone.
+    """
+    st = get_storage()
+    if not st:
+        return [], None
+    now_iso = datetime.now(timezone.utc).isoformat()
+    prefix = (q or "").strip()[:MAX_QUERY_LEN] or None
+    rows = await st.search_users(prefix, after or None, limit + 1, now_iso if status == "active" else None)
+    nxt = rows[limit - 1]["email"] if len(rows) > limit else None
+    rows = rows[:limit]
+    for r in rows:
+        r["status"] = _status(r, now_iso)
+    return rows, nxt
+
+async def user_batches(q: Optional[str] = None, status: str = "all") -> AsyncIterator[List[Dict[str, Any]]]:
+    after = None
+    while True:
+        rows, after = await search_users(q, status, after, EXPORT_BATCH)
+        if rows:
+            yield rows
+        if after is None:
+            return
+
+async def subscription_batches() -> AsyncIterator[List[Dict[str, Any]]]:
+    st = get_storage()
+    after = None
+    while st:
+        rows = await st.subscriptions_page(after, EXPORT_BATCH)
+        if rows:
+            yield rows
+        if len(rows) < EXPORT_BATCH:
+            return
+        after = rows[-1]["id"]
+
+def _cell(v: Any) -> str:
+    if v is None:
+        return ""
+    s = str(v)
+    # names are user input: keep spreadsheets from evaluating them as formulas
+    return "'" + s if s[:1] in ("=", "+", "-", "@", "\t", "\r") else s
+
+async def csv_stream(columns: Iterable[str], batches: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[str]:
+    """Header, then one CSV chunk per batch of rows."""
+    columns = list(columns)
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(columns)
+    yield buf.getvalue()
+    async for rows in batches:
+        buf.seek(0)
+        buf.truncate()
+        for r in rows:
+            w.writerow([_cell(r.get(c)) for c in columns])
+        yield buf.getvalue()
@@ -0,0 +1,118 @@
+import asyncio, importlib, os, time
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Dict, Optional
+
+from fastapi import FastAPI
+from starlette.applications import Starlette
+from starlette.routing import Mount, Router
+from starlette.types import ASGIApp, Receive, Scope, Send
+from loguru import logger
+
+# false: import every mounted app during startup instead of on first request / in the background
+LAZY_ROUTERS = os.getenv("LAZY_ROUTERS", "true").lower() == "true"
+# true: after startup, load the lazy apps in the background so users rarely pay for the import
+WARM_ROUTERS = os.getenv("WARM_ROUTERS", "true").lower() == "true"
+# heavy modules the mounted apps only import inside handlers (sklearn via the learner)
+WARM_IMPORTS = ("profitpilot.backend.self_learning",)
+
+class LazyApp:
+    """
+    ASGI app that imports its target ("module:attr") on the first request.
+    The target may be an ASGI app, an APIRouter (wrapped in a bare FastAPI) or a factory
+    returning either. The import runs in a worker thread so the event loop keeps answering
+    /health meanwhile; the loaded app's own startup/shutdown handlers are run through `stack`.
+    """
+
+    def __init__(self, target: str, stack: AsyncExitStack):
+        self.target = target
+        self.stack = stack
+        self.app: Optional[ASGIApp] = None
+        self.load_seconds: Optional[float] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _build(self) -> ASGIApp:
+        module, _, attr = self.target.partition(":")
+        obj = getattr(importlib.import_module(module), attr)
+        if not isinstance(obj, (Starlette, Router)):
+            obj = obj()  # factory
+        if isinstance(obj, Router):
+            app = FastAPI(docs_url=None, redoc_url=None, openapi_url=None)
+            app.include_router(obj)
+            obj = app
+        return obj
+
+    async def load(self) -> ASGIApp:
+        if self.app is not None:
+            return self.app
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self.app is None:
+                t0 = time.perf_counter()
+                app = await asyncio.to_thread(self._build)
+                router = getattr(app, "router", None)
+                if router is not None and hasattr(router, "lifespan_context"):
+                    await self.stack.enter_async_context(router.lifespan_context(app))
+                self.load_seconds = time.perf_counter() - t0
+                logger.info("loaded {} in {:.2f}s", self.target, self.load_seconds)
+                self.app = app
+        return self.app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        app = self.app or await self.load()
+        await app(scope, receive, send)
+
+def create_app() -> FastAPI:
+    """
+    Single entry point for the service:
+      /api/*       trading API (profitpilot.backend.main)
+      /webhooks/*  webhook receiver
+      /*           web UI (backend.web)
+    /health is answered here without importing any of them, so the platform health check
+    passes as soon as the port is bound. Each mount is imported on first use (or by the
+    background warm-up started from the lifespan hook).
+    """
+    stack = AsyncExitStack()
+    lazy: Dict[str, LazyApp] = {
+        "api": LazyApp("profitpilot.backend.main:app", stack),
+        "webhooks": LazyApp("profitpilot.backend.routes.webhooks:router", stack),
+        "web": LazyApp("backend.web:create_web_app", stack),
+    }
+    # web first: it serves the landing page and owns the bcrypt pool / outbox warm-up
+    warm_order = ("web", "api", "webhooks")
+
+    async def _load_all():
+        for name in warm_order:
+            await lazy[name].load()
+        for module in WARM_IMPORTS:
+            await asyncio.to_thread(importlib.import_module, module)
+
+    async def _warm():
+        try:
+            await _load_all()
+        except Exception:
+            logger.exception("background warm-up failed; the rest loads on first request")
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        task = None
+        async with stack:
+            if not LAZY_ROUTERS:
+                await _load_all()
+            elif WARM_ROUTERS:
+                task = asyncio.create_task(_warm())
+            yield
+            if task is not None and not task.done():
+                task.cancel()
+
+    app = FastAPI(title="ProfitPilotAI", version="0.1", docs_url=None, redoc_url=None, openapi_url=None, lifespan=lifespan)
+    app.state.lazy = lazy
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", "service": "profitpilotai", "loaded": {k: v.app is not None for k, v in lazy.items()}}
+
+    app.router.routes.append(Mount("/api", app=lazy["api"]))
+    app.router.routes.append(Mount("/webhooks", app=lazy["webhooks"]))
+    app.router.routes.append(Mount("", app=lazy["web"]))
+    return app
@@ -3,7 +3,9 @@ from datetime import datetime, timedelta, timezone
 from typing import Optional, Tuple, Dict, Any
 from passlib.hash import bcrypt
 from loguru import logger
-from .supabase_utils import get_client, get_user_by_login_or_email
+from .supabase_utils import get_user_by_login_or_email, invalidate_user
+from .storage import get_storage
+from .passwords import hash_password, PasswordPoolBusy
 
 TOKEN_TTL_HOURS = int(os.getenv("TOKEN_TTL_HOURS", "24"))
 SITE_BASE = os.getenv("SITE_BASE", "http://localhost:8000")
@@ -17,14 +19,14 @@ def verify_pwd(p: str, h: str) -> bool:
     except Exception:
         return False
 
-def create_user(name: str, address: str, login_id: str, email: str, password: str) -> Tuple[bool, str]:
-    sb = get_client()
-    if not sb: return False, "Supabase not configured"
+async def create_user(name: str, address: str, login_id: str, email: str, password: str) -> Tuple[bool, str]:
+    st = get_storage()
+    if not st: return False, "Storage not configured"
+    pw = await hash_password(password)  # PasswordPoolBusy propagates to the route
     try:
-        pw = hash_pwd(password)
         token = secrets.token_urlsafe(32)
         exp = datetime.now(timezone.utc) + timedelta(hours=TOKEN_TTL_HOURS)
-        resp = sb.table("app_users").insert({
+        await st.insert_user({
             "name": name,
             "address": address,
             "login_id": login_id,
@@ -32,61 +34,85 @@ def create_user(name: str, address: str, login_id: str, email: str, password: st
             "password_hash": pw,
             "verify_token": token,
             "verify_expires": exp.isoformat(),
-        }).execute()
+        })
+        invalidate_user(email, login_id)
         return True, token
     except Exception as e:
         logger.exception("create_user failed")
         return False, str(e)
 
-def verify_email_token(token: str) -> bool:
-    sb = get_client()
-    if not sb: return False
+async def verify_email_token(token: str) -> bool:
+    st = get_storage()
+    if not st: return False
     try:
         now = datetime.now(timezone.utc).isoformat()
-        u = sb.table("app_users").select("*").eq("verify_token", token).single().execute().data
+        u = await st.get_user("verify_token", token)
         if not u or (u.get("verify_expires") and u["verify_expires"] < now):
             return False
-        sb.table("app_users").update({"email_verified": True, "verify_token": None, "verify_expires": None}).eq("id", u["id"]).execute()
+        await st.update_user(u["id"], {"email_verified": True, "verify_token": None, "verify_expires": None})
+        invalidate_user(u)
         return True
     except Exception:
         return False
 
-def start_password_reset(login_or_email: str) -> Optional[str]:
-    sb = get_client()
-    if not sb: return None
+async def start_password_reset(login_or_email: str) -> Optional[str]:
+    st = get_storage()
+    if not st: return None
     try:
-        u = get_user_by_login_or_email(login_or_email)
+        u = await get_user_by_login_or_email(login_or_email)
         if not u: return None
         token = secrets.token_urlsafe(32)
         exp = (datetime.now(timezone.utc) + timedelta(hours=TOKEN_TTL_HOURS)).isoformat()
-        sb.table("app_users").update({"reset_token": token, "reset_expires": exp}).eq("id", u["id"]).execute()
+        await st.update_user(u["id"], {"reset_token": token, "reset_expires": exp})
+        invalidate_user(u)
         return token
     except Exception:
         return None
 
-def finish_password_reset(token: str, new_password: str) -> bool:
-    sb = get_client()
-    if not sb: return False
+async def finish_password_reset(token: str, new_password: str) -> bool:
+    st = get_storage()
+    if not st: return False
     try:
         now = datetime.now(timezone.utc).isoformat()
-        u = sb.table("app_users").select("*").eq("reset_token", token).single().execute().data
+        u = await st.get_user("reset_token", token)
         if not u or (u.get("reset_expires") and u["reset_expires"] < now):
             return False
-        sb.table("app_users").update({
-            "password_hash": hash_pwd(new_password),
+        pw = await hash_password(new_password)
+        await st.update_user(u["id"], {
+            "password_hash": pw,
             "reset_token": None,
             "reset_expires": None
-        }).eq("id", u["id"]).execute()
+        })
+        invalidate_user(u)
+        return True
+    except PasswordPoolBusy:
+        raise
+    except Exception:
+        return False
+
+async def update_password_hash(user: Dict[str, Any], new_hash: str) -> bool:
+    """Store a new hash for an existing password (cost-factor migration on login)."""
+    st = get_storage()
+    if not st: return False
+    try:
+        await st.update_user(user["id"], {"password_hash": new_hash})
+        invalidate_user(user)
         return True
     except Exception:
         return False
 
+async def rehash_password(user: Dict[str, Any], password: str) -> None:
+    try:
+        await update_password_hash(user, await hash_password(password))
+    except PasswordPoolBusy:
+        pass  # try again on a later login
+
 
 # --- shims for legacy imports (main.py expects these here) ---
 from .supabase_utils import get_user_by_email as _sb_get_user_by_email, set_role_admin as _sb_set_role_admin
 
-def get_user_by_email(email: str):
-    return _sb_get_user_by_email(email)
+async def get_user_by_email(email: str):
+    return await _sb_get_user_by_email(email)
 
-def set_role_admin(email: str) -> bool:
-    return _sb_set_role_admin(email)
+async def set_role_admin(email: str) -> bool:
+    return await _sb_set_role_admin(email)
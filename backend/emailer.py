@@ -1,5 +1,8 @@
-import os, smtplib, ssl
+import os, re, smtplib, socket, ssl, time
 from email.mime.text import MIMEText
+from typing import Optional
+
+from profitpilot.backend.metrics import OP_SECONDS, timed
 
 SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
 SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
@@ -7,21 +10,131 @@ SMTP_USER = os.getenv("SMTP_USER")
 SMTP_PASS = os.getenv("SMTP_PASS")
 SMTP_FROM = os.getenv("SMTP_FROM", SMTP_USER or "")
 SMTP_TLS  = os.getenv("SMTP_TLS", "true").lower() == "true"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "20"))
+SMTP_IDLE = float(os.getenv("SMTP_IDLE", "60"))  # drop a pooled session unused for this long
 
-def send_email(to_email: str, subject: str, html_body: str) -> bool:
-    if not (SMTP_HOST and SMTP_PORT and SMTP_USER and SMTP_PASS and SMTP_FROM):
-        return False
+def smtp_configured() -> bool:
+    return bool(SMTP_HOST and SMTP_PORT and SMTP_USER and SMTP_PASS and SMTP_FROM)
+
+def build_message(to_email: str, subject: str, html_body: str) -> str:
     msg = MIMEText(html_body, "html", "utf-8")
     msg["From"] = SMTP_FROM
     msg["To"] = to_email
     msg["Subject"] = subject
-    try:
-        context = ssl.create_default_context()
-        with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=20) as server:
+    return msg.as_string()
+
+class NotDelivered(Exception):
+    """Connecting, logging in or the envelope failed in transport: nothing was handed over."""
+
+class DeliveryUnknown(Exception):
+    """The connection failed after the message body went out: the server may have accepted it."""
+
+def _data_payload(message: str) -> bytes:
+    # what smtplib.sendmail sends after DATA: CRLF line ends, dot-stuffed, terminated by "."
+    body = re.sub(r"(?:\r\n|\n|\r(?!\n))", "\r\n", message).encode("ascii")
+    body = re.sub(rb"(?m)^\.", b"..", body)
+    if not body.endswith(b"\r\n"):
+        body += b"\r\n"
+    return body + b".\r\n"
+
+class SMTPSession:
+    """
+    One authenticated SMTP connection reused across messages (STARTTLS + login once).
+    Reconnects transparently if the server dropped it or it sat idle past SMTP_IDLE.
+    Not thread-safe; the outbox worker owns one.
+
+    send() tracks how far a message got, so callers can tell what is safe to retry:
+    NotDelivered (nothing sent), an SMTP reply error (SMTPResponseException /
+    SMTPRecipientsRefused, 4xx temporary, 5xx permanent), or DeliveryUnknown (lost after the
+    body was sent; retrying could deliver it twice).
+    """
+
+    def __init__(self):
+        self._server: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+
+    @timed(OP_SECONDS, "smtp_connect")
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+        try:
             if SMTP_TLS:
-                server.starttls(context=context)
+                server.starttls(context=ssl.create_default_context())
             server.login(SMTP_USER, SMTP_PASS)
-            server.sendmail(SMTP_FROM, [to_email], msg.as_string())
+        except Exception:
+            server.close()
+            raise
+        return server
+
+    def _get(self) -> smtplib.SMTP:
+        if self._server is not None and time.monotonic() - self._last_used > SMTP_IDLE:
+            self.close()
+        if self._server is None:
+            try:
+                self._server = self._connect()
+            except (OSError, smtplib.SMTPException) as e:
+                raise NotDelivered(f"connect: {e!r}") from e
+        return self._server
+
+    @staticmethod
+    def _envelope(server: smtplib.SMTP, to_email: str) -> None:
+        server.ehlo_or_helo_if_needed()
+        code, resp = server.mail(SMTP_FROM)
+        if code != 250:
+            server.rset()
+            raise smtplib.SMTPSenderRefused(code, resp, SMTP_FROM)
+        code, resp = server.rcpt(to_email)
+        if code not in (250, 251):
+            server.rset()
+            raise smtplib.SMTPRecipientsRefused({to_email: (code, resp)})
+
+    @timed(OP_SECONDS, "smtp_send")
+    def send(self, to_email: str, subject: str, html_body: str) -> None:
+        """Raises NotDelivered, an SMTP reply error or DeliveryUnknown (see the class doc)."""
+        payload = _data_payload(build_message(to_email, subject, html_body))
+        server = self._get()
+        try:
+            try:
+                self._envelope(server, to_email)
+            except (smtplib.SMTPServerDisconnected, ConnectionError, socket.timeout):
+                # stale pooled connection; nothing handed over yet: one fresh attempt
+                self.close()
+                server = self._get()
+                self._envelope(server, to_email)
+            code, resp = server.docmd("data")
+        except OSError as e:
+            if isinstance(e, smtplib.SMTPException) and not isinstance(e, smtplib.SMTPServerDisconnected):
+                raise  # a server reply; the caller goes by its code
+            self.close()
+            raise NotDelivered(f"envelope: {e!r}") from e
+        if code != 354:
+            raise smtplib.SMTPDataError(code, resp)
+        try:
+            server.send(payload)
+            code, resp = server.getreply()
+        except OSError as e:
+            self.close()
+            raise DeliveryUnknown(f"after DATA: {e!r}") from e
+        if code != 250:
+            raise smtplib.SMTPDataError(code, resp)
+        self._last_used = time.monotonic()
+
+    def close(self) -> None:
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                self._server.close()
+            self._server = None
+
+def send_email(to_email: str, subject: str, html_body: str) -> bool:
+    """Synchronous one-off send. Request handlers should use outbox.enqueue instead."""
+    if not smtp_configured():
+        return False
+    session = SMTPSession()
+    try:
+        session.send(to_email, subject, html_body)
         return True
     except Exception:
         return False
+    finally:
+        session.close()
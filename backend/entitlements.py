@@ -0,0 +1,172 @@
+import asyncio, os, time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+from .cache import TTLCache
+from .storage import get_storage
+
+# Entitlements: one row per user (user_id -> active_until, plan) kept next to the append-only
+# subscriptions history, so access checks never sort that history or parse timestamps.
+# - Grants and IPN payments (supabase_utils._extend_subscription) upsert the row and write it
+#   through to this process's cache.
+# - Lookups are a dict hit on an epoch float: is_entitled(uid) is `until > time.time()`.
+#   Active entries stay cached for ENTITLEMENT_TTL (at most NEGATIVE_CACHE_TTL past their
+#   end); expired or missing ones are re-read
+#   (primary-key lookup) at most every NEGATIVE_CACHE_TTL, so a grant made by another worker
+#   shows up within that.
+# - The sweeper (one per worker, idempotent) runs every ENTITLEMENT_SWEEP seconds: it
+#   upserts rows that lag behind the active subscriptions (rows written outside the app, and
+#   the first run on existing data), marks ended subscriptions 'expired' in one statement, and
+#   preloads all active entitlements into the cache.
+#
+# Supabase table:
+# create table if not exists entitlements (
+#   user_id uuid primary key references app_users(id) on delete cascade,
+#   plan text not null default 'custom',
+#   active_until timestamptz not null,
+#   updated_at timestamptz not null default now()
+# );
+# create index if not exists entitlements_active_until on entitlements(active_until);
+# -- upsert that never moves active_until backwards (SupabaseStorage.upsert_entitlements)
+# create or replace function upsert_entitlements(rows jsonb) returns void language sql as $$
+#   insert into entitlements(user_id, plan, active_until, updated_at)
+#   select r.user_id, coalesce(r.plan, 'custom'), r.active_until, coalesce(r.updated_at, now())
+#   from jsonb_to_recordset(rows) as r(user_id uuid, plan text, active_until timestamptz, updated_at timestamptz)
+#   on conflict (user_id) do update set plan = excluded.plan, active_until = excluded.active_until,
+#     updated_at = excluded.updated_at
+#   where excluded.active_until >= entitlements.active_until;
+# $$;
+
+ENTITLEMENT_SWEEP = float(os.getenv("ENTITLEMENT_SWEEP", "60"))
+ENTITLEMENT_TTL = float(os.getenv("ENTITLEMENT_TTL", "300"))
+NEGATIVE_CACHE_TTL = float(os.getenv("NEGATIVE_CACHE_TTL", "10"))
+ENTITLEMENT_CACHE_SIZE = int(os.getenv("ENTITLEMENT_CACHE_SIZE", os.getenv("USER_CACHE_SIZE", "10000")))
+
+_CACHE = TTLCache(maxsize=ENTITLEMENT_CACHE_SIZE, ttl=ENTITLEMENT_TTL)  # uid -> entitlement dict
+_MISSING = object()
+
+def _epoch(iso: Any) -> float:
+    try:
+        dt = datetime.fromisoformat(str(iso).replace("Z", "+00:00"))
+    except (TypeError, ValueError):
+        return 0.0
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+def _entry(user_id: str, active_until: Any, plan: Optional[str]) -> Dict[str, Any]:
+    return {"user_id": user_id, "plan": plan, "active_until": str(active_until), "until": _epoch(active_until)}
+
+def remember(user_id: str, active_until: Any, plan: Optional[str]) -> Dict[str, Any]:
+    ent = _entry(user_id, active_until, plan)
+    # an entry that lapses while cached is kept NEGATIVE_CACHE_TTL past its end, like a miss
+    _CACHE.set(user_id, ent, ttl=min(ENTITLEMENT_TTL, max(ent["until"] - time.time(), 0.0) + NEGATIVE_CACHE_TTL))
+    return ent
+
+def forget(user_id: str) -> None:
+    _CACHE.pop(user_id)
+
+def clear() -> None:
+    _CACHE.clear()
+
+async def get_entitlement(user_id: str) -> Optional[Dict[str, Any]]:
+    """{user_id, plan, active_until (ISO), until (epoch)} or None; cached as described above."""
+    cached = _CACHE.get(user_id)
+    if cached is _MISSING:
+        return None
+    if cached is not None:
+        return cached
+    st = get_storage()
+    if not st:
+        return None
+    try:
+        row = await st.get_entitlement(user_id)
+        if row is None:
+            # not swept yet (data from before entitlements existed): fall back to the history once
+            sub = await st.latest_subscription(user_id)
+            if sub and sub.get("status") in (None, "", "active") and sub.get("current_period_end"):
+                row = {"user_id": user_id, "plan": sub.get("plan"), "active_until": sub["current_period_end"]}
+                await st.upsert_entitlements([dict(row, updated_at=datetime.now(timezone.utc).isoformat())])
+    except Exception:
+        return cached
+    if row is None:
+        _CACHE.set(user_id, _MISSING, ttl=NEGATIVE_CACHE_TTL)
+        return None
+    return remember(user_id, row["active_until"], row.get("plan"))
+
+async def is_entitled(user_id: str) -> bool:
+    ent = await get_entitlement(user_id)
+    return ent is not None and ent["until"] > time.time()
+
+async def record(st, user_id: str, active_until: datetime, plan: str) -> Dict[str, Any]:
+    """Store the user's new entitlement (after a grant/payment) and cache it."""
+    await st.upsert_entitlements([{
+        "user_id": user_id, "plan": plan, "active_until": active_until.isoformat(),
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+    }])
+    return remember(user_id, active_until.isoformat(), plan)
+
+async def sweep() -> Dict[str, int]:
+    st = get_storage()
+    if not st:
+        return {}
+    now_iso = datetime.now(timezone.utc).isoformat()
+    current = {r["user_id"]: r for r in await st.active_entitlements(now_iso)}
+    stale: Dict[str, Dict[str, Any]] = {}
+    for row in await st.active_subscriptions(now_iso):
+        uid, end = row.get("user_id"), row.get("current_period_end")
+        if not uid or not end:
+            continue
+        cur = current.get(uid)
+        if cur is None or _epoch(end) > _epoch(cur["active_until"]):
+            current[uid] = stale[uid] = {"user_id": uid, "plan": row.get("plan"), "active_until": str(end), "updated_at": now_iso}
+    if stale:
+        await st.upsert_entitlements(list(stale.values()))
+    expired = await st.expire_subscriptions(now_iso)
+    for row in current.values():
+        remember(row["user_id"], row["active_until"], row.get("plan"))
+    return {"rebuilt": len(stale), "expired_subscriptions": expired, "active": len(current)}
+
+class EntitlementSweeper:
+    def __init__(self, interval: float = ENTITLEMENT_SWEEP):
+        self.interval = interval
+        self.last: Dict[str, Any] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                t0 = time.perf_counter()
+                self.last = dict(await sweep(), seconds=time.perf_counter() - t0, at=time.time())
+            except Exception:
+                logger.exception("entitlement sweep failed")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+_SWEEPER: Optional[EntitlementSweeper] = None
+
+def get_sweeper() -> EntitlementSweeper:
+    global _SWEEPER
+    if _SWEEPER is None:
+        _SWEEPER = EntitlementSweeper()
+    return _SWEEPER
+
+async def active_entitlements() -> List[Dict[str, Any]]:
+    st = get_storage()
+    if not st:
+        return []
+    return await st.active_entitlements(datetime.now(timezone.utc).isoformat())
@@ -0,0 +1,209 @@
+import asyncio, os, time
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from .localdb import LocalDB
+from .supabase_utils import add_days_from_current_end
+
+# NOWPayments IPN inbox. The route verifies the signature, stores the event under the dedup
+# key (payment_id, status) and acks at once; retried deliveries hit the unique key and are
+# dropped. An asyncio worker (one per uvicorn worker, leases keep them apart) applies
+# entitlements afterwards. A payment extends the subscription at most once: a grant marker
+# per payment_id is taken before add_days_from_current_end, so "confirmed" followed by
+# "finished" (or a redelivery) cannot count twice. If the Supabase update fails the marker
+# is released and the event retried with backoff. A marker a crash leaves in 'applying' is
+# not retried automatically (at most once); stats() reports it as grants_applying.
+
+IPN_DB = os.getenv("IPN_DB", "data/ipn.db")
+IPN_PLAN_DAYS = int(os.getenv("IPN_PLAN_DAYS", "30"))
+IPN_MAX_ATTEMPTS = int(os.getenv("IPN_MAX_ATTEMPTS", "10"))
+IPN_BACKOFF = float(os.getenv("IPN_BACKOFF", "10"))
+IPN_LEASE = float(os.getenv("IPN_LEASE", "60"))
+IPN_POLL = float(os.getenv("IPN_POLL", "5"))
+
+GRANT_STATUSES = ("finished", "confirmed")
+
+_SCHEMA = """
+create table if not exists ipn_events (
+  id integer primary key autoincrement,
+  payment_id text not null,
+  status text not null,
+  order_id text,
+  payload text not null,
+  received real not null,
+  state text not null default 'pending',
+  attempts integer not null default 0,
+  next_attempt real not null,
+  lease_until real not null default 0,
+  last_error text,
+  processed_at real,
+  unique (payment_id, status)
+);
+create index if not exists ipn_events_due on ipn_events(state, next_attempt);
+create table if not exists ipn_grants (
+  payment_id text primary key,
+  state text not null,
+  order_id text,
+  event_id integer,
+  updated real not null
+);
+"""
+
+def email_from_order(order_id: str) -> Optional[str]:
+    return order_id[len("ppai-"):] if order_id and order_id.startswith("ppai-") else None
+
+class IPNQueue:
+    def __init__(self, path: str = IPN_DB, batch: int = 50):
+        self.db = LocalDB(path, _SCHEMA)
+        self.batch = batch
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # --- route side ---
+    def record(self, data: Dict[str, Any], raw: bytes) -> Tuple[int, bool]:
+        """Persist a verified IPN. Returns (event_id, is_new); redeliveries are not stored again."""
+        payment_id = str(data.get("payment_id") or data.get("invoice_id") or "")
+        status = str(data.get("payment_status") or "")
+        now = time.time()
+        c = self.db.conn()
+        cur = c.execute(
+            """
+            insert into ipn_events(payment_id, status, order_id, payload, received, next_attempt)
+            values (?, ?, ?, ?, ?, ?) on conflict(payment_id, status) do nothing
+            """,
+            (payment_id, status, data.get("order_id") or "", raw.decode("utf-8", "replace"), now, now),
+        )
+        if cur.rowcount:
+            if self._wake is not None:
+                self._wake.set()
+            return cur.lastrowid, True
+        row = c.execute("select id from ipn_events where payment_id = ? and status = ?", (payment_id, status)).fetchone()
+        return (row[0] if row else 0), False
+
+    def stats(self) -> Dict[str, int]:
+        c = self.db.conn()
+        out = {f"events_{r[0]}": r[1] for r in c.execute("select state, count(*) from ipn_events group by state")}
+        out.update({f"grants_{r[0]}": r[1] for r in c.execute("select state, count(*) from ipn_grants group by state")})
+        return out
+
+    # --- worker side ---
+    def claim(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        rows = self.db.conn().execute(
+            """
+            update ipn_events set lease_until = ?
+            where id in (
+              select id from ipn_events
+              where state = 'pending' and next_attempt <= ? and lease_until <= ?
+              order by id limit ?
+            )
+            returning id, payment_id, status, order_id, attempts
+            """,
+            (now + IPN_LEASE, now, now, self.batch),
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    def _finish(self, event_id: int, state: str, error: Optional[str] = None) -> None:
+        self.db.conn().execute(
+            "update ipn_events set state = ?, processed_at = ?, lease_until = 0, last_error = ? where id = ?",
+            (state, time.time(), error, event_id),
+        )
+
+    def _retry(self, ev: Dict[str, Any], error: str) -> None:
+        attempts = ev["attempts"] + 1
+        if attempts >= IPN_MAX_ATTEMPTS:
+            logger.error(f"ipn: giving up on payment {ev['payment_id']} ({ev['status']}): {error}")
+            self.db.conn().execute(
+                "update ipn_events set state = 'failed', attempts = ?, lease_until = 0, last_error = ? where id = ?",
+                (attempts, error, ev["id"]),
+            )
+            return
+        self.db.conn().execute(
+            "update ipn_events set attempts = ?, next_attempt = ?, lease_until = 0, last_error = ? where id = ?",
+            (attempts, time.time() + IPN_BACKOFF * (2 ** (attempts - 1)), error, ev["id"]),
+        )
+
+    def _take_grant(self, ev: Dict[str, Any]) -> bool:
+        cur = self.db.conn().execute(
+            "insert into ipn_grants(payment_id, state, order_id, event_id, updated) values (?, 'applying', ?, ?, ?) "
+            "on conflict(payment_id) do nothing",
+            (ev["payment_id"], ev["order_id"], ev["id"], time.time()),
+        )
+        return cur.rowcount == 1
+
+    def _set_grant(self, payment_id: str, state: Optional[str]) -> None:
+        c = self.db.conn()
+        if state is None:
+            c.execute("delete from ipn_grants where payment_id = ?", (payment_id,))
+        else:
+            c.execute("update ipn_grants set state = ?, updated = ? where payment_id = ?", (state, time.time(), payment_id))
+
+    async def process(self, ev: Dict[str, Any]) -> None:
+        if ev["status"] not in GRANT_STATUSES:
+            self._finish(ev["id"], "ignored")
+            return
+        email = email_from_order(ev["order_id"])
+        if not email or not ev["payment_id"]:
+            self._finish(ev["id"], "failed", "no email/payment_id")
+            return
+        if not self._take_grant(ev):
+            self._finish(ev["id"], "duplicate")
+            return
+        try:
+            new_end = await add_days_from_current_end(email, days=IPN_PLAN_DAYS)
+        except Exception as e:
+            new_end, err = None, repr(e)
+        else:
+            err = "add_days_from_current_end returned None"
+        if new_end:
+            self._set_grant(ev["payment_id"], "done")
+            self._finish(ev["id"], "applied")
+        else:
+            self._set_grant(ev["payment_id"], None)
+            self._retry(ev, err)
+
+    async def drain_once(self) -> int:
+        events = self.claim()
+        for ev in events:
+            try:
+                await self.process(ev)
+            except Exception as e:
+                logger.exception("ipn worker error")
+                self._retry(ev, repr(e))
+        return len(events)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                while await self.drain_once() == self.batch:
+                    pass
+            except Exception:
+                logger.exception("ipn worker error")
+            try:
+                await asyncio.wait_for(self._wake.wait(), IPN_POLL)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+_QUEUE: Optional[IPNQueue] = None
+
+def get_ipn_queue() -> IPNQueue:
+    global _QUEUE
+    if _QUEUE is None:
+        _QUEUE = IPNQueue()
+    return _QUEUE
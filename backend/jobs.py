@@ -0,0 +1,186 @@
+import asyncio, math, os, time, uuid
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+from profitpilot.backend.scheduler import JobScheduler
+from .localdb import LocalDB
+from .entitlements import is_entitled
+from .storage import get_storage
+
+# Periodic strategy runs for subscribers, in process instead of external cron hitting /trade.
+# Jobs (user, strategy, symbol, interval) live in the strategy_jobs table. One process per
+# host holds a lease in SCHEDULER_DB and runs them on profitpilot's JobScheduler (timer heap,
+# fair queuing across users, bounded worker pool); the others only serve the /jobs routes.
+# Runs read prices from the tick engine, which only the tick-feed leader process runs, so
+# only that process competes for the lease. Jobs are limited to the feed's symbols
+# (DERIV_TICK_SYMBOLS); any other symbol would never have prices.
+# The leader re-reads the table every SCHEDULER_SYNC seconds, so jobs added through any
+# worker are picked up. A run is skipped while the user has no active entitlement (a cached
+# dict lookup, see entitlements.py).
+#
+# Supabase table:
+# create table if not exists strategy_jobs (
+#   id uuid primary key default gen_random_uuid(),
+#   user_id uuid not null references app_users(id) on delete cascade,
+#   strategy text not null,
+#   symbol text not null,
+#   interval_seconds double precision not null,
+#   params jsonb not null default '{}',
+#   created_at timestamptz not null default now()
+# );
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "false").lower() == "true"
+SCHEDULER_DB = os.getenv("SCHEDULER_DB", "data/scheduler.db")
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "8"))
+SCHEDULER_SYNC = float(os.getenv("SCHEDULER_SYNC", "30"))
+SCHEDULER_LEASE = float(os.getenv("SCHEDULER_LEASE", "90"))
+SCHEDULER_DRY_RUN = os.getenv("SCHEDULER_DRY_RUN", "true").lower() == "true"
+MIN_INTERVAL = float(os.getenv("SCHEDULER_MIN_INTERVAL", "5"))
+MAX_JOBS_PER_USER = int(os.getenv("SCHEDULER_MAX_JOBS_PER_USER", "50"))
+FEED_SYMBOLS = [s.strip() for s in os.getenv("DERIV_TICK_SYMBOLS", "").split(",") if s.strip()]
+
+_SCHEMA = """
+create table if not exists scheduler_lease (
+  name text primary key,
+  owner text not null,
+  until real not null
+);
+"""
+
+class JobService:
+    def __init__(self, path: str = SCHEDULER_DB):
+        self.db = LocalDB(path, _SCHEMA)
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.scheduler = JobScheduler(workers=SCHEDULER_WORKERS, is_active=is_entitled, dry_run=SCHEDULER_DRY_RUN)
+        self.leader = False
+        self.last_sync: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+
+    def _acquire(self) -> bool:
+        """Take or renew the lease; True if this process holds it."""
+        now = time.time()
+        c = self.db.conn()
+        c.execute(
+            "insert into scheduler_lease(name, owner, until) values ('jobs', ?, ?) "
+            "on conflict(name) do update set owner = excluded.owner, until = excluded.until "
+            "where scheduler_lease.owner = excluded.owner or scheduler_lease.until < ?",
+            (self.owner, now + SCHEDULER_LEASE, now),
+        )
+        row = c.execute("select owner from scheduler_lease where name = 'jobs'").fetchone()
+        return row is not None and row[0] == self.owner
+
+    def _release(self) -> None:
+        self.db.conn().execute("delete from scheduler_lease where name = 'jobs' and owner = ?", (self.owner,))
+
+    @staticmethod
+    def _feed_here() -> bool:
+        from profitpilot.backend.tick_engine import default_tick_engine
+        return default_tick_engine.running
+
+    async def sync(self) -> Dict[str, int]:
+        st = get_storage()
+        rows = await st.list_strategy_jobs() if st else []
+        res = self.scheduler.sync(
+            {"id": r["id"], "user_id": r["user_id"], "strategy": r["strategy"], "symbol": r["symbol"],
+             "interval": r["interval_seconds"], "params": r.get("params")}
+            for r in rows
+        )
+        self.last_sync = time.time()
+        return res
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                leader = self._acquire() if self._feed_here() else False
+                if leader and not self.leader:
+                    logger.info("scheduler: lease acquired by {}", self.owner)
+                    await self.scheduler.start()
+                elif self.leader and not leader:
+                    logger.warning("scheduler: lease lost by {}", self.owner)
+                    await self.scheduler.stop()
+                    self._release()
+                self.leader = leader
+                if leader:
+                    await self.sync()
+            except Exception:
+                logger.exception("scheduler sync error")
+            try:
+                await asyncio.wait_for(self._wake.wait(), SCHEDULER_SYNC)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def poke(self) -> None:
+        """Re-sync now (after a job change made through this process)."""
+        if self._wake is not None:
+            self._wake.set()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.leader:
+            await self.scheduler.stop()
+            self._release()
+            self.leader = False
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self.scheduler.stats(), leader=self.leader, feed=self._feed_here(), owner=self.owner, last_sync=self.last_sync)
+
+_SERVICE: Optional[JobService] = None
+
+def get_job_service() -> JobService:
+    global _SERVICE
+    if _SERVICE is None:
+        _SERVICE = JobService()
+    return _SERVICE
+
+def _poke() -> None:
+    if _SERVICE is not None:
+        _SERVICE.poke()
+
+# --- per-user job management (web routes) ---
+
+async def list_jobs(user_id: str) -> List[Dict[str, Any]]:
+    st = get_storage()
+    return await st.list_strategy_jobs(user_id) if st else []
+
+async def add_job(user_id: str, strategy: str, symbol: str, interval_seconds: float, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Validate and store a job; raises ValueError with a user-facing message."""
+    from profitpilot.backend.strategy_service import default_strategy_manager
+    st = get_storage()
+    if not st:
+        raise ValueError("storage not configured")
+    if strategy not in default_strategy_manager.list_strategies():
+        raise ValueError("Strategy not found")
+    symbol = symbol.strip()
+    if not symbol:
+        raise ValueError("symbol is required")
+    if symbol not in FEED_SYMBOLS:
+        raise ValueError(f"no live feed for {symbol} (feed symbols: {', '.join(FEED_SYMBOLS) or 'none'})")
+    if not math.isfinite(interval_seconds) or interval_seconds < MIN_INTERVAL:
+        raise ValueError(f"interval must be at least {MIN_INTERVAL:g}s")
+    if len(await st.list_strategy_jobs(user_id)) >= MAX_JOBS_PER_USER:
+        raise ValueError(f"at most {MAX_JOBS_PER_USER} jobs per user")
+    row = await st.insert_strategy_job({"user_id": user_id, "strategy": strategy, "symbol": symbol,
+                                        "interval_seconds": float(interval_seconds), "params": dict(params or {})})
+    _poke()
+    return row
+
+async def remove_job(user_id: str, job_id: str) -> bool:
+    st = get_storage()
+    if not st or not await st.delete_strategy_job(user_id, job_id):
+        return False
+    _poke()
+    return True
@@ -0,0 +1,34 @@
+import os, sqlite3, threading
+from typing import Optional
+
+class LocalDB:
+    """
+    Per-thread sqlite3 connections to one WAL-mode database file, with the schema applied
+    once per process. Safe to share between threads and between worker processes.
+    """
+
+    def __init__(self, path: str, schema: str = ""):
+        self.path = path
+        self.schema = schema
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_done = False
+
+    def conn(self) -> sqlite3.Connection:
+        c: Optional[sqlite3.Connection] = getattr(self._local, "conn", None)
+        if c is None:
+            d = os.path.dirname(self.path)
+            if d:
+                os.makedirs(d, exist_ok=True)
+            c = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            c.row_factory = sqlite3.Row
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            c.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = c
+            if not self._schema_done:
+                with self._schema_lock:
+                    if not self._schema_done and self.schema:
+                        c.executescript(self.schema)
+                    self._schema_done = True
+        return c
@@ -1,31 +1,93 @@
-import os, hmac, hashlib, json, httpx
-from typing import Optional
+import asyncio, os, hmac, hashlib, json, httpx
+from typing import Dict, Optional
+
+from .cache import TTLCache
+from profitpilot.backend.metrics import OP_SECONDS, timed
 
 NP_API_KEY = os.getenv("NOWPAYMENTS_API_KEY")
 NP_IPN_SECRET = os.getenv("NOWPAYMENTS_IPN_SECRET")
 SITE_BASE = os.getenv("SITE_BASE", "http://localhost:8000")
 
 API = "https://api.nowpayments.io/v1"
+NP_TIMEOUT = float(os.getenv("NOWPAYMENTS_TIMEOUT", "20"))
+# An open invoice is reused for the same order_id (double-clicks, retries) for this long
+NP_INVOICE_TTL = float(os.getenv("NOWPAYMENTS_INVOICE_TTL", "1800"))
 
-async def create_invoice(email: str, price_amount: float = 100.0, price_currency: str = "usd") -> Optional[str]:
-    if not NP_API_KEY:
-        return None
+_CLIENT: Optional[httpx.AsyncClient] = None
+_INVOICES = TTLCache(maxsize=10_000, ttl=NP_INVOICE_TTL)  # order_id -> invoice_url
+_INFLIGHT: Dict[str, "asyncio.Future[Optional[str]]"] = {}
+
+def order_id_for(email: str) -> str:
+    return f"ppai-{email}"
+
+def get_client() -> httpx.AsyncClient:
+    """App-lifetime pooled client (keep-alive), so checkout skips DNS/TCP/TLS setup."""
+    global _CLIENT
+    if _CLIENT is None:
+        _CLIENT = httpx.AsyncClient(
+            base_url=API,
+            headers={"x-api-key": NP_API_KEY or "", "Content-Type": "application/json"},
+            timeout=NP_TIMEOUT,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        )
+    return _CLIENT
+
+async def close_client() -> None:
+    global _CLIENT
+    if _CLIENT is not None:
+        await _CLIENT.aclose()
+        _CLIENT = None
+
+def forget_invoice(order_id: str) -> None:
+    """Drop the cached invoice (call once it is paid/failed so the next checkout gets a fresh one)."""
+    _INVOICES.pop(order_id)
+
+@timed(OP_SECONDS, "nowpayments_invoice")
+async def _post_invoice(order_id: str, price_amount: float, price_currency: str) -> Optional[str]:
     payload = {
         "price_amount": price_amount,
         "price_currency": price_currency,
-        "order_id": f"ppai-{email}",
+        "order_id": order_id,
         "order_description": "ProfitPilotAI Monthly Subscription",
         "success_url": f"{SITE_BASE}/dashboard",
         "cancel_url": f"{SITE_BASE}/dashboard",
         "ipn_callback_url": f"{SITE_BASE}/crypto/ipn",
         "is_fixed_rate": True,
     }
-    headers = {"x-api-key": NP_API_KEY, "Content-Type": "application/json"}
-    async with httpx.AsyncClient(timeout=20) as client:
-        r = await client.post(f"{API}/invoice", headers=headers, json=payload)
-        r.raise_for_status()
-        data = r.json()
-        return data.get("invoice_url")
+    r = await get_client().post("/invoice", json=payload)
+    r.raise_for_status()
+    return r.json().get("invoice_url")
+
+async def create_invoice(email: str, price_amount: float = 100.0, price_currency: str = "usd") -> Optional[str]:
+    """
+    Invoice URL for this user's order. Idempotent per order_id: an open invoice from the last
+    NP_INVOICE_TTL seconds is returned as-is, and concurrent calls share one API request.
+    """
+    if not NP_API_KEY:
+        return None
+    order_id = order_id_for(email)
+    url = _INVOICES.get(order_id)
+    if url:
+        return url
+    pending = _INFLIGHT.get(order_id)
+    if pending is not None:
+        return await asyncio.shield(pending)  # double-click: ride on the request in flight
+    fut = asyncio.get_running_loop().create_future()
+    _INFLIGHT[order_id] = fut
+    try:
+        url = await _post_invoice(order_id, price_amount, price_currency)
+        if url:
+            _INVOICES.set(order_id, url)
+        fut.set_result(url)
+        return url
+    except Exception as e:
+        fut.set_exception(e)
+        fut.exception()  # mark retrieved when nobody else was waiting
+        raise
+    finally:
+        _INFLIGHT.pop(order_id, None)
+        if not fut.done():
+            fut.cancel()
 
 def verify_ipn_signature(raw_body: bytes, signature: str) -> bool:
     # NOWPayments sends HMAC-SHA512 over raw body using your IPN secret
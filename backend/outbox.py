@@ -0,0 +1,217 @@
+import os, smtplib, threading, time
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+from .emailer import SMTP_TIMEOUT, DeliveryUnknown, NotDelivered, SMTPSession, smtp_configured
+from .localdb import LocalDB
+
+# Durable email outbox. Request handlers only insert a row (enqueue); a background thread
+# per worker process claims due rows in batches, sends them over one pooled SMTP session
+# and reschedules failures with exponential backoff - only those where nothing was sent or
+# the server answered 4xx. 5xx answers are dead at once, and a message lost after its body
+# went out is marked 'unknown' instead of risking a second copy. Claims carry a lease, so several
+# uvicorn workers can drain the same file without double-sending, and rows claimed by a
+# worker that died become due again once the lease expires. The lease is renewed before each
+# message, so it only has to outlast one send (SMTP_TIMEOUT per socket operation), not a batch.
+
+EMAIL_OUTBOX_DB = os.getenv("EMAIL_OUTBOX_DB", "data/outbox.db")
+EMAIL_BATCH = int(os.getenv("EMAIL_BATCH", "20"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "8"))
+EMAIL_BACKOFF = float(os.getenv("EMAIL_BACKOFF", "30"))  # first retry delay, doubles per attempt
+EMAIL_BACKOFF_MAX = float(os.getenv("EMAIL_BACKOFF_MAX", "3600"))
+# renewed before each message of a claimed batch; one send with its reconnect is several
+# socket operations of up to SMTP_TIMEOUT each
+EMAIL_LEASE = max(float(os.getenv("EMAIL_LEASE", "120")), 6 * SMTP_TIMEOUT)
+EMAIL_POLL = float(os.getenv("EMAIL_POLL", "5"))
+EMAIL_KEEP_SENT = float(os.getenv("EMAIL_KEEP_SENT", str(7 * 86400)))
+
+_SCHEMA = """
+create table if not exists outbox (
+  id integer primary key autoincrement,
+  to_email text not null,
+  subject text not null,
+  html text not null,
+  status text not null default 'pending',
+  attempts integer not null default 0,
+  next_attempt real not null,
+  lease_until real not null default 0,
+  last_error text,
+  created real not null,
+  sent_at real
+);
+create index if not exists outbox_due on outbox(status, next_attempt);
+"""
+
+def _reply_codes(err: Exception) -> List[int]:
+    if isinstance(err, smtplib.SMTPResponseException):
+        return [err.smtp_code]
+    if isinstance(err, smtplib.SMTPRecipientsRefused):
+        return [code for code, _ in err.recipients.values()]
+    return []
+
+def _retryable(err: Exception) -> bool:
+    """Nothing was handed over (connect/envelope transport failure) or the server said 4xx."""
+    if isinstance(err, NotDelivered):
+        return True
+    codes = _reply_codes(err)
+    return bool(codes) and all(400 <= c < 500 for c in codes)
+
+def _backoff(attempts: int) -> float:
+    return min(EMAIL_BACKOFF * (2 ** max(attempts - 1, 0)), EMAIL_BACKOFF_MAX)
+
+class Outbox:
+    def __init__(self, path: str = EMAIL_OUTBOX_DB, batch: int = EMAIL_BATCH):
+        self.db = LocalDB(path, _SCHEMA)
+        self.batch = batch
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._session: Optional[SMTPSession] = None
+
+    # --- producer side ---
+    def enqueue(self, to_email: str, subject: str, html_body: str) -> int:
+        now = time.time()
+        cur = self.db.conn().execute(
+            "insert into outbox(to_email, subject, html, next_attempt, created) values (?, ?, ?, ?, ?)",
+            (to_email, subject, html_body, now, now),
+        )
+        self._wake.set()
+        return cur.lastrowid
+
+    def stats(self) -> Dict[str, int]:
+        rows = self.db.conn().execute("select status, count(*) from outbox group by status").fetchall()
+        return {r[0]: r[1] for r in rows}
+
+    # --- consumer side ---
+    def claim(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        now = time.time() if now is None else now
+        rows = self.db.conn().execute(
+            """
+            update outbox set lease_until = ?
+            where id in (
+              select id from outbox
+              where status = 'pending' and next_attempt <= ? and lease_until <= ?
+              order by next_attempt limit ?
+            )
+            returning id, to_email, subject, html, attempts
+            """,
+            (now + EMAIL_LEASE, now, now, self.batch),
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    def _mark_sent(self, row_id: int) -> None:
+        self.db.conn().execute(
+            "update outbox set status = 'sent', sent_at = ?, attempts = attempts + 1, lease_until = 0 where id = ?",
+            (time.time(), row_id),
+        )
+
+    def _mark_unknown(self, row: Dict[str, Any], err: Exception) -> None:
+        """Lost after the body was sent: may have been delivered, so it is not sent again."""
+        self.db.conn().execute(
+            "update outbox set status = 'unknown', attempts = attempts + 1, sent_at = ?, lease_until = 0, last_error = ? where id = ?",
+            (time.time(), repr(err)[:500], row["id"]),
+        )
+        logger.warning(f"outbox: email {row['id']} to {row['to_email']} may or may not have been sent: {err!r}")
+
+    def _mark_failed(self, row: Dict[str, Any], err: Exception) -> None:
+        attempts = row["attempts"] + 1
+        dead = not _retryable(err) or attempts >= EMAIL_MAX_ATTEMPTS
+        self.db.conn().execute(
+            "update outbox set status = ?, attempts = ?, next_attempt = ?, lease_until = 0, last_error = ? where id = ?",
+            ("dead" if dead else "pending", attempts, time.time() + _backoff(attempts), repr(err)[:500], row["id"]),
+        )
+        if dead:
+            logger.warning(f"outbox: giving up on email {row['id']} to {row['to_email']}: {err!r}")
+
+    def _renew(self, ids: List[int]) -> None:
+        self.db.conn().execute(
+            f"update outbox set lease_until = ? where id in ({','.join('?' * len(ids))})",
+            (time.time() + EMAIL_LEASE, *ids),
+        )
+
+    def _release(self, ids: List[int], delay: float) -> None:
+        """Hand claimed-but-unsent rows back without counting an attempt."""
+        if ids:
+            self.db.conn().execute(
+                f"update outbox set lease_until = 0, next_attempt = ? where id in ({','.join('?' * len(ids))})",
+                (time.time() + delay, *ids),
+            )
+
+    def drain_once(self) -> int:
+        """Send one batch; returns how many rows were claimed."""
+        rows = self.claim()
+        if not rows:
+            return 0
+        if self._session is None:
+            self._session = SMTPSession()
+        for i, row in enumerate(rows):
+            self._renew([r["id"] for r in rows[i:]])
+            try:
+                self._session.send(row["to_email"], row["subject"], row["html"])
+                self._mark_sent(row["id"])
+            except Exception as e:
+                if isinstance(e, DeliveryUnknown):
+                    self._mark_unknown(row, e)
+                else:
+                    self._mark_failed(row, e)
+                if isinstance(e, DeliveryUnknown) or _retryable(e):
+                    # connection or server-side trouble: back off the rest of the batch as well
+                    self._session.close()
+                    self._release([r["id"] for r in rows[i + 1:]], EMAIL_BACKOFF)
+                    break
+        return len(rows)
+
+    def _prune(self) -> None:
+        self.db.conn().execute("delete from outbox where status = 'sent' and sent_at < ?", (time.time() - EMAIL_KEEP_SENT,))
+
+    def _idle_wait(self) -> float:
+        try:
+            row = self.db.conn().execute("select min(max(next_attempt, lease_until)) from outbox where status = 'pending'").fetchone()
+        except Exception:
+            return EMAIL_POLL
+        if row is None or row[0] is None:
+            return EMAIL_POLL
+        return min(max(row[0] - time.time(), 0.05), EMAIL_POLL)
+
+    def _run(self) -> None:
+        last_prune = 0.0
+        while not self._stop.is_set():
+            try:
+                while not self._stop.is_set() and self.drain_once() == self.batch:
+                    pass
+                if time.time() - last_prune > 3600:
+                    self._prune()
+                    last_prune = time.time()
+            except Exception as e:
+                logger.exception(f"outbox worker error: {e}")
+            self._wake.wait(self._idle_wait())
+            self._wake.clear()
+        if self._session is not None:
+            self._session.close()
+
+    def start(self) -> None:
+        if self._thread is not None or not smtp_configured():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="email-outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+_OUTBOX: Optional[Outbox] = None
+
+def get_outbox() -> Outbox:
+    global _OUTBOX
+    if _OUTBOX is None:
+        _OUTBOX = Outbox()
+    return _OUTBOX
+
+def enqueue_email(to_email: str, subject: str, html_body: str) -> int:
+    return get_outbox().enqueue(to_email, subject, html_body)
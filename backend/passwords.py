@@ -0,0 +1,73 @@
+import asyncio, multiprocessing, os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.hash import bcrypt
+
+from profitpilot.backend.metrics import OP_SECONDS, timed
+
+# bcrypt runs in a bounded process pool so a login storm can't starve the event loop.
+# When more than BCRYPT_MAX_PENDING hashes are queued, callers get PasswordPoolBusy
+# immediately (the routes turn it into a fast 429) instead of queueing behind the storm.
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", str(os.cpu_count() or 1)))
+BCRYPT_MAX_PENDING = int(os.getenv("BCRYPT_MAX_PENDING", str(BCRYPT_WORKERS * 8)))
+
+_HASHER = bcrypt.using(rounds=BCRYPT_ROUNDS)
+_POOL: Optional[ProcessPoolExecutor] = None
+_PENDING = 0
+
+class PasswordPoolBusy(Exception):
+    pass
+
+def _hash(password: str) -> str:
+    return _HASHER.hash(password)
+
+def _verify(password: str, hashed: str) -> Tuple[bool, bool]:
+    """(matches, needs_rehash) - rehash when the stored cost differs from BCRYPT_ROUNDS."""
+    try:
+        ok = bcrypt.verify(password, hashed)
+    except Exception:
+        return False, False
+    return ok, ok and _HASHER.needs_update(hashed)
+
+def _pool() -> ProcessPoolExecutor:
+    global _POOL
+    if _POOL is None:
+        _POOL = ProcessPoolExecutor(max_workers=BCRYPT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _POOL
+
+def is_saturated() -> bool:
+    return _PENDING >= BCRYPT_MAX_PENDING
+
+async def _submit(fn, *args):
+    global _PENDING
+    if _PENDING >= BCRYPT_MAX_PENDING:
+        raise PasswordPoolBusy()
+    _PENDING += 1
+    try:
+        with timed(OP_SECONDS, "bcrypt" + fn.__name__):  # bcrypt_hash / bcrypt_verify, queueing included
+            return await asyncio.get_running_loop().run_in_executor(_pool(), fn, *args)
+    finally:
+        _PENDING -= 1
+
+async def hash_password(password: str) -> str:
+    return await _submit(_hash, password)
+
+async def verify_password(password: str, hashed: str) -> Tuple[bool, bool]:
+    if not hashed:
+        return False, False
+    return await _submit(_verify, password, hashed)
+
+async def warm_up() -> None:
+    """Start the worker processes ahead of the first login."""
+    pool = _pool()
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*(loop.run_in_executor(pool, _verify, "", "") for _ in range(BCRYPT_WORKERS)))
+
+def shutdown() -> None:
+    global _POOL
+    if _POOL is not None:
+        _POOL.shutdown(wait=False, cancel_futures=True)
+        _POOL = None
@@ -0,0 +1,182 @@
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+
+from profitpilot.backend.metrics import OP_SECONDS, timed
+
+# Minimal async PostgREST (Supabase REST) client: one shared httpx.AsyncClient with a
+# keep-alive connection pool, and a query builder covering what supabase-py offered us
+# (select/insert/update/delete, eq/gt/gte/lt/lte/ilike/in_/or_, order/limit/range/single,
+# rpc for SQL functions).
+
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "5"))
+SUPABASE_MAX_CONNECTIONS = int(os.getenv("SUPABASE_MAX_CONNECTIONS", "50"))
+
+class APIError(Exception):
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"{status_code}: {message}")
+        self.status_code = status_code
+        self.message = message
+
+class APIResponse:
+    def __init__(self, data: Any, count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+def quote(value: Any) -> str:
+    """Quote a filter value for in/or lists (PostgREST reserved chars: , . : ( ) and quotes)."""
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    s = str(value)
+    return '"' + s.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+class Query:
+    def __init__(self, client: "AsyncPostgrest", table: str):
+        self._client = client
+        self._table = table
+        self._method = "GET"
+        self._params: List[Tuple[str, str]] = []
+        self._headers: Dict[str, str] = {}
+        self._json: Any = None
+
+    # --- verbs ---
+    def select(self, columns: str = "*", count: Optional[str] = None) -> "Query":
+        self._method = "GET"
+        self._params.append(("select", columns))
+        if count:
+            self._prefer(f"count={count}")
+        return self
+
+    def insert(self, payload: Any) -> "Query":
+        self._method = "POST"
+        self._json = payload
+        self._prefer("return=representation")
+        return self
+
+    def upsert(self, payload: Any, on_conflict: Optional[str] = None) -> "Query":
+        self.insert(payload)
+        self._prefer("resolution=merge-duplicates")
+        if on_conflict:
+            self._params.append(("on_conflict", on_conflict))
+        return self
+
+    def update(self, payload: Dict[str, Any]) -> "Query":
+        self._method = "PATCH"
+        self._json = payload
+        self._prefer("return=representation")
+        return self
+
+    def delete(self) -> "Query":
+        self._method = "DELETE"
+        self._prefer("return=representation")
+        return self
+
+    # --- filters ---
+    def _filter(self, column: str, op: str, value: Any) -> "Query":
+        if isinstance(value, bool):
+            value = "true" if value else "false"
+        self._params.append((column, f"{op}.{'null' if value is None else value}"))
+        return self
+
+    def eq(self, column: str, value: Any) -> "Query":
+        return self._filter(column, "eq", value)
+
+    def neq(self, column: str, value: Any) -> "Query":
+        return self._filter(column, "neq", value)
+
+    def gt(self, column: str, value: Any) -> "Query":
+        return self._filter(column, "gt", value)
+
+    def gte(self, column: str, value: Any) -> "Query":
+        return self._filter(column, "gte", value)
+
+    def lt(self, column: str, value: Any) -> "Query":
+        return self._filter(column, "lt", value)
+
+    def lte(self, column: str, value: Any) -> "Query":
+        return self._filter(column, "lte", value)
+
+    def ilike(self, column: str, pattern: str) -> "Query":
+        return self._filter(column, "ilike", pattern)
+
+    def in_(self, column: str, values: Iterable[Any]) -> "Query":
+        self._params.append((column, "in.(" + ",".join(quote(v) for v in values) + ")"))
+        return self
+
+    def or_(self, filters: str) -> "Query":
+        self._params.append(("or", f"({filters})"))
+        return self
+
+    # --- modifiers ---
+    def order(self, column: str, desc: bool = False) -> "Query":
+        self._params.append(("order", f"{column}.{'desc' if desc else 'asc'}"))
+        return self
+
+    def limit(self, n: int) -> "Query":
+        self._params.append(("limit", str(int(n))))
+        return self
+
+    def range(self, start: int, end: int) -> "Query":
+        self._params.append(("offset", str(int(start))))
+        self._params.append(("limit", str(int(end) - int(start) + 1)))
+        return self
+
+    def single(self) -> "Query":
+        self._headers["Accept"] = "application/vnd.pgrst.object+json"
+        return self
+
+    def _prefer(self, value: str) -> None:
+        prev = self._headers.get("Prefer")
+        self._headers["Prefer"] = f"{prev},{value}" if prev else value
+
+    async def execute(self, timeout: Optional[float] = None) -> APIResponse:
+        return await self._client.request(self._method, self._table, self._params, self._headers, self._json, timeout)
+
+class AsyncPostgrest:
+    def __init__(self, url: str, key: str, timeout: float = SUPABASE_TIMEOUT, max_connections: int = SUPABASE_MAX_CONNECTIONS):
+        self.rest_url = url.rstrip("/") + "/rest/v1"
+        self.timeout = timeout
+        self._http = httpx.AsyncClient(
+            headers={"apikey": key, "Authorization": f"Bearer {key}"},
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    def table(self, name: str) -> Query:
+        return Query(self, name)
+
+    def rpc(self, fn: str, params: Dict[str, Any]) -> Query:
+        """Call a SQL function (POST /rpc/fn with the arguments as a JSON object)."""
+        q = Query(self, f"rpc/{fn}")
+        q._method = "POST"
+        q._json = params
+        return q
+
+    async def request(self, method: str, table: str, params, headers, payload, timeout: Optional[float] = None) -> APIResponse:
+        with timed(OP_SECONDS, f"supabase_{table}_{method.lower()}"):
+            r = await self._http.request(
+                method,
+                f"{self.rest_url}/{table}",
+                params=params,
+                headers=headers,
+                json=payload,
+                timeout=self.timeout if timeout is None else timeout,
+            )
+        if r.status_code >= 400:
+            try:
+                msg = r.json().get("message", r.text)
+            except Exception:
+                msg = r.text
+            raise APIError(r.status_code, msg)
+        data = r.json() if r.content else None
+        count = None
+        cr = r.headers.get("content-range", "")
+        if "/" in cr and cr.rsplit("/", 1)[1].isdigit():
+            count = int(cr.rsplit("/", 1)[1])
+        return APIResponse(data, count)
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
@@ -0,0 +1,122 @@
+import os, threading, time
+from collections import OrderedDict
+from typing import Hashable
+
+from .localdb import LocalDB
+
+# Sliding-window counters: each key keeps the count of the current and previous fixed window,
+# and the estimate weights the previous one by how much of it still overlaps the sliding window.
+# Memory is bounded by max_keys (LRU) and entries older than two windows count as empty.
+
+LOGIN_MAX_ATTEMPTS = int(os.getenv("LOGIN_MAX_ATTEMPTS", "5"))
+LOGIN_WINDOW = int(os.getenv("LOGIN_WINDOW", "600"))
+RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB")  # sqlite file shared by all workers on the host
+
+def _estimate(bucket: int, cur: int, prev: int, now: float, window: float) -> float:
+    now_bucket = int(now // window)
+    overlap = 1.0 - (now % window) / window
+    if bucket == now_bucket:
+        return cur + prev * overlap
+    if bucket == now_bucket - 1:
+        return cur * overlap
+    return 0.0
+
+class SlidingWindowLimiter:
+    """In-process limiter (per worker)."""
+
+    def __init__(self, max_attempts: int, window: float, max_keys: int = 100_000):
+        self.max_attempts = max_attempts
+        self.window = float(window)
+        self.max_keys = max_keys
+        self._data: "OrderedDict[Hashable, list]" = OrderedDict()  # key -> [bucket, cur, prev]
+        self._lock = threading.Lock()
+
+    def is_limited(self, key: Hashable) -> bool:
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return False
+            est = _estimate(entry[0], entry[1], entry[2], now, self.window)
+            if est == 0.0:
+                del self._data[key]
+            return est >= self.max_attempts
+
+    def hit(self, key: Hashable) -> None:
+        now = time.time()
+        bucket = int(now // self.window)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._data[key] = [bucket, 1, 0]
+            elif entry[0] == bucket:
+                entry[1] += 1
+            else:
+                entry[2] = entry[1] if entry[0] == bucket - 1 else 0
+                entry[0], entry[1] = bucket, 1
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_keys:
+                self._data.popitem(last=False)
+
+    def reset(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+_SCHEMA = """
+create table if not exists rate_limits (
+  key text primary key,
+  bucket integer not null,
+  cur integer not null,
+  prev integer not null
+);
+create index if not exists rate_limits_bucket on rate_limits(bucket);
+"""
+
+class SQLiteSlidingWindowLimiter:
+    """Same counters kept in a local sqlite (WAL) file, so every worker on the host shares them."""
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path: str, max_attempts: int, window: float):
+        self.db = LocalDB(path, _SCHEMA)
+        self.max_attempts = max_attempts
+        self.window = float(window)
+        self._hits = 0
+
+    def is_limited(self, key: Hashable) -> bool:
+        row = self.db.conn().execute("select bucket, cur, prev from rate_limits where key = ?", (str(key),)).fetchone()
+        if row is None:
+            return False
+        return _estimate(row[0], row[1], row[2], time.time(), self.window) >= self.max_attempts
+
+    def hit(self, key: Hashable) -> None:
+        bucket = int(time.time() // self.window)
+        c = self.db.conn()
+        c.execute(
+            """
+            insert into rate_limits(key, bucket, cur, prev) values (?, ?, 1, 0)
+            on conflict(key) do update set
+              prev = case when bucket = excluded.bucket then prev when bucket = excluded.bucket - 1 then cur else 0 end,
+              cur = case when bucket = excluded.bucket then cur + 1 else 1 end,
+              bucket = excluded.bucket
+            """,
+            (str(key), bucket),
+        )
+        self._hits += 1
+        if self._hits % self.PRUNE_EVERY == 0:
+            c.execute("delete from rate_limits where bucket < ?", (bucket - 1,))
+
+    def reset(self, key: Hashable) -> None:
+        self.db.conn().execute("delete from rate_limits where key = ?", (str(key),))
+
+_LOGIN_LIMITER = None
+
+def get_login_limiter():
+    """Login limiter: shared sqlite file if RATE_LIMIT_DB is set, else in-process."""
+    global _LOGIN_LIMITER
+    if _LOGIN_LIMITER is None:
+        if RATE_LIMIT_DB:
+            _LOGIN_LIMITER = SQLiteSlidingWindowLimiter(RATE_LIMIT_DB, LOGIN_MAX_ATTEMPTS, LOGIN_WINDOW)
+        else:
+            _LOGIN_LIMITER = SlidingWindowLimiter(LOGIN_MAX_ATTEMPTS, LOGIN_WINDOW)
+    return _LOGIN_LIMITER
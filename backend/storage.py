@@ -0,0 +1,586 @@
+import asyncio, functools, json, os, uuid
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from .localdb import LocalDB
+from .postgrest import AsyncPostgrest, quote
+
+# Persistence behind one small interface so the app can run against Supabase (PostgREST)
+# or a local SQLite file (WAL) with no network at all. STORAGE_BACKEND=supabase|sqlite;
+# supabase_utils/auth call get_storage() and keep their caching on top.
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase").lower()
+STORAGE_SQLITE_PATH = os.getenv("STORAGE_SQLITE_PATH", "data/profitpilot.db")
+
+USER_LOOKUP_FIELDS = ("id", "email", "login_id", "verify_token", "reset_token")
+# columns of admin search / export rows (never password or token columns)
+USER_LIST_COLUMNS = "id,name,email,login_id,role,email_verified,created_at"
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+class Storage(ABC):
+    """Users, subscriptions and login-attempt audit rows. Rows are plain dicts."""
+
+    name = "base"
+
+    # --- users ---
+    @abstractmethod
+    async def get_user(self, field: str, value: Any) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def find_user(self, login_or_email: str) -> Optional[Dict[str, Any]]:
+        """User whose email or login_id equals the value."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def users_by_ids(self, ids: Iterable[str], columns: str = "*") -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def insert_user(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def update_user(self, user_id: str, fields: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete_user(self, user_id: str) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def search_users(self, prefix: Optional[str], after: Optional[str], limit: int,
+                           active_since: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Up to `limit` users ordered by email, each with plan/active_until from entitlements
+        (None without a row). `prefix` matches the start of email, login_id or name, ignoring
+        ASCII case; `after` is the last email of the previous page (keyset pagination);
+        `active_since` keeps only users entitled past that ISO time.
+        """
+        raise NotImplementedError
+
+    # --- subscriptions ---
+    @abstractmethod
+    async def latest_subscription(self, user_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def insert_subscription(self, row: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete_subscriptions(self, user_id: str) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def active_subscriptions(self, now_iso: str) -> List[Dict[str, Any]]:
+        """Rows (user_id, plan, current_period_end, status) with status active and end > now."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def expire_subscriptions(self, now_iso: str) -> int:
+        """Mark active rows whose period ended as 'expired'; returns how many."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def subscriptions_page(self, after: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        """Up to `limit` subscription rows (plus the user's email) with id > `after`, ordered by id."""
+        raise NotImplementedError
+
+    # --- entitlements (one row per user, see backend/entitlements.py) ---
+    @abstractmethod
+    async def get_entitlement(self, user_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def upsert_entitlements(self, rows: List[Dict[str, Any]]) -> None:
+        """
+        Rows (user_id, plan, active_until, updated_at), inserted or replacing the user's row,
+        but never moving an existing active_until backwards.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def active_entitlements(self, now_iso: str) -> List[Dict[str, Any]]:
+        """Rows (user_id, plan, active_until) with active_until > now."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete_entitlement(self, user_id: str) -> None:
+        raise NotImplementedError
+
+    # --- strategy jobs (periodic runs, see backend/jobs.py) ---
+    @abstractmethod
+    async def list_strategy_jobs(self, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def insert_strategy_job(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete_strategy_job(self, user_id: str, job_id: str) -> bool:
+        """Delete one of `user_id`'s jobs; False if there was no such job."""
+        raise NotImplementedError
+
+    # --- login attempts (audit) ---
+    @abstractmethod
+    async def count_login_attempts(self, ip: str, since_iso: str) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def add_login_attempt(self, ip: str) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def clear_login_attempts(self, ip: str) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+class SupabaseStorage(Storage):
+    name = "supabase"
+
+    def __init__(self, client: AsyncPostgrest):
+        self.sb = client
+
+    async def get_user(self, field, value):
+        if field not in USER_LOOKUP_FIELDS:
+            raise ValueError(f"not a lookup field: {field}")
+        res = await self.sb.table("app_users").select("*").eq(field, value).limit(1).execute()
+        return (res.data or [None])[0]
+
+    async def find_user(self, login_or_email):
+        # PostgREST or() filter; values quoted so commas/dots in input can't break the filter
+        v = quote(login_or_email)
+        res = await self.sb.table("app_users").select("*").or_(f"email.eq.{v},login_id.eq.{v}").limit(1).execute()
+        return (res.data or [None])[0]
+
+    async def users_by_ids(self, ids, columns="*"):
+        ids = list(ids)
+        if not ids:
+            return []
+        res = await self.sb.table("app_users").select(columns).in_("id", ids).execute()
+        return res.data or []
+
+    async def insert_user(self, row):
+        res = await self.sb.table("app_users").insert(row).execute()
+        return (res.data or [row])[0]
+
+    async def update_user(self, user_id, fields):
+        await self.sb.table("app_users").update(fields).eq("id", user_id).execute()
+
+    async def delete_user(self, user_id):
+        await self.sb.table("app_users").delete().eq("id", user_id).execute()
+
+    async def search_users(self, prefix, after, limit, active_since=None):
+        # entitlements is one-to-one with app_users, so PostgREST embeds it as an object (or null);
+        # !inner turns the embed into an inner join for the active filter
+        emb = "entitlements!inner(plan,active_until)" if active_since else "entitlements(plan,active_until)"
+        q = self.sb.table("app_users").select(f"{USER_LIST_COLUMNS},{emb}")
+        if prefix:
+            p = quote(_like_escape(prefix) + "*")
+            q = q.or_(f"email.ilike.{p},login_id.ilike.{p},name.ilike.{p}")
+        if after is not None:
+            q = q.gt("email", after)
+        if active_since:
+            q = q.gt("entitlements.active_until", active_since)
+        res = await q.order("email").limit(limit).execute()
+        return [_flatten(r, "entitlements", ("plan", "active_until")) for r in res.data or []]
+
+    async def latest_subscription(self, user_id):
+        res = await (
+            self.sb.table("subscriptions")
+            .select("*")
+            .eq("user_id", user_id)
+            .order("created_at", desc=True)
+            .limit(1)
+            .execute()
+        )
+        return (res.data or [None])[0]
+
+    async def insert_subscription(self, row):
+        await self.sb.table("subscriptions").insert(row).execute()
+
+    async def delete_subscriptions(self, user_id):
+        await self.sb.table("subscriptions").delete().eq("user_id", user_id).execute()
+
+    async def active_subscriptions(self, now_iso):
+        res = await self.sb.table("subscriptions").select("user_id,plan,current_period_end,status").gt("current_period_end", now_iso).eq("status", "active").execute()
+        return res.data or []
+
+    async def expire_subscriptions(self, now_iso):
+        res = await self.sb.table("subscriptions").update({"status": "expired"}).eq("status", "active").lte("current_period_end", now_iso).execute()
+        return len(res.data or [])
+
+    async def subscriptions_page(self, after, limit):
+        q = self.sb.table("subscriptions").select("id,user_id,plan,status,current_period_end,created_at,app_users(email)")
+        if after is not None:
+            q = q.gt("id", after)
+        res = await q.order("id").limit(limit).execute()
+        return [_flatten(r, "app_users", ("email",)) for r in res.data or []]
+
+    async def get_entitlement(self, user_id):
+        res = await self.sb.table("entitlements").select("user_id,plan,active_until").eq("user_id", user_id).limit(1).execute()
+        return (res.data or [None])[0]
+
+    async def upsert_entitlements(self, rows):
+        # a plain upsert can't carry the "never backwards" condition; the SQL function in
+        # backend/entitlements.py does (on conflict ... where excluded.active_until >= ...)
+        if rows:
+            await self.sb.rpc("upsert_entitlements", {"rows": rows}).execute()
+
+    async def active_entitlements(self, now_iso):
+        res = await self.sb.table("entitlements").select("user_id,plan,active_until").gt("active_until", now_iso).execute()
+        return res.data or []
+
+    async def delete_entitlement(self, user_id):
+        await self.sb.table("entitlements").delete().eq("user_id", user_id).execute()
+
+    async def list_strategy_jobs(self, user_id=None):
+        q = self.sb.table("strategy_jobs").select("*")
+        if user_id is not None:
+            q = q.eq("user_id", user_id)
+        res = await q.order("created_at").execute()
+        return res.data or []
+
+    async def insert_strategy_job(self, row):
+        res = await self.sb.table("strategy_jobs").insert(row).execute()
+        return (res.data or [row])[0]
+
+    async def delete_strategy_job(self, user_id, job_id):
+        res = await self.sb.table("strategy_jobs").delete().eq("id", job_id).eq("user_id", user_id).execute()
+        return bool(res.data)
+
+    async def count_login_attempts(self, ip, since_iso):
+        res = await self.sb.table("login_attempts").select("ip", count="exact").gte("ts", since_iso).eq("ip", ip).limit(1).execute()
+        return int(res.count or 0)
+
+    async def add_login_attempt(self, ip):
+        await self.sb.table("login_attempts").insert({"ip": ip}).execute()
+
+    async def clear_login_attempts(self, ip):
+        await self.sb.table("login_attempts").delete().eq("ip", ip).execute()
+
+    # the client itself is owned (and closed) by supabase_utils.close_client
+
+def _like_escape(value: str) -> str:
+    """Literal text for an ilike pattern (PostgREST uses * for %)."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_").replace("*", "")
+
+def _flatten(row: Dict[str, Any], embed: str, fields: Iterable[str]) -> Dict[str, Any]:
+    """Lift fields of an embedded (to-one) resource into the row."""
+    row = dict(row)
+    sub = row.pop(embed, None)
+    if isinstance(sub, list):
+        sub = sub[0] if sub else None
+    for f in fields:
+        row[f] = (sub or {}).get(f)
+    return row
+
+# Same tables as the Supabase schema. Timestamps are ISO-8601 UTC strings, which sort and
+# compare correctly as text since every writer uses datetime.isoformat() in UTC.
+_SQLITE_SCHEMA = """
+create table if not exists app_users (
+  id text primary key,
+  name text,
+  address text,
+  login_id text unique,
+  email text unique,
+  password_hash text,
+  role text not null default 'user',
+  email_verified integer not null default 0,
+  verify_token text,
+  verify_expires text,
+  reset_token text,
+  reset_expires text,
+  created_at text not null
+);
+create index if not exists app_users_verify_token on app_users(verify_token) where verify_token is not null;
+create index if not exists app_users_reset_token on app_users(reset_token) where reset_token is not null;
+create index if not exists app_users_email_prefix on app_users(lower(email), email);
+create index if not exists app_users_login_prefix on app_users(lower(login_id), email);
+create index if not exists app_users_name_prefix on app_users(lower(name), email);
+create table if not exists subscriptions (
+  id text primary key,
+  user_id text not null references app_users(id) on delete cascade,
+  plan text not null default 'custom',
+  status text not null default 'active',
+  current_period_end text not null,
+  created_at text not null
+);
+create index if not exists subscriptions_user_created on subscriptions(user_id, created_at);
+create index if not exists subscriptions_active on subscriptions(status, current_period_end);
+create table if not exists entitlements (
+  user_id text primary key references app_users(id) on delete cascade,
+  plan text not null default 'custom',
+  active_until text not null,
+  updated_at text not null
+);
+create index if not exists entitlements_active_until on entitlements(active_until);
+create table if not exists strategy_jobs (
+  id text primary key,
+  user_id text not null references app_users(id) on delete cascade,
+  strategy text not null,
+  symbol text not null,
+  interval_seconds real not null,
+  params text not null default '{}',
+  created_at text not null
+);
+create index if not exists strategy_jobs_user on strategy_jobs(user_id);
+create table if not exists login_attempts (
+  ip text not null,
+  ts text not null
+);
+create index if not exists login_attempts_ip_ts on login_attempts(ip, ts);
+"""
+
+_BOOL_COLUMNS = ("email_verified",)
+
+def _ascii_lower(value: str) -> str:
+    # SQLite's lower() only folds ASCII; fold the search term the same way
+    return "".join(ch.lower() if ch.isascii() else ch for ch in value)
+
+def _row(r) -> Optional[Dict[str, Any]]:
+    if r is None:
+        return None
+    d = dict(r)
+    for k in _BOOL_COLUMNS:
+        if k in d and d[k] is not None:
+            d[k] = bool(d[k])
+    return d
+
+def _in_thread(fn: Callable) -> Callable:
+    """Make a blocking SQLiteStorage method awaitable without blocking the event loop."""
+    @functools.wraps(fn)
+    async def run(self, *args, **kwargs):
+        return await asyncio.to_thread(fn, self, *args, **kwargs)
+    return run
+
+class SQLiteStorage(Storage):
+    """
+    Local single-file storage. Each call runs in a worker thread (asyncio.to_thread, one
+    connection per thread): statements are quick, but a write lock held by another process
+    can make one wait up to busy_timeout, and that must not stall the event loop.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str = STORAGE_SQLITE_PATH):
+        self.db = LocalDB(path, _SQLITE_SCHEMA)
+
+    def _c(self):
+        return self.db.conn()
+
+    @_in_thread
+    def get_user(self, field, value):
+        if field not in USER_LOOKUP_FIELDS:
+            raise ValueError(f"not a lookup field: {field}")
+        return _row(self._c().execute(f"select * from app_users where {field} = ? limit 1", (value,)).fetchone())
+
+    @_in_thread
+    def find_user(self, login_or_email):
+        c = self._c()
+        r = c.execute("select * from app_users where email = ? limit 1", (login_or_email,)).fetchone()
+        if r is None:
+            r = c.execute("select * from app_users where login_id = ? limit 1", (login_or_email,)).fetchone()
+        return _row(r)
+
+    @_in_thread
+    def users_by_ids(self, ids, columns="*"):
+        ids = list(ids)
+        if not ids:
+            return []
+        cols = "*" if columns == "*" else ", ".join(c.strip() for c in columns.split(",") if c.strip().isidentifier())
+        q = f"select {cols} from app_users where id in ({','.join('?' * len(ids))})"
+        return [_row(r) for r in self._c().execute(q, ids).fetchall()]
+
+    @_in_thread
+    def insert_user(self, row):
+        row = dict(row)
+        row.setdefault("id", str(uuid.uuid4()))
+        row.setdefault("created_at", _now_iso())
+        cols = list(row)
+        self._c().execute(
+            f"insert into app_users({', '.join(cols)}) values ({', '.join('?' * len(cols))})",
+            [row[k] for k in cols],
+        )
+        return _row(self._c().execute("select * from app_users where id = ? limit 1", (row["id"],)).fetchone())
+
+    @_in_thread
+    def update_user(self, user_id, fields):
+        if not fields:
+            return
+        cols = list(fields)
+        for k in cols:
+            if not k.isidentifier():
+                raise ValueError(f"bad column: {k}")
+        self._c().execute(
+            f"update app_users set {', '.join(f'{k} = ?' for k in cols)} where id = ?",
+            [fields[k] for k in cols] + [user_id],
+        )
+
+    @_in_thread
+    def delete_user(self, user_id):
+        c = self._c()
+        c.execute("delete from subscriptions where user_id = ?", (user_id,))
+        c.execute("delete from strategy_jobs where user_id = ?", (user_id,))
+        c.execute("delete from entitlements where user_id = ?", (user_id,))
+        c.execute("delete from app_users where id = ?", (user_id,))
+
+    @_in_thread
+    def search_users(self, prefix, after, limit, active_since=None):
+        cols = ", ".join(f"u.{c}" for c in USER_LIST_COLUMNS.split(","))
+        join = "join" if active_since else "left join"
+        q = f"select {cols}, e.plan, e.active_until from app_users u {join} entitlements e on e.user_id = u.id"
+        args: Dict[str, Any] = {"after": after or "", "limit": limit, "active": active_since}
+        active = " and e.active_until > :active" if active_since else ""
+        if not prefix:
+            q += f" where u.email > :after{active} order by u.email limit :limit"
+        else:
+            # each prefix is a range scan on its (lower(col), email) index; the unary + keeps the
+            # planner off the email index, which would walk every user for a rare prefix
+            lo = _ascii_lower(prefix)
+            args.update(lo=lo, hi=lo[:-1] + chr(ord(lo[-1]) + 1))
+            matches = " union ".join(
+                f"select email from app_users where lower({c}) >= :lo and lower({c}) < :hi and +email > :after"
+                for c in ("email", "login_id", "name")
+            )
+            if active_since:
+                q += f" where u.email in ({matches}){active} order by u.email limit :limit"
+            else:
+                q += f" where u.email in ({matches} order by 1 limit :limit) order by u.email"
+        return [_row(r) for r in self._c().execute(q, args).fetchall()]
+
+    @_in_thread
+    def latest_subscription(self, user_id):
+        r = self._c().execute(
+            "select * from subscriptions where user_id = ? order by created_at desc, rowid desc limit 1", (user_id,)
+        ).fetchone()
+        return _row(r)
+
+    @_in_thread
+    def insert_subscription(self, row):
+        row = dict(row)
+        row.setdefault("id", str(uuid.uuid4()))
+        row.setdefault("created_at", _now_iso())
+        cols = list(row)
+        self._c().execute(
+            f"insert into subscriptions({', '.join(cols)}) values ({', '.join('?' * len(cols))})",
+            [row[k] for k in cols],
+        )
+
+    @_in_thread
+    def delete_subscriptions(self, user_id):
+        self._c().execute("delete from subscriptions where user_id = ?", (user_id,))
+
+    @_in_thread
+    def active_subscriptions(self, now_iso):
+        rows = self._c().execute(
+            "select user_id, plan, current_period_end, status from subscriptions where status = 'active' and current_period_end > ?",
+            (now_iso,),
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    @_in_thread
+    def expire_subscriptions(self, now_iso):
+        return self._c().execute(
+            "update subscriptions set status = 'expired' where status = 'active' and current_period_end <= ?", (now_iso,)
+        ).rowcount
+
+    @_in_thread
+    def subscriptions_page(self, after, limit):
+        rows = self._c().execute(
+            "select s.id, s.user_id, s.plan, s.status, s.current_period_end, s.created_at, u.email "
+            "from subscriptions s left join app_users u on u.id = s.user_id where s.id > ? order by s.id limit ?",
+            (after or "", limit),
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    @_in_thread
+    def get_entitlement(self, user_id):
+        return _row(self._c().execute("select user_id, plan, active_until from entitlements where user_id = ?", (user_id,)).fetchone())
+
+    @_in_thread
+    def upsert_entitlements(self, rows):
+        # never move active_until backwards: a sweep that read the history just before a grant
+        # must not undo it
+        self._c().executemany(
+            "insert into entitlements(user_id, plan, active_until, updated_at) values (?, ?, ?, ?) "
+            "on conflict(user_id) do update set plan = excluded.plan, active_until = excluded.active_until, "
+            "updated_at = excluded.updated_at where excluded.active_until >= entitlements.active_until",
+            [(r["user_id"], r.get("plan") or "custom", r["active_until"], r.get("updated_at") or _now_iso()) for r in rows],
+        )
+
+    @_in_thread
+    def active_entitlements(self, now_iso):
+        rows = self._c().execute("select user_id, plan, active_until from entitlements where active_until > ?", (now_iso,)).fetchall()
+        return [dict(r) for r in rows]
+
+    @_in_thread
+    def delete_entitlement(self, user_id):
+        self._c().execute("delete from entitlements where user_id = ?", (user_id,))
+
+    @_in_thread
+    def list_strategy_jobs(self, user_id=None):
+        q = "select * from strategy_jobs"
+        args: tuple = ()
+        if user_id is not None:
+            q, args = q + " where user_id = ?", (user_id,)
+        rows = self._c().execute(q + " order by created_at, rowid", args).fetchall()
+        return [dict(r, params=json.loads(r["params"] or "{}")) for r in rows]
+
+    @_in_thread
+    def insert_strategy_job(self, row):
+        row = dict(row)
+        row.setdefault("id", str(uuid.uuid4()))
+        row.setdefault("created_at", _now_iso())
+        cols = list(row)
+        self._c().execute(
+            f"insert into strategy_jobs({', '.join(cols)}) values ({', '.join('?' * len(cols))})",
+            [json.dumps(row[k]) if k == "params" else row[k] for k in cols],
+        )
+        return row
+
+    @_in_thread
+    def delete_strategy_job(self, user_id, job_id):
+        return self._c().execute("delete from strategy_jobs where id = ? and user_id = ?", (job_id, user_id)).rowcount > 0
+
+    @_in_thread
+    def count_login_attempts(self, ip, since_iso):
+        return self._c().execute("select count(*) from login_attempts where ip = ? and ts >= ?", (ip, since_iso)).fetchone()[0]
+
+    @_in_thread
+    def add_login_attempt(self, ip):
+        self._c().execute("insert into login_attempts(ip, ts) values (?, ?)", (ip, _now_iso()))
+
+    @_in_thread
+    def clear_login_attempts(self, ip):
+        self._c().execute("delete from login_attempts where ip = ?", (ip,))
+
+_STORAGE: Optional[Storage] = None
+
+def get_storage() -> Optional[Storage]:
+    """Configured backend, or None if it is Supabase and Supabase isn't configured."""
+    global _STORAGE
+    if _STORAGE is not None:
+        return _STORAGE
+    if STORAGE_BACKEND == "sqlite":
+        _STORAGE = SQLiteStorage()
+        return _STORAGE
+    from .supabase_utils import get_client
+    sb = get_client()
+    if sb is None:
+        return None
+    _STORAGE = SupabaseStorage(sb)
+    return _STORAGE
+
+async def close_storage() -> None:
+    global _STORAGE
+    if _STORAGE is not None:
+        await _STORAGE.close()
+        _STORAGE = None
@@ -1,13 +1,31 @@
 import os
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Tuple, Dict, Any, List
+from typing import Optional, Tuple, Dict, Any
 
-from supabase import create_client
+from . import entitlements
+from .cache import TTLCache
+from .postgrest import AsyncPostgrest
+from .storage import get_storage
 
 # -------- Env + client cache --------
 _CLIENT = None
 _LAST_ERROR: Optional[str] = None
 
+ACTIVE_USERS_TTL = float(os.getenv("ACTIVE_USERS_TTL", "30"))
+_ACTIVE_USERS_CACHE = TTLCache(maxsize=256, ttl=ACTIVE_USERS_TTL)
+
+# Read-through caches for user rows and latest subscription (entitlement) per user.
+# Misses are cached too (shorter TTL) so unknown logins don't hit Supabase every time.
+# Cached rows leave out password_hash: the caches are per process, and a stale hash would keep
+# an old password working on other workers after a reset. Login reads the row uncached
+# (get_user_for_login).
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+NEGATIVE_CACHE_TTL = float(os.getenv("NEGATIVE_CACHE_TTL", "10"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+_USER_CACHE = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)  # ("login", v) / ("id", uid) -> row
+_SUB_CACHE = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)   # uid -> latest subscription
+_MISSING = object()
+
 def _env(name: str, *alts: str) -> Optional[str]:
     for k in (name,)+alts:
         v = os.getenv(k)
@@ -16,7 +34,10 @@ def _env(name: str, *alts: str) -> Optional[str]:
     return None
 
 def get_client():
-    """Return cached Supabase client or None (and set _LAST_ERROR) if missing/invalid env."""
+    """
+    Return the shared async Supabase (PostgREST) client or None (and set _LAST_ERROR) if
+    missing/invalid env. Queries are awaited: `await sb.table(...)...execute()`.
+    """
     global _CLIENT, _LAST_ERROR
     if _CLIENT is not None:
         return _CLIENT
@@ -26,69 +47,126 @@ def get_client():
         _LAST_ERROR = "Missing/invalid SUPABASE_URL or KEY"
         return None
     try:
-        _CLIENT = create_client(url, key)
+        _CLIENT = AsyncPostgrest(url, key)
         _LAST_ERROR = None
         return _CLIENT
     except Exception as e:
         _LAST_ERROR = str(e)
         return None
 
+async def close_client() -> None:
+    """Close the pooled HTTP connections (app shutdown)."""
+    global _CLIENT
+    if _CLIENT is not None:
+        await _CLIENT.aclose()
+        _CLIENT = None
+
 # -------- Users --------
-def get_user_by_login_or_email(login_or_email: str) -> Optional[Dict[str, Any]]:
+def _cache_user(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Cache a user row without its password hash; returns the cached copy."""
+    row = {k: v for k, v in row.items() if k != "password_hash"}
+    _USER_CACHE.set(("id", row["id"]), row)
+    for k in ("email", "login_id"):
+        if row.get(k):
+            _USER_CACHE.set(("login", row[k]), row)
+    return row
+
+def invalidate_user(*identifiers: Any) -> None:
+    """
+    Drop cached user rows and subscription state. Accepts user dicts, ids, emails or login ids;
+    call after anything that creates, changes or deletes a user or their subscription.
     """
-    Fetch user by email OR login_id from app_users.
+    keys = set()
+    for ident in identifiers:
+        if isinstance(ident, dict):
+            keys.update(str(ident[k]) for k in ("id", "email", "login_id") if ident.get(k))
+        elif ident:
+            keys.add(str(ident).strip())
+    # a cached row is reachable under all of its identifiers
+    for v in list(keys):
+        for ck in (("login", v), ("id", v)):
+            row = _USER_CACHE.get(ck)
+            if isinstance(row, dict):
+                keys.update(str(row[k]) for k in ("id", "email", "login_id") if row.get(k))
+    for v in keys:
+        _USER_CACHE.pop(("login", v))
+        _USER_CACHE.pop(("id", v))
+        _SUB_CACHE.pop(v)
+        entitlements.forget(v)
+
+async def get_user_by_login_or_email(login_or_email: str) -> Optional[Dict[str, Any]]:
+    """
+    Fetch user by email OR login_id from app_users (read-through cached).
     Returns dict or None.
     """
-    sb = get_client()
-    if not sb:
+    v = login_or_email.strip()
+    cached = _USER_CACHE.get(("login", v))
+    if cached is _MISSING:
         return None
+    if cached is not None:
+        return cached
+    st = get_storage()
+    if not st:
+        return None
+    try:
+        row = await st.find_user(v)
+    except Exception:
+        return None
+    if not row:
+        _USER_CACHE.set(("login", v), _MISSING, ttl=NEGATIVE_CACHE_TTL)
+        return None
+    return _cache_user(row)
+
+async def get_user_for_login(login_or_email: str) -> Optional[Dict[str, Any]]:
+    """
+    User row including password_hash, always read from storage (only a cached miss is trusted).
+    Refreshes the cache as a side effect.
+    """
     v = login_or_email.strip()
+    if _USER_CACHE.get(("login", v)) is _MISSING:
+        return None
+    st = get_storage()
+    if not st:
+        return None
     try:
-        # supabase-py or() filter string
-        res = sb.table("app_users").select("*").or_(f"email.eq.{v},login_id.eq.{v}").limit(1).execute()
-        rows = res.data or []
-        return rows[0] if rows else None
+        row = await st.find_user(v)
     except Exception:
         return None
+    if not row:
+        _USER_CACHE.set(("login", v), _MISSING, ttl=NEGATIVE_CACHE_TTL)
+        return None
+    _cache_user(row)
+    return row
 
-# -------- Rate limit (login attempts) --------
+# -------- Login attempts (audit) --------
+# Rate limiting itself is local (backend/ratelimit.py); these are only used when LOGIN_AUDIT=true.
 # Table expected:
 # create table if not exists login_attempts (ip text, ts timestamptz default now());
-def is_rate_limited(ip: str, max_attempts: int, window_seconds: int) -> bool:
-    sb = get_client()
-    if not sb:
+async def is_rate_limited(ip: str, max_attempts: int, window_seconds: int) -> bool:
+    st = get_storage()
+    if not st:
         return False
     try:
         since = (datetime.now(timezone.utc) - timedelta(seconds=window_seconds)).isoformat()
-        res = sb.table("login_attempts").select("count(*)", count="exact").gte("ts", since).eq("ip", ip).execute()
-        # When using count="exact", the count lands on res.count or via content-range; robust fallback:
-        count = getattr(res, "count", None)
-        if count is None:
-            # Some drivers return rows; count(*) as count
-            rows = res.data or []
-            if rows and isinstance(rows[0], dict):
-                count = int(rows[0].get("count", 0))
-            else:
-                count = 0
-        return int(count) >= max_attempts
+        return await st.count_login_attempts(ip, since) >= max_attempts
     except Exception:
         return False
 
-def record_failed_attempt(ip: str) -> None:
-    sb = get_client()
-    if not sb:
+async def record_failed_attempt(ip: str) -> None:
+    st = get_storage()
+    if not st:
         return
     try:
-        sb.table("login_attempts").insert({"ip": ip}).execute()
+        await st.add_login_attempt(ip)
     except Exception:
         pass
 
-def clear_attempts(ip: str) -> None:
-    sb = get_client()
-    if not sb:
+async def clear_attempts(ip: str) -> None:
+    st = get_storage()
+    if not st:
         return
     try:
-        sb.table("login_attempts").delete().eq("ip", ip).execute()
+        await st.clear_login_attempts(ip)
     except Exception:
         pass
 
@@ -102,26 +180,31 @@ def clear_attempts(ip: str) -> None:
 #   current_period_end timestamptz not null,
 #   created_at timestamptz not null default now()
 # );
-def get_user_and_latest_sub(login_or_email: str) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
-    sb = get_client()
-    if not sb:
-        return None, None
-    user = get_user_by_login_or_email(login_or_email)
-    if not user:
-        return None, None
+async def get_latest_sub(user_id: str) -> Optional[Dict[str, Any]]:
+    """Latest subscription row for a user (read-through cached, misses included)."""
+    cached = _SUB_CACHE.get(user_id)
+    if cached is _MISSING:
+        return None
+    if cached is not None:
+        return cached
+    st = get_storage()
+    if not st:
+        return None
     try:
-        res = (
-            sb.table("subscriptions")
-            .select("*")
-            .eq("user_id", user["id"])
-            .order("created_at", desc=True)
-            .limit(1)
-            .execute()
-        )
-        sub = (res.data or [None])[0]
-        return user, sub
+        sub = await st.latest_subscription(user_id)
     except Exception:
-        return user, None
+        return None
+    if sub is None:
+        _SUB_CACHE.set(user_id, _MISSING, ttl=NEGATIVE_CACHE_TTL)
+    else:
+        _SUB_CACHE.set(user_id, sub)
+    return sub
+
+async def get_user_and_latest_sub(login_or_email: str) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    user = await get_user_by_login_or_email(login_or_email)
+    if not user:
+        return None, None
+    return user, await get_latest_sub(user["id"])
 
 def is_subscription_active(sub: Optional[Dict[str, Any]]) -> bool:
     if not sub:
@@ -136,111 +219,121 @@ def is_subscription_active(sub: Optional[Dict[str, Any]]) -> bool:
         return False
     return end_dt > datetime.now(timezone.utc) and (sub.get("status") in (None, "", "active"))
 
-def grant_user(login_or_email: str, days: int, plan: str = "manual") -> bool:
+# admin grant form values (templates/admin_users.html)
+PLAN_DAYS = {"1w": 7, "1m": 30, "1y": 365, "lifetime": 36500}
+
+async def grant_user(login_or_email: str, days: Any, plan: str = "manual") -> bool:
     """
-    Extend user's subscription by `days` from max(now, current end).
+    Extend user's subscription by `days` from max(now, current end). `days` may also be a
+    plan code from PLAN_DAYS ("1m"), which then becomes the plan name.
     Creates user row if missing? (No: return False to avoid side-effects.)
     """
-    sb = get_client()
-    if not sb:
+    if isinstance(days, str) and days in PLAN_DAYS:
+        days, plan = PLAN_DAYS[days], days
+    st = get_storage()
+    if not st:
         return False
-    user = get_user_by_login_or_email(login_or_email)
+    user = await get_user_by_login_or_email(login_or_email)
     if not user:
         return False
     try:
-        # fetch latest current_period_end if any
-        res = (
-            sb.table("subscriptions")
-            .select("current_period_end")
-            .eq("user_id", user["id"])
-            .order("created_at", desc=True)
-            .limit(1)
-            .execute()
-        )
-        now_ = datetime.now(timezone.utc)
-        if res.data:
-            raw = res.data[0].get("current_period_end")
-            try:
-                cur_end = datetime.fromisoformat(str(raw).replace("Z","+00:00"))
-            except Exception:
-                cur_end = now_
-        else:
-            cur_end = now_
-        new_end = max(now_, cur_end) + timedelta(days=days)
-        payload = {
-            "user_id": user["id"],
-            "plan": plan,
-            "status": "active",
-            "current_period_end": new_end.isoformat()
-        }
-        sb.table("subscriptions").insert(payload).execute()
+        await _extend_subscription(st, user, int(days), plan)
         return True
     except Exception:
         return False
 
-def delete_user(login_or_email: str) -> bool:
-    sb = get_client()
-    if not sb:
+async def _extend_subscription(st, user: Dict[str, Any], days: int, plan: str) -> datetime:
+    """
+    Insert a subscription row ending `days` after max(now, current end), update the user's
+    entitlement row to match and return the new end.
+    """
+    current = await st.get_entitlement(user["id"])
+    if current is not None:
+        cur_end_raw = current.get("active_until")
+    else:
+        latest = await st.latest_subscription(user["id"])  # not swept yet
+        cur_end_raw = latest.get("current_period_end") if latest else None
+    now_ = datetime.now(timezone.utc)
+    cur_end = now_
+    if cur_end_raw:
+        try:
+            cur_end = datetime.fromisoformat(str(cur_end_raw).replace("Z","+00:00"))
+        except Exception:
+            cur_end = now_
+    new_end = max(now_, cur_end) + timedelta(days=int(days))
+    payload = {
+        "user_id": user["id"],
+        "plan": plan,
+        "status": "active",
+        "current_period_end": new_end.isoformat()
+    }
+    await st.insert_subscription(payload)
+    invalidate_user(user)
+    await entitlements.record(st, user["id"], new_end, plan)
+    invalidate_active_users()
+    return new_end
+
+async def delete_user(login_or_email: str) -> bool:
+    st = get_storage()
+    if not st:
         return False
-    user = get_user_by_login_or_email(login_or_email)
+    user = await get_user_by_login_or_email(login_or_email)
     if not user:
         return False
     try:
         # subscriptions on delete cascade will handle if FK set; do explicit just in case
         try:
-            sb.table("subscriptions").delete().eq("user_id", user["id"]).execute()
+            await st.delete_subscriptions(user["id"])
+            await st.delete_entitlement(user["id"])
         except Exception:
             pass
-        sb.table("app_users").delete().eq("id", user["id"]).execute()
+        await st.delete_user(user["id"])
+        invalidate_user(user)
+        invalidate_active_users()
         return True
     except Exception:
         return False
 
-def list_active_users() -> List[Dict[str, Any]]:
-    sb = get_client()
-    if not sb:
-        return []
+async def count_active_users() -> int:
+    """Users with an active entitlement (one indexed query, cached for ACTIVE_USERS_TTL)."""
+    cached = _ACTIVE_USERS_CACHE.get("count")
+    if cached is not None:
+        return cached
     try:
-        now_iso = datetime.now(timezone.utc).isoformat()
-        res = sb.table("subscriptions").select("user_id,current_period_end,status").gt("current_period_end", now_iso).eq("status","active").execute()
-        active_user_ids = sorted({row["user_id"] for row in (res.data or []) if row.get("user_id")})
-        users: List[Dict[str, Any]] = []
-        for uid in active_user_ids:
-            ures = sb.table("app_users").select("id,name,email,login_id,role,created_at").eq("id", uid).limit(1).execute()
-            row = (ures.data or [None])[0]
-            if row:
-                users.append(row)
-        return users
+        n = len(await entitlements.active_entitlements())
     except Exception:
-        return []
+        return 0
+    _ACTIVE_USERS_CACHE.set("count", n)
+    return n
+
+def invalidate_active_users() -> None:
+    _ACTIVE_USERS_CACHE.clear()
 
 # Optional: expose last client error to the debug endpoint
 def _last_error() -> Optional[str]:
     return _LAST_ERROR
 
-def get_user_by_email(email: str):
-    sb = get_client()
-    if not sb:
+async def get_user_by_email(email: str):
+    st = get_storage()
+    if not st:
         return None
     try:
-        res = sb.table("app_users").select("*").eq("email", email.strip()).limit(1).execute()
-        rows = res.data or []
-        return rows[0] if rows else None
+        return await st.get_user("email", email.strip())
     except Exception:
         return None
 
-def set_role_admin(email: str) -> bool:
-    sb = get_client()
-    if not sb:
+async def set_role_admin(email: str) -> bool:
+    st = get_storage()
+    if not st:
         return False
     try:
         # ensure user exists
-        res = sb.table("app_users").select("id,role").eq("email", email.strip()).limit(1).execute()
-        rows = res.data or []
-        if not rows:
+        row = await st.get_user("email", email.strip())
+        if not row:
             return False
-        uid = rows[0]["id"]
-        sb.table("app_users").update({"role": "admin"}).eq("id", uid).execute()
+        uid = row["id"]
+        await st.update_user(uid, {"role": "admin"})
+        invalidate_user(uid)
         return True
     except Exception:
         return False
@@ -250,64 +343,38 @@ def _is_uuid_like(v: str) -> bool:
     import re
     return bool(re.fullmatch(r"[0-9a-fA-F-]{32,36}", v or ""))
 
-def _get_user_by_id(user_id: str):
-    sb = get_client()
-    if not sb: return None
+async def _get_user_by_id(user_id: str):
+    cached = _USER_CACHE.get(("id", user_id))
+    if isinstance(cached, dict):
+        return cached
+    st = get_storage()
+    if not st: return None
     try:
-        r = sb.table("app_users").select("*").eq("id", user_id).limit(1).execute()
-        rows = r.data or []
-        return rows[0] if rows else None
+        row = await st.get_user("id", user_id)
     except Exception:
         return None
+    return _cache_user(row) if row else row
 
-def add_days_from_current_end(identifier: str, days: int, plan: str = "manual"):
+async def add_days_from_current_end(identifier: str, days: int, plan: str = "manual"):
     """
     Extend subscription by `days` from max(now, current end) for the given user.
     `identifier` can be email, login_id, or user UUID.
     Returns ISO string of the new current_period_end on success, else None.
     """
-    sb = get_client()
-    if not sb:
+    st = get_storage()
+    if not st:
         return None
 
     # Resolve user
     user = None
     if _is_uuid_like(identifier):
-        user = _get_user_by_id(identifier)
+        user = await _get_user_by_id(identifier)
     if not user:
-        user = get_user_by_login_or_email(identifier)
+        user = await get_user_by_login_or_email(identifier)
     if not user:
         return None
 
     try:
-        # fetch latest end
-        res = (
-            sb.table("subscriptions")
-              .select("current_period_end")
-              .eq("user_id", user["id"])
-              .order("created_at", desc=True)
-              .limit(1)
-              .execute()
-        )
-        from datetime import datetime, timedelta, timezone
-        now_ = datetime.now(timezone.utc)
-        if res.data:
-            raw = res.data[0].get("current_period_end")
-            try:
-                cur_end = datetime.fromisoformat(str(raw).replace("Z","+00:00"))
-            except Exception:
-                cur_end = now_
-        else:
-            cur_end = now_
-
-        new_end = max(now_, cur_end) + timedelta(days=int(days))
-        payload = {
-            "user_id": user["id"],
-            "plan": plan,
-            "status": "active",
-            "current_period_end": new_end.isoformat()
-        }
-        sb.table("subscriptions").insert(payload).execute()
-        return new_end.isoformat()
+        return (await _extend_subscription(st, user, days, plan)).isoformat()
     except Exception:
         return None
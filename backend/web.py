@@ -0,0 +1,409 @@
+import os, json, time
+from typing import Dict, Any
+from fastapi import APIRouter, FastAPI, Request, Form, HTTPException, BackgroundTasks
+from fastapi.responses import RedirectResponse, HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.staticfiles import StaticFiles
+from fastapi.templating import Jinja2Templates
+from starlette.middleware.sessions import SessionMiddleware
+from loguru import logger
+
+from profitpilot.backend import metrics
+from profitpilot.backend.routes.debug import make_debug_router, has_debug_token
+from . import passwords
+from .supabase_utils import (
+    get_user_by_login_or_email, get_user_for_login, clear_attempts, record_failed_attempt,
+    grant_user, delete_user, count_active_users, close_client as close_supabase_client,
+)
+from .auth import create_user, verify_email_token, start_password_reset, finish_password_reset, rehash_password
+from .outbox import get_outbox, enqueue_email
+from .ipn_queue import get_ipn_queue, email_from_order
+from .nowpayments import create_invoice, verify_ipn_signature, forget_invoice, NP_API_KEY, get_client as get_nowpayments_client, close_client as close_nowpayments_client
+from .ratelimit import get_login_limiter
+from .storage import close_storage, STORAGE_BACKEND
+from .admin_users import USER_CSV_COLUMNS, SUBSCRIPTION_CSV_COLUMNS, search_users, user_batches, subscription_batches, csv_stream
+from . import entitlements, jobs
+
+templates = Jinja2Templates(directory="templates")
+
+SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-change-me")
+ADMIN_USERNAME = os.getenv("ADMIN_USERNAME", "admin")
+ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "admin123")
+# Mirror failed logins into Supabase login_attempts (audit only; limiting is local)
+LOGIN_AUDIT = os.getenv("LOGIN_AUDIT", "false").lower() == "true"
+
+router = APIRouter()
+
+def create_web_app() -> FastAPI:
+    """Web UI (sessions, templates, payments). Mounted at / by backend.app.create_app."""
+    app = FastAPI(title="ProfitPilotAI", version="0.1", on_startup=[_warm_pools], on_shutdown=[_close_pools])
+    app.add_middleware(metrics.MetricsMiddleware, app_name="web", router=app.router)
+    app.add_middleware(SessionMiddleware, secret_key=SECRET_KEY, session_cookie="ppai_sess", max_age=60*60*12, https_only=True, same_site="lax")
+    app.mount("/static", StaticFiles(directory="static"), name="static")
+    app.include_router(router)
+    # profiler + tracemalloc: /_debug/profile*, /_debug/tracemalloc*
+    app.include_router(make_debug_router(_require_debug_admin))
+    return app
+
+async def _warm_pools():
+    await passwords.warm_up()
+    if NP_API_KEY:
+        get_nowpayments_client()
+    get_outbox().start()
+    get_ipn_queue().start()
+    entitlements.get_sweeper().start()
+    if jobs.SCHEDULER_ENABLED:
+        jobs.get_job_service().start()
+
+async def _close_pools():
+    await close_storage()
+    await close_supabase_client()
+    await close_nowpayments_client()
+    passwords.shutdown()
+    get_outbox().stop()
+    await get_ipn_queue().stop()
+    await entitlements.get_sweeper().stop()
+    if jobs.SCHEDULER_ENABLED:
+        await jobs.get_job_service().stop()
+
+def _is_admin(request: Request) -> bool:
+    return bool(request.session.get("auth_ok")) and request.session.get("role") == "admin"
+
+def _require_admin(request: Request):
+    if not _is_admin(request):
+        raise HTTPException(status_code=404, detail="Not found")
+
+async def _require_debug_admin(request: Request):
+    """Admin session, or X-Debug-Token for curl; anything else gets a 404 like /_admin."""
+    if has_debug_token(request):
+        return
+    if request.session.get("auth_ok"):
+        u = await get_user_by_login_or_email(str(request.session.get("user") or ""))
+        if u and u.get("role") == "admin":
+            return
+    raise HTTPException(status_code=404, detail="Not found")
+
+async def _users_page(q: str = "", status: str = "active", after: str = "") -> Dict[str, Any]:
+    status = status if status in ("active", "all") else "active"
+    users, nxt = await search_users(q, status, after)
+    total = await count_active_users() if status == "active" and not q else None
+    return {"users": users, "q": q, "status": status, "after": after, "next": nxt, "total": total}
+
+def _csv_response(filename: str, chunks) -> StreamingResponse:
+    return StreamingResponse(chunks, media_type="text/csv",
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"', "Cache-Control": "no-store"})
+
+@router.get("/")
+async def login_page(request: Request):
+    if request.session.get("auth_ok"):
+        return RedirectResponse("/admin" if request.session.get("role") == "admin" else "/dashboard", status_code=302)
+    return templates.TemplateResponse("login.html", {"request": request, "error": None})
+
+@router.head("/")
+async def head_root():
+    return HTMLResponse("", status_code=200)
+
+@router.get("/login")
+async def login_form(request: Request):
+    return templates.TemplateResponse("login.html", {"request": request})
+
+@router.post("/login")
+async def login(request: Request, background_tasks: BackgroundTasks, username: str = Form(...), password: str = Form(...)):
+    ip = request.client.host if request.client else "unknown"
+    limiter = get_login_limiter()
+    if limiter.is_limited(ip):
+        return HTMLResponse("<h3>Too many attempts. Try again later.</h3>", status_code=429)
+    if passwords.is_saturated():
+        return HTMLResponse("<h3>Server busy. Try again shortly.</h3>", status_code=429)
+
+    def failed(error: str = "Invalid credentials"):
+        limiter.hit(ip)
+        if LOGIN_AUDIT:
+            background_tasks.add_task(record_failed_attempt, ip)
+        return templates.TemplateResponse("login.html", {"request": request, "error": error})
+
+    u = await get_user_for_login(username)
+    if not u:
+        return failed()
+    if not u.get("email_verified"):
+        return templates.TemplateResponse("login.html", {"request": request, "error": "Please verify your email first"})
+
+    try:
+        ok, needs_rehash = await passwords.verify_password(password, u.get("password_hash") or "")
+    except passwords.PasswordPoolBusy:
+        return HTMLResponse("<h3>Server busy. Try again shortly.</h3>", status_code=429)
+    if not ok:
+        return failed()
+    if needs_rehash:
+        background_tasks.add_task(rehash_password, u, password)
+
+    request.session["auth_ok"] = True
+    request.session["user"] = u["email"]
+    request.session["role"] = u.get("role") or "user"
+    limiter.reset(ip)
+    if LOGIN_AUDIT:
+        background_tasks.add_task(clear_attempts, ip)
+    # admin to /_admin; others to /dashboard
+    return RedirectResponse("/_admin" if u.get("role") == "admin" else "/dashboard", status_code=302)
+
+@router.get("/logout")
+async def logout(request: Request):
+    request.session.clear()
+    return RedirectResponse("/", status_code=302)
+
+@router.get("/health")
+async def health():
+    return {"status": "ok", "service": "profitpilotai"}
+
+@router.get("/_ping")
+async def ping():
+    return {"ok": True}
+
+@router.head("/uptime")
+async def uptime_head():
+    return HTMLResponse("", status_code=200)
+
+@router.get("/uptime")
+async def uptime_get():
+    return {"ok": True}
+
+@router.get("/robots.txt")
+async def robots():
+    return PlainTextResponse("User-agent: *\nDisallow: /_admin\n", status_code=200)
+
+@router.get("/metrics")
+async def metrics_get(request: Request):
+    if not metrics.scrape_allowed(request.headers.get("authorization", "")):
+        return JSONResponse({"ok": False}, status_code=403)
+    return HTMLResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+# --- Registration / verification / password reset ---
+
+@router.get("/register")
+async def register_page(request: Request):
+    if request.session.get("auth_ok"):
+        return RedirectResponse("/dashboard", status_code=302)
+    return templates.TemplateResponse("register.html", {"request": request, "error": None})
+
+@router.post("/register")
+async def register_post(request: Request, name: str = Form(...), address: str = Form(...), login_id: str = Form(...), email: str = Form(...), password: str = Form(...)):
+    try:
+        ok, token_or_err = await create_user(name, address, login_id, email, password)
+    except passwords.PasswordPoolBusy:
+        return HTMLResponse("<h3>Server busy. Try again shortly.</h3>", status_code=429)
+    if not ok:
+        return templates.TemplateResponse("register.html", {"request": request, "error": f"Registration failed: {token_or_err}"})
+    verify_link = f"{os.getenv('SITE_BASE','http://localhost:8000')}/verify?token={token_or_err}"
+    enqueue_email(email, "Verify your ProfitPilotAI account", f"<p>Hi {name},</p><p>Click to verify: <a href='{verify_link}'>Verify</a></p>")
+    return templates.TemplateResponse("verify_sent.html", {"request": request, "email": email})
+
+@router.get("/verify")
+async def verify(token: str):
+    if await verify_email_token(token):
+        return templates.TemplateResponse("verify_done.html", {"request": {}})
+    return templates.TemplateResponse("verify_error.html", {"request": {}}, status_code=400)
+
+@router.get("/forgot")
+async def forgot_page(request: Request):
+    return templates.TemplateResponse("forgot.html", {"request": request, "error": None})
+
+@router.post("/forgot")
+async def forgot_start(request: Request, login_or_email: str = Form(...)):
+    token = await start_password_reset(login_or_email)
+    if not token:
+        return templates.TemplateResponse("forgot.html", {"request": request, "error": "Account not found"})
+    link = f"{os.getenv('SITE_BASE','http://localhost:8000')}/reset?token={token}"
+    # queued; the outbox worker sends it with retries
+    enqueue_email(login_or_email, "Reset your ProfitPilotAI password", f"<p>Click to reset: <a href='{link}'>Reset password</a></p>")
+    return HTMLResponse("<h3>Check your email for a reset link.</h3>")
+
+@router.get("/reset")
+async def reset_page(request: Request, token: str):
+    return templates.TemplateResponse("reset.html", {"request": request, "token": token, "error": None})
+
+@router.post("/reset")
+async def reset_do(request: Request, token: str, password: str = Form(...)):
+    try:
+        done = await finish_password_reset(token, password)
+    except passwords.PasswordPoolBusy:
+        return HTMLResponse("<h3>Server busy. Try again shortly.</h3>", status_code=429)
+    if done:
+        return HTMLResponse("<h3>Password updated. You can now <a href='/'>sign in</a>.</h3>")
+    return templates.TemplateResponse("reset.html", {"request": request, "token": token, "error": "Invalid or expired token"}, status_code=400)
+
+# --- User dashboard + payments ---
+
+@router.get("/dashboard")
+async def user_dashboard(request: Request):
+    if not request.session.get("auth_ok"):
+        return RedirectResponse("/", status_code=302)
+    u = await get_user_by_login_or_email(str(request.session.get("user") or ""))
+    ent = await entitlements.get_entitlement(u["id"]) if u else None
+    sub = {"plan": ent["plan"], "status": "active" if ent["until"] > time.time() else "expired", "current_period_end": ent["active_until"]} if ent else None
+    return templates.TemplateResponse("user.html", {"request": request, "sub": sub})
+
+@router.post("/crypto/subscribe")
+async def crypto_subscribe(request: Request):
+    if not request.session.get("auth_ok"):
+        return RedirectResponse("/", status_code=302)
+    email = request.session.get("user")
+    url = await create_invoice(email=email, price_amount=100.0, price_currency="usd")
+    if not url:
+        return HTMLResponse("<h3>Crypto payments not configured.</h3>", status_code=500)
+    return RedirectResponse(url, status_code=303)
+
+@router.post("/crypto/ipn")
+async def crypto_ipn(request: Request):
+    raw = await request.body()
+    sig = request.headers.get("x-nowpayments-sig", "")
+    ok = verify_ipn_signature(raw, sig)
+    if not ok:
+        logger.warning("Invalid NOWPayments signature")
+        return JSONResponse({"ok": False, "error": "bad signature"}, status_code=400)
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        return JSONResponse({"ok": False, "error": "bad json"}, status_code=400)
+
+    # Typical statuses: waiting, confirming, confirmed, finished, failed, refunded
+    payment_status = data.get("payment_status")
+    order_id = data.get("order_id", "")
+    if not email_from_order(order_id):
+        return JSONResponse({"ok": False, "error": "no email"}, status_code=400)
+
+    # Invoice is closed: the next checkout should get a fresh one
+    if payment_status in ("finished", "confirmed", "failed", "expired", "refunded"):
+        forget_invoice(order_id)
+
+    # Persist (deduped on payment_id + status) and ack; the IPN worker grants the days once per payment
+    event_id, is_new = get_ipn_queue().record(data, raw)
+    return JSONResponse({"ok": True, "event_id": event_id, "duplicate": not is_new})
+
+# --- Scheduled strategy jobs (JSON) ---
+
+async def _session_user(request: Request) -> Dict[str, Any]:
+    u = await get_user_by_login_or_email(str(request.session.get("user") or "")) if request.session.get("auth_ok") else None
+    if not u:
+        raise HTTPException(status_code=401, detail="Login required")
+    return u
+
+@router.get("/jobs")
+async def jobs_list(request: Request):
+    u = await _session_user(request)
+    return {"jobs": await jobs.list_jobs(u["id"])}
+
+@router.post("/jobs")
+async def jobs_add(request: Request):
+    u = await _session_user(request)
+    try:
+        body = await request.json()
+        job = await jobs.add_job(u["id"], str(body["strategy"]), str(body["symbol"]), float(body["interval_seconds"]), body.get("params") or {})
+    except (KeyError, TypeError, ValueError) as e:
+        return JSONResponse({"ok": False, "error": str(e) if isinstance(e, ValueError) else "strategy, symbol and interval_seconds are required"}, status_code=400)
+    return {"ok": True, "job": job}
+
+@router.delete("/jobs/{job_id}")
+async def jobs_delete(request: Request, job_id: str):
+    u = await _session_user(request)
+    if not await jobs.remove_job(u["id"], job_id):
+        raise HTTPException(status_code=404, detail="Not found")
+    return {"ok": True}
+
+@router.get("/admin/scheduler")
+async def admin_scheduler(request: Request):
+    _require_admin(request)
+    if not jobs.SCHEDULER_ENABLED:
+        return {"enabled": False}
+    return dict(jobs.get_job_service().stats(), enabled=True)
+
+# --- Admin dashboard + Supabase user management ---
+
+@router.get("/_admin")
+async def admin_dashboard(request: Request):
+    if not _is_admin(request):
+        return RedirectResponse("/dashboard" if request.session.get("auth_ok") else "/", status_code=302)
+    return templates.TemplateResponse("admin.html", {"request": request, "health": {"status":"ok"}, "err": None})
+
+@router.post("/_admin/users/add")
+async def admin_add_user(request: Request, email: str = Form(...), plan: str = Form(...)):
+    _require_admin(request)
+    if not await grant_user(email, plan):
+        logger.error("Add user failed: {}", email)
+    return RedirectResponse("/dashboard" if request.session.get("user") != ADMIN_USERNAME else "/_admin", status_code=302)
+
+@router.post("/_admin/users/delete")
+async def admin_delete_user(request: Request, email: str = Form(...)):
+    _require_admin(request)
+    if not await delete_user(email):
+        logger.error("Delete user failed: {}", email)
+    return RedirectResponse("/dashboard" if request.session.get("user") != ADMIN_USERNAME else "/_admin", status_code=302)
+
+@router.get("/admin")
+async def admin_home(request: Request):
+    if not request.session.get("auth_ok"):
+        return RedirectResponse(url="/login", status_code=302)
+    if request.session.get("role") != "admin":
+        return HTMLResponse("<h3>Forbidden</h3>", status_code=403)
+    return templates.TemplateResponse("admin.html", {"request": request})
+
+@router.get("/admin/users")
+async def admin_users(request: Request, q: str = "", status: str = "active", after: str = ""):
+    if not _is_admin(request):
+        return RedirectResponse(url="/login", status_code=302)
+    return templates.TemplateResponse("admin_users.html", {"request": request, **await _users_page(q, status, after)})
+
+@router.get("/admin/users.csv")
+async def admin_users_csv(request: Request, q: str = "", status: str = "all"):
+    _require_admin(request)
+    status = status if status in ("active", "all") else "all"
+    return _csv_response("users.csv", csv_stream(USER_CSV_COLUMNS, user_batches(q, status)))
+
+@router.get("/admin/subscriptions.csv")
+async def admin_subscriptions_csv(request: Request):
+    _require_admin(request)
+    return _csv_response("subscriptions.csv", csv_stream(SUBSCRIPTION_CSV_COLUMNS, subscription_batches()))
+
+@router.post("/admin/users/grant")
+async def admin_grant(request: Request, identifier: str = Form(...), plan: str = Form(...)):
+    if not _is_admin(request):
+        return RedirectResponse(url="/login", status_code=302)
+    ok = await grant_user(identifier, plan)
+    msg = "Granted" if ok else "Failed"
+    return templates.TemplateResponse("admin_users.html", {"request": request, **await _users_page(), "flash": f"{msg} {identifier} => {plan}"})
+
+@router.post("/admin/users/delete")
+async def admin_delete(request: Request, identifier: str = Form(...)):
+    if not _is_admin(request):
+        return RedirectResponse(url="/login", status_code=302)
+    ok = await delete_user(identifier)
+    msg = "Deleted" if ok else "Failed"
+    return templates.TemplateResponse("admin_users.html", {"request": request, **await _users_page(), "flash": f"{msg} {identifier}"})
+
+# --- Diagnostics ---
+
+@router.get("/_debug/versions")
+async def _debug_versions():
+    import sys, importlib
+    wanted = ["httpx","supabase","gotrue","httpcore","starlette","fastapi"]
+    out = {}
+    for name in wanted:
+        try:
+            m = importlib.import_module(name)
+            out[name] = getattr(m, "__version__", "unknown")
+        except Exception as e:
+            out[name] = f"missing: {e}"
+    out["python"] = sys.version
+    return out
+
+@router.get("/_debug/supabase")
+async def _debug_supabase():
+    from .supabase_utils import get_client
+    url = os.getenv("SUPABASE_URL", "")
+    key = os.getenv("SUPABASE_KEY") or os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_SERVICE_KEY") or ""
+    masked = (key[:4] + "…" + key[-4:]) if key and len(key) > 12 else ("set" if key else "")
+    ok = bool(get_client())
+    try:
+        from .supabase_utils import _last_client_error
+        err = _last_client_error
+    except Exception:
+        err = None
+    return {"url_present": bool(url), "key_present": bool(key), "key_masked": masked, "client_ok": ok, "last_error": err, "storage_backend": STORAGE_BACKEND}
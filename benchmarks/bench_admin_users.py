@@ -0,0 +1,149 @@
+"""
+benchmarks/bench_admin_users.py
+
+Admin user directory (backend.admin_users) on a large SQLite user table.
+
+    python -m benchmarks.bench_admin_users --users 100000
+    python -m benchmarks.bench_admin_users --users 300000 --active 0.01
+
+Seeds --users users (a fraction --active of them entitled, one subscription each) into a temp
+database, then reports page latency at the start and deep in the table (keyset, next to the
+OFFSET query it replaces), prefix search latency by prefix length, and CSV export throughput
+(and the longest gap between chunks, i.e. the longest event-loop stall) with the peak Python
+memory the export allocates (tracemalloc), which should not grow with --users.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+import numpy as np
+
+
+def _pct(samples: List[float]) -> Dict[str, float]:
+    a = np.asarray(samples) * 1e3
+    return {"p50": float(np.percentile(a, 50)), "p99": float(np.percentile(a, 99)), "max": float(a.max())}
+
+
+def _seed(st, users: int, active: float) -> List[str]:
+    rnd = random.Random(1)
+    word = lambda n: "".join(rnd.choice(string.ascii_lowercase) for _ in range(n))
+    now = datetime.now(timezone.utc)
+    live, dead, created = (now + timedelta(days=30)).isoformat(), (now - timedelta(days=30)).isoformat(), now.isoformat()
+    users_rows, subs, ents, emails = [], [], [], []
+    for i in range(users):
+        uid = str(uuid.UUID(int=rnd.getrandbits(128)))
+        email = f"{word(6)}.{i}@example.com"
+        emails.append(email)
+        users_rows.append((uid, f"{word(5).title()} {word(7).title()}", f"{word(8)}{i}", email, created))
+        until = live if rnd.random() < active else dead
+        subs.append((str(uuid.UUID(int=rnd.getrandbits(128))), uid, "1m", "active", until, created))
+        ents.append((uid, "1m", until, created))
+    c = st._c()
+    c.execute("begin")
+    c.executemany("insert into app_users(id, name, login_id, email, created_at) values (?, ?, ?, ?, ?)", users_rows)
+    c.executemany("insert into subscriptions(id, user_id, plan, status, current_period_end, created_at) values (?, ?, ?, ?, ?, ?)", subs)
+    c.executemany("insert into entitlements(user_id, plan, active_until, updated_at) values (?, ?, ?, ?)", ents)
+    c.execute("commit")
+    c.execute("analyze")
+    return sorted(emails)
+
+
+async def _time(samples: List[float], coro):
+    t = time.perf_counter()
+    out = await coro
+    samples.append(time.perf_counter() - t)
+    return out
+
+
+async def _export(columns, make_batches) -> Dict[str, float]:
+    """One timed pass, then one under tracemalloc for the peak (it slows the pass down)."""
+    from backend.admin_users import csv_stream
+    t = time.perf_counter()
+    last, rows, size, worst = t, 0, 0, 0.0
+    async for chunk in csv_stream(columns, make_batches()):
+        now = time.perf_counter()
+        worst, last = max(worst, now - last), now
+        rows += chunk.count("\n")
+        size += len(chunk)
+    dt = time.perf_counter() - t
+    tracemalloc.start()
+    async for _ in csv_stream(columns, make_batches()):
+        pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"rows": rows - 1, "seconds": dt, "rows_per_s": (rows - 1) / dt, "chunk_ms": worst * 1e3,
+            "mb": size / 2**20, "peak_mb": peak / 2**20}
+
+
+async def run(args) -> None:
+    os.environ["STORAGE_BACKEND"] = "sqlite"
+    os.environ["STORAGE_SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(), "admin.db")
+    from backend import admin_users
+    from backend.storage import get_storage
+
+    st = get_storage()
+    t = time.perf_counter()
+    emails = _seed(st, args.users, args.active)
+    print(f"seeded {args.users} users ({args.active:.0%} active) in {time.perf_counter() - t:.1f}s")
+    size = admin_users.ADMIN_PAGE_SIZE
+    rnd = random.Random(7)
+
+    print(f"\n{'page (' + str(size) + ' rows)':<34} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for status in ("all", "active"):
+        first, deep, offset = [], [], []
+        for _ in range(args.reps):
+            await _time(first, admin_users.search_users(None, status))
+            after = emails[int(len(emails) * rnd.uniform(0.85, 0.99))]
+            await _time(deep, admin_users.search_users(None, status, after))
+            if status == "all":
+                t = time.perf_counter()
+                st._c().execute("select * from app_users order by email limit ? offset ?", (size, int(len(emails) * 0.9))).fetchall()
+                offset.append(time.perf_counter() - t)
+        lines = [(f"{status}: first page", first), (f"{status}: deep page (keyset)", deep)]
+        if offset:
+            lines.append((f"{status}: deep page (offset)", offset))
+        for label, samples in lines:
+            p = _pct(samples)
+            print(f"{label:<34} {p['p50']:>9.2f} {p['p99']:>9.2f} {p['max']:>9.2f}")
+
+    for status in ("all", "active"):
+        for n in (1, 2, 3):
+            samples = []
+            for _ in range(args.reps):
+                field = rnd.choice(("email", "login", "name"))
+                src = rnd.choice(emails)
+                q = {"email": src, "login": src.split(".")[0], "name": src.split(".")[0].title()}[field][:n]
+                await _time(samples, admin_users.search_users(q, status))
+            p = _pct(samples)
+            print(f"{status + ': search ' + str(n) + '-char prefix':<34} {p['p50']:>9.2f} {p['p99']:>9.2f} {p['max']:>9.2f}")
+
+    print(f"\n{'export':<18} {'rows':>9} {'s':>7} {'rows/s':>9} {'chunk ms':>9} {'csv MB':>8} {'peak MB':>8}")
+    for label, columns, make_batches in (
+        ("users.csv", admin_users.USER_CSV_COLUMNS, admin_users.user_batches),
+        ("subscriptions.csv", admin_users.SUBSCRIPTION_CSV_COLUMNS, admin_users.subscription_batches),
+    ):
+        r = await _export(columns, make_batches)
+        print(f"{label:<18} {r['rows']:>9} {r['seconds']:>7.2f} {r['rows_per_s']:>9.0f} {r['chunk_ms']:>9.1f} {r['mb']:>8.1f} {r['peak_mb']:>8.2f}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    ap.add_argument("--users", type=int, default=100000)
+    ap.add_argument("--active", type=float, default=0.05)
+    ap.add_argument("--reps", type=int, default=50)
+    args = ap.parse_args(argv)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+"""
+benchmarks/bench_login.py
+
+Login (bcrypt verify) throughput through backend.passwords' process pool.
+
+    python -m benchmarks.bench_login --seconds 5 --rounds 12
+
+For 1..N workers it keeps the pool saturated for `--seconds` and reports verifies/s
+and verifies/s per worker (~ per core), plus how many requests were shed with
+PasswordPoolBusy when offered more than BCRYPT_MAX_PENDING at once.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+
+async def _run(workers: int, seconds: float, concurrency: int):
+    from backend import passwords
+
+    passwords.BCRYPT_WORKERS = workers
+    passwords.BCRYPT_MAX_PENDING = workers * 8
+    passwords.shutdown()
+    await passwords.warm_up()
+    hashed = await passwords.hash_password("correct horse")
+
+    done = shed = 0
+    deadline = time.perf_counter() + seconds
+
+    async def client():
+        nonlocal done, shed
+        while time.perf_counter() < deadline:
+            try:
+                ok, _ = await passwords.verify_password("correct horse", hashed)
+                assert ok
+                done += 1
+            except passwords.PasswordPoolBusy:
+                shed += 1
+                await asyncio.sleep(0.001)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    passwords.shutdown()
+    return done / elapsed, shed
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    ap.add_argument("--seconds", type=float, default=3.0)
+    ap.add_argument("--rounds", type=int, default=int(os.getenv("BCRYPT_ROUNDS", "12")))
+    ap.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--concurrency", type=int, default=0, help="in-flight logins (default 16 per worker)")
+    args = ap.parse_args(argv)
+
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    print(f"bcrypt rounds={args.rounds}")
+    print(f"{'workers':>7} {'logins/s':>10} {'per worker':>11} {'shed':>6}")
+    for w in range(1, args.max_workers + 1):
+        rate, shed = asyncio.run(_run(w, args.seconds, args.concurrency or 16 * w))
+        print(f"{w:>7} {rate:>10.1f} {rate / w:>11.1f} {shed:>6}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
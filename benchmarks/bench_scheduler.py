@@ -0,0 +1,91 @@
+"""
+benchmarks/bench_scheduler.py
+
+Schedule drift, queue lag and fairness of profitpilot.backend.scheduler under overload.
+
+    python -m benchmarks.bench_scheduler
+    python -m benchmarks.bench_scheduler --heavy-jobs 4000 --light-users 500 --seconds 20
+
+One "heavy" user owns --heavy-jobs jobs and --light-users users own --light-jobs each, all on
+--interval. Each run awaits --run-ms (a stand-in for an order round trip) on --workers
+workers, so demand can exceed capacity. Reports the scheduler's own stats plus drift for
+light users alone: with fair queuing their runs start close to on time while the heavy
+user's backlog absorbs the overload.
+"""
+
+import argparse
+import asyncio
+import collections
+
+from profitpilot.backend.scheduler import JobScheduler, _percentiles
+
+
+class _Recording(JobScheduler):
+    def __init__(self, *a, **kw):
+        super().__init__(*a, **kw)
+        self.light_drift = []
+
+    async def _run(self, job, due, enqueued):
+        if job.user_id != "heavy":
+            self.light_drift.append(self._now() - due)
+        await super()._run(job, due, enqueued)
+
+
+async def run(args) -> dict:
+    served = collections.Counter()
+
+    async def runner(strategy, market_state):
+        served[market_state["user"]] += 1
+        await asyncio.sleep(args.run_ms / 1000.0)
+
+    sched = _Recording(workers=args.workers, runner=runner, prices=lambda symbol: [])
+    for i in range(args.heavy_jobs):
+        sched.add_job(f"h{i}", "heavy", "momentum_v1", "R_100", args.interval, {"user": "heavy"})
+    for u in range(args.light_users):
+        for i in range(args.light_jobs):
+            sched.add_job(f"l{u}-{i}", f"light{u}", "momentum_v1", "R_100", args.interval, {"user": f"light{u}"})
+
+    await sched.start()
+    await asyncio.sleep(args.seconds)
+    await sched.stop()
+    stats = sched.stats()
+    demand = (args.heavy_jobs + args.light_users * args.light_jobs) / args.interval
+    light_total = sum(v for k, v in served.items() if k != "heavy")
+    light_wanted = args.light_users * args.light_jobs * args.seconds / args.interval
+    return {
+        "demand_runs_per_s": demand,
+        "capacity_runs_per_s": args.workers * 1000.0 / args.run_ms,
+        "served_runs_per_s": stats["runs"] / args.seconds,
+        "heavy_runs": served["heavy"],
+        "light_runs": light_total,
+        "light_served_pct": 100.0 * light_total / max(1.0, light_wanted),
+        "stats": stats,
+        "light_drift": _percentiles(sched.light_drift),
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    ap.add_argument("--heavy-jobs", type=int, default=2000)
+    ap.add_argument("--light-users", type=int, default=200)
+    ap.add_argument("--light-jobs", type=int, default=2)
+    ap.add_argument("--interval", type=float, default=1.0)
+    ap.add_argument("--workers", type=int, default=8)
+    ap.add_argument("--run-ms", type=float, default=5.0)
+    ap.add_argument("--seconds", type=float, default=10.0)
+    args = ap.parse_args(argv)
+
+    res = asyncio.run(run(args))
+    st = res.pop("stats")
+    fmt = lambda p: f"p50 {p.get('p50_ms', 0):.1f} ms  p99 {p.get('p99_ms', 0):.1f} ms  max {p.get('max_ms', 0):.1f} ms"
+    print(f"jobs={st['jobs']} users={st['users']} workers={st['workers']} run={args.run_ms}ms interval={args.interval}s")
+    print(f"demand {res['demand_runs_per_s']:.0f} runs/s, capacity {res['capacity_runs_per_s']:.0f} runs/s, served {res['served_runs_per_s']:.0f} runs/s")
+    print(f"runs: heavy {res['heavy_runs']}, light {res['light_runs']} ({res['light_served_pct']:.0f}% of light demand)")
+    print(f"coalesced {st['coalesced']}  missed {st['missed']}  errors {st['errors']}")
+    print(f"drift (all):   {fmt(st['drift'])}")
+    print(f"drift (light): {fmt(res['light_drift'])}")
+    print(f"lag (all):     {fmt(st['lag'])}")
+
+
+if __name__ == "__main__":
+    main()
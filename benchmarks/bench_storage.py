@@ -0,0 +1,98 @@
+"""
+benchmarks/bench_storage.py
+
+Compare backend.storage implementations on the calls the web app makes per request.
+
+    python -m benchmarks.bench_storage --users 2000 --ops 5000
+    STORAGE_BENCH_SUPABASE=1 python -m benchmarks.bench_storage   # also hit the configured Supabase
+
+SQLite always runs (temp file). Supabase runs only when asked and SUPABASE_URL/KEY are set;
+it writes rows tagged with a `bench-` prefix and deletes them afterwards.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+import numpy as np
+
+
+def _pct(samples: List[float]) -> Dict[str, float]:
+    a = np.asarray(samples) * 1e6
+    return {"p50": float(np.percentile(a, 50)), "p99": float(np.percentile(a, 99)), "mean": float(a.mean())}
+
+
+async def _timed(samples: List[float], coro):
+    t = time.perf_counter()
+    out = await coro
+    samples.append(time.perf_counter() - t)
+    return out
+
+
+async def run(st, users: int, ops: int) -> Dict[str, Dict[str, float]]:
+    tag = f"bench-{int(time.time())}-"
+    res: Dict[str, List[float]] = {k: [] for k in ("insert_user", "find_user", "get_user_by_token", "latest_subscription", "insert_subscription", "active_subscriptions", "users_by_ids")}
+    end = (datetime.now(timezone.utc) + timedelta(days=30)).isoformat()
+    ids = []
+    for i in range(users):
+        row = await _timed(res["insert_user"], st.insert_user({
+            "name": f"user {i}", "address": "-", "login_id": f"{tag}{i}", "email": f"{tag}{i}@example.com",
+            "password_hash": "x", "verify_token": f"{tag}tok{i}",
+        }))
+        ids.append(row["id"])
+        if i % 2 == 0:
+            await _timed(res["insert_subscription"], st.insert_subscription({"user_id": row["id"], "plan": "1m", "status": "active", "current_period_end": end}))
+    rnd = random.Random(7)
+    try:
+        for _ in range(ops):
+            i = rnd.randrange(users)
+            await _timed(res["find_user"], st.find_user(f"{tag}{i}" if i % 2 else f"{tag}{i}@example.com"))
+            await _timed(res["get_user_by_token"], st.get_user("verify_token", f"{tag}tok{i}"))
+            await _timed(res["latest_subscription"], st.latest_subscription(ids[i]))
+        for _ in range(max(ops // 100, 5)):
+            await _timed(res["active_subscriptions"], st.active_subscriptions(datetime.now(timezone.utc).isoformat()))
+            start = rnd.randrange(max(users - 50, 1))
+            await _timed(res["users_by_ids"], st.users_by_ids(ids[start:start + 50], "id,name,email,login_id,role,created_at"))
+    finally:
+        for uid in ids:
+            await st.delete_subscriptions(uid)
+            await st.delete_user(uid)
+    return {k: _pct(v) for k, v in res.items() if v}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    ap.add_argument("--users", type=int, default=1000)
+    ap.add_argument("--ops", type=int, default=2000)
+    args = ap.parse_args(argv)
+
+    from backend.storage import SQLiteStorage, SupabaseStorage
+    backends = [("sqlite", lambda: SQLiteStorage(os.path.join(tempfile.mkdtemp(), "bench.db")))]
+    if os.getenv("STORAGE_BENCH_SUPABASE"):
+        from backend.supabase_utils import get_client
+        if get_client() is not None:
+            backends.append(("supabase", lambda: SupabaseStorage(get_client())))
+        else:
+            print("supabase: not configured, skipped")
+
+    async def go():
+        for name, make in backends:
+            st = make()
+            stats = await run(st, args.users if name == "sqlite" else min(args.users, 100), args.ops if name == "sqlite" else min(args.ops, 200))
+            print(f"\n[{name}]")
+            print(f"{'op':<22} {'p50 us':>10} {'p99 us':>10} {'mean us':>10}")
+            for op, s in stats.items():
+                print(f"{op:<22} {s['p50']:>10.1f} {s['p99']:>10.1f} {s['mean']:>10.1f}")
+            await st.close()
+
+    asyncio.run(go())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""
+benchmarks/bench_train_stream.py
+
+Peak server memory and throughput of /train/stream on a large upload.
+
+    python -m benchmarks.bench_train_stream --mb 512 --format rows
+    python -m benchmarks.bench_train_stream --mb 64 --format ndjson
+
+Starts `uvicorn profitpilot.backend.main:app`, streams a generated body of `--mb` megabytes
+(chunked transfer, never materialized client-side), and reports rows/s plus the server's
+peak RSS (VmHWM) before and after. Peak memory should not grow with --mb. Linux only
+(reads /proc/<pid>/status).
+"""
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+
+FEATURES = 8
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _vm_hwm_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def _body(fmt: str, total_bytes: int, chunk_rows: int = 8192):
+    rng = np.random.default_rng(0)
+    coef = np.arange(FEATURES, dtype=float)
+    sent = 0
+    while sent < total_bytes:
+        X = rng.normal(size=(chunk_rows, FEATURES))
+        y = X @ coef
+        if fmt == "rows":
+            data = np.c_[X, y].astype("<f8").tobytes()
+        else:
+            data = "".join('{"x":[%s],"y":%r}\n' % (",".join(map(repr, r)), t) for r, t in zip(X.tolist(), y.tolist())).encode()
+        sent += len(data)
+        yield data
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    ap.add_argument("--mb", type=int, default=256)
+    ap.add_argument("--format", choices=("rows", "ndjson"), default="rows")
+    ap.add_argument("--batch-size", type=int, default=4096)
+    args = ap.parse_args(argv)
+
+    tmp = tempfile.mkdtemp(prefix="pp-stream-")
+    env = dict(os.environ, MODEL_DIR=os.path.join(tmp, "models"), JWT_SECRET="train-stream-bench-secret-0123456789")
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "profitpilot.backend.main:app", "--port", str(port), "--log-level", "warning"], env=env)
+    try:
+        deadline = time.time() + 60
+        while True:
+            try:
+                if httpx.get(f"{base}/health", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.time() > deadline or proc.poll() is not None:
+                print("server did not start")
+                return 2
+            time.sleep(0.2)
+
+        os.environ["JWT_SECRET"] = env["JWT_SECRET"]
+        from profitpilot.backend.auth_utils import create_jwt_token
+        from profitpilot.backend.train_stream import ROWS_CONTENT_TYPE
+        headers = {"Authorization": f"Bearer {create_jwt_token('bench')}",
+                   "Content-Type": ROWS_CONTENT_TYPE if args.format == "rows" else "application/x-ndjson"}
+        # one small batch first so sklearn is imported and the model exists before measuring
+        httpx.post(f"{base}/train/stream?features={FEATURES}", headers=headers, content=next(_body(args.format, 1, 16)), timeout=60).raise_for_status()
+        before = _vm_hwm_mb(proc.pid)
+
+        t0 = time.perf_counter()
+        r = httpx.post(f"{base}/train/stream?features={FEATURES}&batch_size={args.batch_size}", headers=headers,
+                       content=_body(args.format, args.mb << 20), timeout=None)
+        elapsed = time.perf_counter() - t0
+        r.raise_for_status()
+        res = r.json()
+        after = _vm_hwm_mb(proc.pid)
+        print(f"format={args.format} body={args.mb} MB batch_size={args.batch_size}")
+        print(f"rows={res['samples']} batches={res['batches']} in {elapsed:.1f}s -> {res['samples'] / elapsed:,.0f} rows/s, {args.mb / elapsed:.1f} MB/s")
+        print(f"server peak RSS: {before:.0f} MB before, {after:.0f} MB after (+{after - before:.0f} MB)")
+        return 0
+    finally:
+        proc.terminate()
+        proc.wait(10)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+benchmarks/check_multiworker.py
+
+Multi-worker consistency check for the trading API: starts
+`uvicorn profitpilot.backend.main:app --workers N` on a shared SHARED_STATE_DB and
+MODEL_DIR, fires concurrent trades and training batches over fresh connections (so the
+kernel spreads them across workers), then checks that every worker reports the same
+order book, portfolio and model.
+
+    python -m benchmarks.check_multiworker --workers 3 --trades 60
+    python -m benchmarks.check_multiworker --no-shared   # shows the per-worker split it fixes
+
+Exits non-zero if any view disagrees. tests/test_multiworker.py runs the same check (with
+2 workers, plus the tick-engine lease) under pytest.
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BUY = {"strategy": "momentum_v1", "market_state": {"symbol": "R_100", "prices": [100, 101, 105]}}
+SELL = {"strategy": "momentum_v1", "market_state": {"symbol": "R_100", "prices": [105, 101, 100]}}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _fresh(method: str, url: str, headers, **kw):
+    # a new connection per call so requests land on different workers
+    async with httpx.AsyncClient(timeout=30) as c:
+        r = await c.request(method, url, headers=headers, **kw)
+        r.raise_for_status()
+        return r.json()
+
+
+async def _drive(base: str, headers, trades: int, batches: int):
+    buys = trades - trades // 3
+    jobs = [_fresh("POST", f"{base}/trade", headers, json=BUY) for _ in range(buys)]
+    jobs += [_fresh("POST", f"{base}/trade", headers, json=SELL) for _ in range(trades - buys)]
+    jobs += [_fresh("POST", f"{base}/train", headers, json={"X": [[i, 1, 2, 3, 4, 5, 6, 7]], "y": [i * 0.1]}) for i in range(batches)]
+    await asyncio.gather(*jobs)
+
+    views = []
+    for _ in range(12):
+        orders = (await _fresh("GET", f"{base}/orders", headers))["orders"]
+        portfolio = (await _fresh("GET", f"{base}/portfolio", headers))["portfolio"]
+        pred = (await _fresh("POST", f"{base}/predict", headers, json={"features": [1, 1, 1, 1, 1, 1, 1, 1]}))
+        views.append((len(orders), portfolio.get("R_100", {}).get("position"), round(float(pred["score"]), 9)))
+    return buys - (trades - buys), views
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    ap.add_argument("--workers", type=int, default=3)
+    ap.add_argument("--trades", type=int, default=60)
+    ap.add_argument("--batches", type=int, default=20)
+    ap.add_argument("--no-shared", action="store_true", help="run without SHARED_STATE_DB")
+    args = ap.parse_args(argv)
+
+    tmp = tempfile.mkdtemp(prefix="pp-mw-")
+    env = dict(os.environ, MODEL_DIR=os.path.join(tmp, "models"), JWT_SECRET="multiworker-check-secret-0123456789")
+    env.pop("EXECUTION_BACKEND", None)
+    env.pop("DERIV_TICK_SYMBOLS", None)
+    if args.no_shared:
+        env.pop("SHARED_STATE_DB", None)
+    else:
+        env["SHARED_STATE_DB"] = os.path.join(tmp, "state.db")
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "profitpilot.backend.main:app", "--port", str(port), "--workers", str(args.workers), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        deadline = time.time() + 60
+        while True:
+            try:
+                if httpx.get(f"{base}/health", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.time() > deadline or proc.poll() is not None:
+                print("server did not start")
+                return 2
+            time.sleep(0.3)
+        time.sleep(1.0)  # let every worker finish startup
+
+        os.environ["JWT_SECRET"] = env["JWT_SECRET"]
+        from profitpilot.backend.auth_utils import create_jwt_token
+        headers = {"Authorization": f"Bearer {create_jwt_token('multiworker-check')}"}
+
+        expected_pos, views = asyncio.run(_drive(base, headers, args.trades, args.batches))
+        print(f"workers={args.workers} shared={'no' if args.no_shared else 'yes'} trades={args.trades} batches={args.batches}")
+        print(f"expected: orders={args.trades} position={expected_pos}")
+        for v in sorted(set(views)):
+            print(f"  seen: orders={v[0]} position={v[1]} prediction={v[2]}  x{views.count(v)}")
+        ok = len(set(views)) == 1 and views[0][0] == args.trades and views[0][1] == expected_pos
+        print("OK" if ok else "INCONSISTENT")
+        return 0 if ok else 1
+    finally:
+        proc.terminate()
+        proc.wait(10)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
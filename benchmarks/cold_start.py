@@ -0,0 +1,84 @@
+"""
+benchmarks/cold_start.py
+
+Time-to-first-response of a freshly started server, i.e. what a Render cold start costs.
+
+    python -m benchmarks.cold_start                       # lazy (default) vs eager routers
+    python -m benchmarks.cold_start --runs 5 --target profitpilot.backend.main:app --path /health
+
+For each mode it starts `uvicorn <target>` `--runs` times and reports the median seconds
+from process start until: the first 200 from /health (when Render marks the deploy live),
+and the first 200 from each `--path` (first real page / API call). Storage is SQLite in a
+temp dir so nothing external is contacted.
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import httpx
+
+MODES = {"lazy": {"LAZY_ROUTERS": "true"}, "eager": {"LAZY_ROUTERS": "false"}}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ok(url: str, t0: float, proc, timeout: float = 60.0) -> float:
+    while True:
+        try:
+            if httpx.get(url, timeout=5).status_code == 200:
+                return time.perf_counter() - t0
+        except httpx.HTTPError:
+            pass
+        if proc.poll() is not None or time.perf_counter() - t0 > timeout:
+            raise RuntimeError(f"no 200 from {url}")
+        time.sleep(0.01)
+
+
+def run_once(target: str, paths: List[str], extra_env: Dict[str, str]) -> Dict[str, float]:
+    tmp = tempfile.mkdtemp(prefix="pp-cold-")
+    env = dict(os.environ, STORAGE_BACKEND="sqlite", STORAGE_SQLITE_PATH=os.path.join(tmp, "web.db"),
+               EMAIL_OUTBOX_DB=os.path.join(tmp, "outbox.db"), IPN_DB=os.path.join(tmp, "ipn.db"),
+               MODEL_DIR=os.path.join(tmp, "models"), **extra_env)
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", target, "--port", str(port), "--log-level", "warning"], env=env)
+    try:
+        out = {"/health": _wait_ok(f"{base}/health", t0, proc)}
+        for p in paths:
+            out[p] = _wait_ok(f"{base}{p}", t0, proc)
+        return out
+    finally:
+        proc.terminate()
+        proc.wait(10)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    ap.add_argument("--target", default="backend.main:app")
+    ap.add_argument("--path", action="append", help="paths to time after /health (default /login, /api/health)")
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--modes", default="lazy,eager")
+    args = ap.parse_args(argv)
+    paths = args.path or ["/login", "/api/health"]
+
+    print(f"target={args.target} runs={args.runs}  (median seconds since process start)")
+    print(f"{'mode':<8}" + "".join(f"{p:>14}" for p in ["/health"] + paths))
+    for mode in args.modes.split(","):
+        runs = [run_once(args.target, paths, MODES[mode]) for _ in range(args.runs)]
+        print(f"{mode:<8}" + "".join(f"{statistics.median(r[p] for r in runs):>14.2f}" for p in ["/health"] + paths))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
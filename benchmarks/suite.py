@@ -0,0 +1,300 @@
+"""
+benchmarks/suite.py
+
+Reproducible benchmark suite with stored baselines and a regression report.
+
+    python -m benchmarks.suite                      # run everything, compare to baselines.json
+    python -m benchmarks.suite -k http              # only benchmarks whose name contains "http"
+    python -m benchmarks.suite --save               # run and overwrite the stored baselines
+    python -m benchmarks.suite --tolerance 0.5      # allowed slowdown before a run fails
+
+Micro benchmarks time the hot functions directly (momentum_v1, mean_reversion_v1,
+IncrementalLearner.partial_train / predict, evaluate_and_trade, and decoding a 10k x 8 /train
+body as JSON vs the packed binary format). HTTP benchmarks drive both
+apps in-process over httpx's ASGI transport, so no server, network or external services:
+the web app runs on SQLiteStorage in a temp dir with a verified user, the trading API on a
+temp MODEL_DIR with in-memory shared state. Trades go through an instant execution backend;
+the 50ms simulated fill in dry-run mode would otherwise be all that gets measured.
+
+Each benchmark runs `--rounds` rounds of N calls after a warm-up and records the per-call
+time of the best round and the median round. Comparison uses the best round: interference
+from other processes only ever adds time, so the minimum is the most repeatable figure on a
+shared machine. A result is a regression when best > baseline best * (1 + tolerance).
+Exit status is 1 if any benchmark regressed, so CI can gate on it. Baselines are
+machine-specific: re-save them when the hardware changes.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+PRICES = [100 + (i % 17) * 0.37 - (i % 5) * 0.21 for i in range(60)]
+BUY = {"symbol": "R_100", "prices": [100, 101, 102, 103, 106]}
+FEATURES = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8]
+BATCH_X = [[(i * 7 + j) % 11 / 10 for j in range(8)] for i in range(32)]
+BATCH_Y = [sum(row) / 8 for row in BATCH_X]
+
+
+def _env(tmp: str):
+    # module-level config in both apps is read at import time, so set it before importing
+    os.environ.update({
+        "MODEL_DIR": os.path.join(tmp, "models"),
+        "STORAGE_BACKEND": "sqlite",
+        "STORAGE_SQLITE_PATH": os.path.join(tmp, "web.db"),
+        "EMAIL_OUTBOX_DB": os.path.join(tmp, "outbox.db"),
+        "IPN_DB": os.path.join(tmp, "ipn.db"),
+        "BCRYPT_ROUNDS": os.getenv("BCRYPT_ROUNDS", "4"),
+        "JWT_SECRET": "benchmark-suite-secret-0123456789abcdef",
+    })
+    for k in ("SHARED_STATE_DB", "EXECUTION_BACKEND", "DERIV_TICK_SYMBOLS", "SUPABASE_URL", "SUPABASE_KEY", "SMTP_USER"):
+        os.environ.pop(k, None)
+
+
+class Bench:
+    def __init__(self, name: str, fn: Callable, number: int, is_async: bool = False):
+        self.name = name
+        self.fn = fn
+        self.number = number
+        self.is_async = is_async
+
+    async def run(self, rounds: int) -> Dict[str, float]:
+        fn, n = self.fn, self.number
+        per_call: List[float] = []
+        for r in range(rounds + 1):  # round 0 is warm-up
+            t0 = time.perf_counter()
+            if self.is_async:
+                for _ in range(n):
+                    await fn()
+            else:
+                for _ in range(n):
+                    fn()
+            if r:
+                per_call.append((time.perf_counter() - t0) / n)
+        us = sorted(x * 1e6 for x in per_call)
+        return {"median_us": statistics.median(us), "min_us": us[0], "max_us": us[-1], "number": n, "rounds": rounds}
+
+
+def micro_benchmarks() -> List[Bench]:
+    from profitpilot.backend.strategy_service import momentum_v1, mean_reversion_v1
+    from profitpilot.backend.strategy_spec import compile_spec, MOMENTUM_SPEC, MEAN_REVERSION_SPEC
+    from profitpilot.backend.self_learning import IncrementalLearner
+    from profitpilot.backend import trading_service, packed
+    from profitpilot.backend.routes.api import TrainRequest
+    from backend import entitlements, supabase_utils
+    import numpy as np
+
+    learner = IncrementalLearner()
+    learner.partial_train(BATCH_X, BATCH_Y)
+    trading_service.set_execution_backend(_instant_fill)
+    state = {"symbol": "R_100", "prices": PRICES}
+
+    X = np.random.default_rng(3).normal(size=(10_000, 8))
+    y = X.sum(axis=1)
+    train_json = json.dumps({"X": X.tolist(), "y": y.tolist()}).encode()
+    train_packed = packed.encode(arrays={"X": X, "y": y})
+
+    mom_spec, mr_spec = compile_spec(MOMENTUM_SPEC), compile_spec(MEAN_REVERSION_SPEC)
+    rng = np.random.default_rng(4)
+    universe = {f"S{i}": (100 + np.cumsum(rng.normal(size=60))).tolist() for i in range(1000)}
+    series = 100 + np.cumsum(rng.normal(size=2000))
+    series_list = series.tolist()
+
+    def scan_handwritten():
+        for sym, prices in universe.items():
+            mean_reversion_v1({"symbol": sym, "prices": prices})
+
+    def backtest_handwritten():
+        for t in range(len(series_list)):
+            mean_reversion_v1({"prices": series_list[:t + 1]})
+
+    # access check: cached entitlement (epoch compare) vs cached latest subscription (ISO parse)
+    until = datetime.now(timezone.utc) + timedelta(days=30)
+    entitlements.remember("bench-user", until.isoformat(), "1m")
+    supabase_utils._SUB_CACHE.set("bench-user", {"status": "active", "current_period_end": until.isoformat()})
+
+    async def entitled():
+        await entitlements.is_entitled("bench-user")
+
+    async def subscription_active():
+        supabase_utils.is_subscription_active(await supabase_utils.get_latest_sub("bench-user"))
+
+    def decode_json():
+        req = TrainRequest.model_validate_json(train_json)
+        learner._as_matrix(req.X)
+
+    def decode_packed():
+        _, arrays = packed.decode(train_packed)
+        learner._as_matrix(arrays["X"])
+
+    async def trade():
+        await trading_service.evaluate_and_trade("momentum_v1", BUY, dry_run=False)
+
+    return [
+        Bench("micro.momentum_v1", lambda: momentum_v1(state), 20000),
+        Bench("micro.mean_reversion_v1", lambda: mean_reversion_v1(state), 5000),
+        Bench("micro.momentum_spec_v1", lambda: mom_spec.evaluate(state), 20000),
+        Bench("micro.mean_reversion_spec_v1", lambda: mr_spec.evaluate(state), 5000),
+        # 1000 symbols x 60 prices: hand-written loop vs one vectorized pass
+        Bench("micro.scan_1k_handwritten", scan_handwritten, 3),
+        Bench("micro.scan_1k_spec", lambda: mr_spec.scan(universe), 10),
+        # every step of a 2000-price series
+        Bench("micro.backtest_2k_handwritten", backtest_handwritten, 2),
+        Bench("micro.backtest_2k_spec", lambda: mr_spec.backtest(series), 50),
+        Bench("micro.predict", lambda: learner.predict(FEATURES), 2000),
+        # persists the model on every call, like /train does
+        Bench("micro.partial_train_32", lambda: learner.partial_train(BATCH_X, BATCH_Y), 100),
+        Bench("micro.evaluate_and_trade", trade, 2000, is_async=True),
+        Bench("micro.is_entitled", entitled, 20000, is_async=True),
+        Bench("micro.latest_sub_active", subscription_active, 20000, is_async=True),
+        Bench("micro.train_body_json_10k", decode_json, 10),
+        Bench("micro.train_body_packed_10k", decode_packed, 2000),
+    ]
+
+
+async def _instant_fill(order: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "order_id": f"bench-{time.perf_counter_ns()}",
+        "client_order_id": order.get("client_order_id"),
+        "symbol": order.get("symbol"),
+        "action": order.get("action"),
+        "usd_size": order.get("usd_size"),
+        "status": "filled",
+        "filled_at": time.time(),
+    }
+
+
+async def http_benchmarks(stack) -> List[Bench]:
+    import httpx
+    from profitpilot.backend.main import app as api_app
+    from profitpilot.backend.auth_utils import create_jwt_token
+    from profitpilot.backend import trading_service
+    from backend.main import app as web_app
+    from backend.auth import create_user
+    from backend.storage import get_storage
+
+    trading_service.set_execution_backend(_instant_fill)
+    api = await stack.enter_async_context(httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=api_app), base_url="http://api",
+        headers={"Authorization": f"Bearer {create_jwt_token('bench')}"},
+    ))
+    # SessionMiddleware is https_only, so the cookie only round-trips on an https base_url
+    web = await stack.enter_async_context(httpx.AsyncClient(transport=httpx.ASGITransport(app=web_app), base_url="https://web"))
+
+    ok, _ = await create_user("Bench", "-", "bench", "bench@example.com", "bench-password")
+    if ok:
+        st = get_storage()
+        u = await st.find_user("bench")
+        await st.update_user(u["id"], {"email_verified": True})
+    login = {"username": "bench", "password": "bench-password"}
+    r = await web.post("/login", data=login)
+    if r.status_code != 302 or r.headers.get("location") != "/dashboard":
+        raise RuntimeError(f"benchmark login failed: {r.status_code} {r.text[:200]}")
+
+    async def expect(coro: Awaitable, status: int):
+        r = await coro
+        if r.status_code != status:
+            raise RuntimeError(f"{r.request.method} {r.request.url.path}: {r.status_code} {r.text[:200]}")
+
+    # a separate client for /login so it doesn't reset the dashboard session
+    login_client = await stack.enter_async_context(httpx.AsyncClient(transport=httpx.ASGITransport(app=web_app), base_url="https://web"))
+    return [
+        Bench("http.api.trade", lambda: expect(api.post("/trade", json={"strategy": "momentum_v1", "market_state": BUY, "dry_run": False}), 200), 300, True),
+        Bench("http.api.predict", lambda: expect(api.post("/predict", json={"features": FEATURES}), 200), 300, True),
+        Bench("http.web.login", lambda: expect(login_client.post("/login", data=login), 302), 50, True),
+        Bench("http.web.dashboard", lambda: expect(web.get("/dashboard"), 200), 300, True),
+    ]
+
+
+def load_baselines(path: str) -> Dict[str, Any]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"machine": None, "results": {}}
+
+
+def report(results: Dict[str, Dict[str, float]], baseline: Dict[str, Any], tolerance: float) -> int:
+    base = baseline.get("results", {})
+    regressions = 0
+    print(f"{'benchmark':<28} {'best us':>10} {'median us':>10} {'baseline':>10} {'change':>8}")
+    for name, r in results.items():
+        b = base.get(name)
+        if b is None:
+            print(f"{name:<28} {r['min_us']:>10.1f} {r['median_us']:>10.1f} {'-':>10} {'new':>8}")
+            continue
+        change = r["min_us"] / b["min_us"] - 1
+        flag = ""
+        if change > tolerance:
+            flag = "  REGRESSION"
+            regressions += 1
+        elif change < -tolerance:
+            flag = "  faster"
+        print(f"{name:<28} {r['min_us']:>10.1f} {r['median_us']:>10.1f} {b['min_us']:>10.1f} {change:>+8.1%}{flag}")
+    if baseline.get("machine") and baseline["machine"] != _machine():
+        print(f"note: baselines were recorded on {baseline['machine']}")
+    return regressions
+
+
+def _machine() -> str:
+    return f"{platform.machine()} {platform.python_implementation()} {platform.python_version()} cpus={os.cpu_count()}"
+
+
+async def run(args) -> Dict[str, Dict[str, float]]:
+    from contextlib import AsyncExitStack
+
+    results: Dict[str, Dict[str, float]] = {}
+    async with AsyncExitStack() as stack:
+        benches = micro_benchmarks()
+        if not args.no_http:
+            benches += await http_benchmarks(stack)
+        for b in benches:
+            if args.k and args.k not in b.name:
+                continue
+            if args.quick:
+                b.number = max(1, b.number // 10)
+            results[b.name] = await b.run(args.rounds)
+    from backend import passwords
+    passwords.shutdown()
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    ap.add_argument("-k", help="only run benchmarks whose name contains this")
+    ap.add_argument("--rounds", type=int, default=5)
+    ap.add_argument("--quick", action="store_true", help="a tenth of the calls per round (smoke run)")
+    ap.add_argument("--no-http", action="store_true", help="micro benchmarks only")
+    ap.add_argument("--tolerance", type=float, default=0.35)
+    ap.add_argument("--baselines", default=BASELINES)
+    ap.add_argument("--save", action="store_true", help="write results as the new baselines")
+    args = ap.parse_args(argv)
+
+    _env(tempfile.mkdtemp(prefix="pp-bench-"))
+    results = asyncio.run(run(args))
+    baseline = load_baselines(args.baselines)
+    regressions = report(results, baseline, args.tolerance)
+    if args.save:
+        merged = dict(baseline.get("results", {}), **results)
+        with open(args.baselines, "w") as f:
+            json.dump({"machine": _machine(), "saved_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "results": merged}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"saved {len(results)} baselines to {args.baselines}")
+        return 0
+    if regressions:
+        print(f"{regressions} regression(s) beyond {args.tolerance:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,11 +3,14 @@ import json
 import websockets
 from loguru import logger
 
+from profitpilot.backend.tick_store import TickRecorder
+
 DERIV_APP_ID = "your_app_id"
 DERIV_TOKEN = "your_token"
 
-async def connect_deriv():
+async def connect_deriv(symbols=("frxEURUSD",), recorder=None, on_tick=None):
     url = f"wss://ws.derivws.com/websockets/v3?app_id={DERIV_APP_ID}"
+    recorder = recorder if recorder is not None else TickRecorder()
     async with websockets.connect(url) as ws:
         logger.info("Connected to Deriv WebSocket")
 
@@ -16,12 +19,22 @@ async def connect_deriv():
         auth_response = await ws.recv()
         logger.info(f"Auth Response: {auth_response}")
 
-        # Example: Subscribe to ticks for EURUSD
-        await ws.send(json.dumps({"ticks": "frxEURUSD"}))
+        # Subscribe to ticks
+        for symbol in symbols:
+            await ws.send(json.dumps({"ticks": symbol}))
 
-        while True:
-            msg = await ws.recv()
-            logger.info(f"Tick Data: {msg}")
+        try:
+            while True:
+                msg = json.loads(await ws.recv())
+                tick = msg.get("tick") if msg.get("msg_type") == "tick" else None
+                if not tick:
+                    logger.info(f"Deriv message: {msg}")
+                    continue
+                recorder.record(tick["symbol"], tick["epoch"], tick["quote"])
+                if on_tick is not None:
+                    on_tick(tick["symbol"], tick["epoch"], tick["quote"])
+        finally:
+            await asyncio.to_thread(recorder.flush)
 
 if __name__ == "__main__":
     asyncio.run(connect_deriv())
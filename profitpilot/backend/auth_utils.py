@@ -4,20 +4,34 @@ backend/auth_utils.py
 JWT + password hashing helpers and a FastAPI dependency to require auth.
 - Uses bcrypt for password hashing and PyJWT for tokens.
 - In production, set SECRET_KEY via environment variable (do NOT hardcode).
+- Verified tokens are kept in a bounded LRU (sha256 digest -> payload) until their `exp`,
+  so bots reusing one token skip signature verification; revoked tokens/subjects are
+  rejected on both the cached and the uncached path.
+- Revocations live in shared_state, so with SHARED_STATE_DB every worker honours a logout
+  or password change made through any of them.
 """
 
 import os
-from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
 
 import bcrypt
 import jwt
 from fastapi import HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
+from .shared_state import default_shared_state
+
 SECRET_KEY = os.getenv("JWT_SECRET", "change-this-secret")
 ALGORITHM = os.getenv("JWT_ALGO", "HS256")
 DEFAULT_EXPIRES_SECONDS = int(os.getenv("JWT_EXP_SECONDS", "86400"))  # 24h
+# longest lifetime create_jwt_token issues; subject revocations are dropped after it
+MAX_EXPIRES_SECONDS = max(int(os.getenv("JWT_MAX_EXP_SECONDS", "0")), DEFAULT_EXPIRES_SECONDS)
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "10000"))
+JWT_CACHE_TTL = int(os.getenv("JWT_CACHE_TTL", "300"))  # only for tokens without exp
 
 security = HTTPBearer(auto_error=False)
 
@@ -42,9 +56,17 @@ def verify_password(password: str, hashed: str) -> bool:
 
 
 def create_jwt_token(subject: str, expires_seconds: Optional[int] = None, extra: Optional[Dict[str, Any]] = None) -> str:
-    now = datetime.utcnow()
-    exp = now + timedelta(seconds=(expires_seconds or DEFAULT_EXPIRES_SECONDS))
-    payload = {"sub": subject, "iat": int(now.timestamp()), "exp": int(exp.timestamp())}
+    """
+    Signed token for `subject`, valid for `expires_seconds` (default JWT_EXP_SECONDS).
+    Raises ValueError above MAX_EXPIRES_SECONDS (JWT_MAX_EXP_SECONDS): revocations are only
+    kept that long.
+    """
+    lifetime = expires_seconds or DEFAULT_EXPIRES_SECONDS
+    if lifetime > MAX_EXPIRES_SECONDS:
+        raise ValueError(f"expires_seconds {lifetime} exceeds JWT_MAX_EXP_SECONDS ({MAX_EXPIRES_SECONDS})")
+    # sub-second iat, so revoke_subject() can tell tokens issued just before it from just after
+    now = time.time()
+    payload = {"sub": subject, "iat": round(now, 6), "exp": int(now + lifetime)}
     if extra:
         payload.update(extra)
     token = jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
@@ -64,14 +86,111 @@ def decode_jwt_token(token: str) -> Dict[str, Any]:
         raise HTTPException(status_code=401, detail="Invalid token")
 
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+class VerifiedTokenCache:
     """
-    FastAPI dependency: returns decoded token payload if valid, otherwise raises 401.
-    Accepts Bearer tokens.
+    LRU of verified token digests -> (expires_at, payload). An entry is dropped once its
+    `exp` passes, so a cached token expires exactly when jwt.decode would reject it.
+    Revocations go to `state` (shared_state), which every worker reads.
     """
+
+    def __init__(self, maxsize: int = JWT_CACHE_SIZE, state=None):
+        self.maxsize = maxsize
+        self.state = state if state is not None else default_shared_state
+        self._data: "OrderedDict[bytes, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, key: bytes) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            if item[0] <= time.time():
+                del self._data[key]
+                raise HTTPException(status_code=401, detail="Token expired")
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key: bytes, payload: Dict[str, Any]) -> None:
+        exp = payload.get("exp")
+        expires_at = float(exp) if isinstance(exp, (int, float)) else time.time() + JWT_CACHE_TTL
+        with self._lock:
+            self._data[key] = (expires_at, payload)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def is_revoked(self, key: bytes, payload: Dict[str, Any]) -> bool:
+        return self.state.is_revoked(key, str(payload.get("sub")), float(payload.get("iat") or 0))
+
+    def revoke(self, key: bytes, expires_at: Optional[float] = None) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+        # kept until the token would expire anyway
+        self.state.revoke_token(key, expires_at or time.time() + MAX_EXPIRES_SECONDS)
+
+    def revoke_subject(self, subject: str, issued_before: Optional[float] = None) -> None:
+        cutoff = time.time() if issued_before is None else issued_before
+        # every token issued before the cutoff has expired MAX_EXPIRES_SECONDS after it
+        self.state.revoke_subject(str(subject), cutoff, cutoff + MAX_EXPIRES_SECONDS)
+        with self._lock:
+            for k in [k for k, (_, p) in self._data.items() if str(p.get("sub")) == str(subject)]:
+                del self._data[k]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+default_token_cache = VerifiedTokenCache()
+
+
+def verify_token_cached(token: str) -> Dict[str, Any]:
+    """decode_jwt_token behind default_token_cache, honouring revocations."""
+    key = default_token_cache.digest(token)
+    payload = default_token_cache.get(key)
+    if payload is None:
+        payload = decode_jwt_token(token)
+        if not default_token_cache.is_revoked(key, payload):
+            default_token_cache.put(key, payload)
+    if default_token_cache.is_revoked(key, payload):
+        raise HTTPException(status_code=401, detail="Token revoked")
+    return payload
+
+
+def revoke_token(token: str) -> None:
+    """Reject this token from now on (e.g. logout), in every worker sharing SHARED_STATE_DB."""
+    try:
+        exp = jwt.decode(token, options={"verify_signature": False}).get("exp")
+    except jwt.InvalidTokenError:
+        exp = None
+    default_token_cache.revoke(default_token_cache.digest(token), float(exp) if exp else None)
+
+
+def revoke_subject(subject: str) -> None:
+    """Reject every token for `subject` issued up to now (e.g. password change)."""
+    default_token_cache.revoke_subject(subject)
+
+
+def _bearer_token(credentials: Optional[HTTPAuthorizationCredentials]) -> str:
     if not credentials:
         raise HTTPException(status_code=401, detail="Missing credentials")
     token = credentials.credentials
     if token.lower().startswith("bearer "):
         token = token[7:]
-    return decode_jwt_token(token)
+    return token
+
+
+def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """
+    FastAPI dependency: returns decoded token payload if valid, otherwise raises 401.
+    Accepts Bearer tokens. Repeat tokens are served from default_token_cache.
+    """
+    return dict(verify_token_cached(_bearer_token(credentials)))
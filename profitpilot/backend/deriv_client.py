@@ -0,0 +1,216 @@
+"""
+backend/deriv_client.py
+
+Pipelined Deriv WebSocket trading client, usable as trading_service's execution backend.
+
+- Each DerivConnection is authorized once and keeps many requests in flight: every request
+  carries a `req_id` and a single reader task resolves the matching future, so throughput
+  is not limited by request/response lockstep.
+- DerivClient spreads requests over a small pool of connections (least in-flight first),
+  reconnects dead connections lazily and enforces a client-side token-bucket rate limit.
+- place_order() maps an order dict to proposal -> buy (both on one connection, since
+  proposal ids are per connection) and returns a receipt in the same shape as the simulator's.
+
+Point DERIV_WS_URL at backend/deriv_fake.py's server to exercise it locally.
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import websockets
+from loguru import logger
+
+DERIV_WS_URL = os.getenv("DERIV_WS_URL", "wss://ws.derivws.com/websockets/v3")
+DERIV_APP_ID = os.getenv("DERIV_APP_ID", "1089")
+DERIV_API_TOKEN = os.getenv("DERIV_API_TOKEN", "")
+DERIV_POOL_SIZE = int(os.getenv("DERIV_POOL_SIZE", "2"))
+DERIV_RATE_PER_SEC = float(os.getenv("DERIV_RATE_PER_SEC", "20"))
+DERIV_TIMEOUT = float(os.getenv("DERIV_TIMEOUT", "10"))
+DERIV_CURRENCY = os.getenv("DERIV_CURRENCY", "USD")
+DERIV_DURATION = int(os.getenv("DERIV_DURATION", "5"))
+DERIV_DURATION_UNIT = os.getenv("DERIV_DURATION_UNIT", "t")
+
+CONTRACT_TYPES = {"buy": "CALL", "sell": "PUT"}
+
+
+class DerivAPIError(Exception):
+    def __init__(self, code: str, message: str):
+        super().__init__(f"{code}: {message}")
+        self.code = code
+        self.message = message
+
+
+class RateLimiter:
+    """
+    Async token bucket: `rate` requests per second with bursts up to `burst`.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self._tokens) / self.rate)
+
+
+class DerivConnection:
+    def __init__(self, url: str, token: str = "", timeout: float = DERIV_TIMEOUT):
+        self.url = url
+        self.token = token
+        self.timeout = timeout
+        self._ws = None
+        self._reader: Optional[asyncio.Task] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+
+    @property
+    def inflight(self) -> int:
+        return len(self._pending)
+
+    @property
+    def is_open(self) -> bool:
+        return self._ws is not None and self._reader is not None and not self._reader.done()
+
+    async def connect(self):
+        self._ws = await websockets.connect(self.url, max_size=2 ** 22)
+        self._reader = asyncio.get_running_loop().create_task(self._read_loop())
+        if self.token:
+            try:
+                await self.request({"authorize": self.token})
+            except BaseException:
+                await self.close()  # don't leak the socket and reader of a connection we won't use
+                raise
+
+    async def close(self):
+        if self._ws is not None:
+            await self._ws.close()
+        if self._reader is not None:
+            await asyncio.gather(self._reader, return_exceptions=True)
+
+    async def request(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if not self.is_open:
+            raise ConnectionError("Deriv connection is closed")
+        req_id = next(self._ids)
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[req_id] = fut
+        try:
+            await self._ws.send(json.dumps(dict(payload, req_id=req_id)))
+            msg = await asyncio.wait_for(fut, self.timeout)
+        finally:
+            self._pending.pop(req_id, None)
+        err = msg.get("error")
+        if err:
+            raise DerivAPIError(err.get("code", "Error"), err.get("message", ""))
+        return msg
+
+    async def _read_loop(self):
+        try:
+            async for raw in self._ws:
+                msg = json.loads(raw)
+                fut = self._pending.get(msg.get("req_id"))
+                if fut is not None and not fut.done():
+                    fut.set_result(msg)
+        except websockets.ConnectionClosed:
+            pass
+        except Exception:
+            logger.exception("Deriv reader failed")
+        finally:
+            for fut in self._pending.values():
+                if not fut.done():
+                    fut.set_exception(ConnectionError("Deriv connection lost"))
+
+
+class DerivClient:
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        token: str = DERIV_API_TOKEN,
+        pool_size: int = DERIV_POOL_SIZE,
+        rate_per_sec: float = DERIV_RATE_PER_SEC,
+        timeout: float = DERIV_TIMEOUT,
+    ):
+        self.url = url or f"{DERIV_WS_URL}?app_id={DERIV_APP_ID}"
+        self.token = token
+        self.timeout = timeout
+        self.limiter = RateLimiter(rate_per_sec)
+        self._pool: List[DerivConnection] = [DerivConnection(self.url, token, timeout) for _ in range(max(1, pool_size))]
+        self._reconnect_lock = asyncio.Lock()
+
+    async def start(self):
+        await asyncio.gather(*(c.connect() for c in self._pool))
+        logger.info("Deriv client connected ({} connections)", len(self._pool))
+
+    async def close(self):
+        await asyncio.gather(*(c.close() for c in self._pool), return_exceptions=True)
+
+    async def _connection(self) -> DerivConnection:
+        live = [c for c in self._pool if c.is_open]
+        if live:
+            return min(live, key=lambda c: c.inflight)
+        async with self._reconnect_lock:
+            for i, c in enumerate(self._pool):
+                if not c.is_open:
+                    self._pool[i] = DerivConnection(self.url, self.token, self.timeout)
+                    await self._pool[i].connect()
+                    return self._pool[i]
+            return min(self._pool, key=lambda c: c.inflight)
+
+    async def request(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        await self.limiter.acquire()
+        conn = await self._connection()
+        return await conn.request(payload)
+
+    async def place_order(self, order: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Buy a rise/fall contract for `order` (symbol, action, usd_size). Returns a receipt.
+        """
+        contract_type = CONTRACT_TYPES.get(order.get("action"))
+        if contract_type is None:
+            raise ValueError(f"Unsupported action {order.get('action')!r}")
+        amount = round(float(order["usd_size"]), 2)
+        # a proposal id is only valid on the connection that created it: proposal and buy
+        # must go out on the same socket
+        await self.limiter.acquire()
+        conn = await self._connection()
+        prop = await conn.request({
+            "proposal": 1,
+            "amount": amount,
+            "basis": "stake",
+            "contract_type": contract_type,
+            "currency": DERIV_CURRENCY,
+            "duration": DERIV_DURATION,
+            "duration_unit": DERIV_DURATION_UNIT,
+            "symbol": order["symbol"],
+        })
+        proposal = prop["proposal"]
+        await self.limiter.acquire()
+        bought = await conn.request({"buy": proposal["id"], "price": proposal["ask_price"]})
+        buy = bought["buy"]
+        return {
+            "order_id": str(buy.get("contract_id")),
+            "client_order_id": order.get("client_order_id"),
+            "symbol": order.get("symbol"),
+            "action": order.get("action"),
+            "usd_size": float(buy.get("buy_price", amount)),
+            "price": proposal.get("spot"),
+            "status": "filled",
+            "filled_at": buy.get("purchase_time", time.time()),
+            "raw": {"proposal_id": proposal["id"], "transaction_id": buy.get("transaction_id")},
+        }
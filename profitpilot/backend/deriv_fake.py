@@ -0,0 +1,89 @@
+"""
+backend/deriv_fake.py
+
+A minimal local stand-in for the Deriv WebSocket API (authorize, proposal, buy, ping),
+for exercising deriv_client without a real account.
+
+Each request is answered on its own task after `latency` seconds, so out-of-order
+responses and pipelining behave like the real service.
+
+    async with FakeDerivServer(latency=0.02) as server:
+        client = DerivClient(url=server.url, token="fake")
+"""
+
+import asyncio
+import itertools
+import json
+import random
+import time
+from typing import Any, Dict, Optional
+
+import websockets
+
+
+class FakeDerivServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.requests = 0
+        self._server = None
+        self._ids = itertools.count(1000)
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}"
+
+    async def start(self):
+        self._server = await websockets.serve(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def _handle(self, ws, path: Optional[str] = None):
+        tasks = set()
+        proposals: Dict[str, Dict[str, Any]] = {}  # like Deriv, proposals only exist on their own connection
+        async for raw in ws:
+            task = asyncio.get_running_loop().create_task(self._answer(ws, json.loads(raw), proposals))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+    async def _answer(self, ws, req: Dict[str, Any], proposals: Dict[str, Dict[str, Any]]):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency * random.uniform(0.5, 1.5))
+        resp = self._respond(req, proposals)
+        resp["req_id"] = req.get("req_id")
+        resp["echo_req"] = req
+        try:
+            await ws.send(json.dumps(resp))
+        except websockets.ConnectionClosed:
+            pass
+
+    def _respond(self, req: Dict[str, Any], proposals: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        if "authorize" in req:
+            return {"msg_type": "authorize", "authorize": {"loginid": "VRTC0000000", "currency": "USD", "balance": 10000}}
+        if "ping" in req:
+            return {"msg_type": "ping", "ping": "pong"}
+        if "proposal" in req:
+            pid = f"prop-{next(self._ids)}"
+            spot = round(random.uniform(0.9, 1.1), 5)
+            proposals[pid] = {"ask_price": req["amount"], "spot": spot}
+            return {"msg_type": "proposal", "proposal": {"id": pid, "ask_price": req["amount"], "spot": spot, "payout": round(req["amount"] * 1.95, 2)}}
+        if "buy" in req:
+            prop = proposals.pop(req["buy"], None)
+            if prop is None:
+                return {"msg_type": "buy", "error": {"code": "InvalidContractProposal", "message": "Unknown proposal"}}
+            cid = next(self._ids)
+            return {"msg_type": "buy", "buy": {"contract_id": cid, "transaction_id": cid * 2, "buy_price": prop["ask_price"], "purchase_time": int(time.time())}}
+        return {"msg_type": "error", "error": {"code": "UnrecognisedRequest", "message": "Unrecognised request"}}
@@ -0,0 +1,106 @@
+"""
+backend/live_feed.py
+
+In-process pub/sub for live dashboard updates (orders, positions, strategy signals).
+
+- publish() is O(1) regardless of the number of viewers: events go into a fixed-size ring
+  buffer and a single asyncio.Event wakes readers. Nothing is serialized on the trading path.
+- Each viewer keeps only a cursor into the ring. A read returns at most `max_batch` events;
+  "position" and "signal" events are coalesced per key (latest-wins) within a batch.
+- A viewer that falls more than `max_lag` events behind (or is overrun by the ring) skips
+  ahead and is told how many events it missed, so slow consumers never hold memory.
+- Each event is JSON-encoded once and the encoded form is shared by all viewers.
+"""
+
+import asyncio
+import json
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+RING_CAPACITY = 8192
+COALESCE_KINDS = ("position", "signal")
+
+
+class LiveFeed:
+    def __init__(self, capacity: int = RING_CAPACITY):
+        self.capacity = capacity
+        self._ring: List[Optional[list]] = [None] * capacity
+        self._seq = 0  # sequence number of the next event
+        self._changed: Optional[asyncio.Event] = None
+        self.published = 0
+
+    def head(self) -> int:
+        return self._seq
+
+    def publish(self, kind: str, key: Any, data: Dict[str, Any]):
+        """
+        Record an event. Must be called from the event loop thread.
+        """
+        seq = self._seq
+        self._ring[seq % self.capacity] = [seq, kind, key, data, None]
+        self._seq = seq + 1
+        self.published += 1
+        changed = self._changed
+        if changed is not None:
+            self._changed = None
+            changed.set()
+
+    async def wait(self, cursor: int, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until events past `cursor` exist. Returns False on timeout.
+        """
+        if cursor < self._seq:
+            return True
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def read(
+        self,
+        cursor: int,
+        max_batch: int = 256,
+        max_lag: int = 1024,
+        kinds: Optional[Sequence[str]] = None,
+    ) -> Tuple[List[Tuple[str, str]], int, int]:
+        """
+        Return (events, new_cursor, missed). Events are (kind, json) pairs in publish order.
+        """
+        head = self._seq
+        missed = 0
+        lag_limit = min(max_lag, self.capacity)
+        if head - cursor > lag_limit:
+            missed = head - cursor - lag_limit
+            cursor = head - lag_limit
+        end = min(head, cursor + max_batch)
+        batch = []
+        for seq in range(cursor, end):
+            entry = self._ring[seq % self.capacity]
+            if entry is None or entry[0] != seq:
+                missed += 1  # overwritten while we were reading
+                continue
+            if kinds is None or entry[1] in kinds:
+                batch.append(entry)
+        # coalesce position/signal updates per key, keeping the newest
+        latest: Dict[Tuple[str, Any], int] = {}
+        for i, entry in enumerate(batch):
+            if entry[1] in COALESCE_KINDS:
+                latest[(entry[1], entry[2])] = i
+        events = []
+        for i, entry in enumerate(batch):
+            if entry[1] in COALESCE_KINDS and latest[(entry[1], entry[2])] != i:
+                continue
+            if entry[4] is None:
+                entry[4] = json.dumps(entry[3], default=str)
+            events.append((entry[1], entry[4]))
+        return events, end, missed
+
+
+def format_sse(kind: str, data: str) -> str:
+    return f"event: {kind}\ndata: {data}\n\n"
+
+
+# Expose a default feed instance
+default_live_feed = LiveFeed()
@@ -2,106 +2,240 @@
 backend/main.py
 
 FastAPI app tying together strategy_service, trading_service, and self_learning.
-Provides routes:
+Provides routes (/health through /strategies are defined in routes/api.py):
+- GET  /health        -> liveness
 - POST /trade         -> run strategy and optionally execute (dry_run default true)
+- POST /scan          -> latest signal for many symbols from a declarative strategy
+- POST /backtest      -> replay a declarative strategy over a price series
 - POST /train         -> train incremental model with provided features+labels
+- POST /train/stream  -> train on a streamed NDJSON / binary-row upload in mini-batches
 - POST /predict       -> predict score for a feature vector
 - GET  /orders        -> list in-memory orders
 - GET  /portfolio     -> list in-memory portfolio
 - GET  /strategies    -> list available strategies
+- POST /engine/subscribe -> run a strategy on every tick of a symbol (tick_engine)
+- GET  /engine/stats  -> tick engine counters and per-stage latency
+- GET  /stream        -> Server-Sent Events: live order receipts, position changes, signals
+- POST /auth/logout   -> revoke the presented bearer token
+- GET  /metrics       -> Prometheus text: per-route and hot-path latency histograms
+- /_debug/profile*, /_debug/tracemalloc* -> sampling profiler / memory snapshots (X-Debug-Token)
 
 Auth is optional for dev; use Authorization: Bearer <token> to access protected endpoints.
 """
 
 import os
+import json
+import asyncio
+import random
+import time
+import uuid
 import uvicorn
-from typing import Dict, Any, List
-from fastapi import FastAPI, HTTPException, Body, Depends, Query
+from typing import Dict, Any
+from fastapi import FastAPI, HTTPException, Depends, Query, Request
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
+from loguru import logger
 
 from .strategy_service import default_strategy_manager
-from .trading_service import evaluate_and_trade, list_orders, get_portfolio
-from .self_learning import train_on_batch, predict_from_features
-from .auth_utils import get_current_user
+from .trading_service import get_portfolio, set_execution_backend
+from .auth_utils import get_current_user, revoke_token, security
+from fastapi.security import HTTPAuthorizationCredentials
+from .tick_engine import default_tick_engine
+from .shared_state import SHARED_STATE_DB, default_shared_state
+from .live_feed import default_live_feed, format_sse
+from . import metrics
+from .routes.api import router as api_router
+from .routes.debug import make_debug_router, require_debug_token
 
 app = FastAPI(title="ProfitPilotAI Backend", version="0.1")
+app.add_middleware(metrics.MetricsMiddleware, app_name="api", router=app.router)
+app.include_router(api_router)
+app.include_router(make_debug_router(require_debug_token))
+
+TICK_FEED_BACKOFF_MAX = float(os.getenv("TICK_FEED_BACKOFF_MAX", "60"))
+# the tick engine, Deriv feed and tick recorder run in one worker per host: the holder of this
+# lease in SHARED_STATE_DB (renewed every third of it; a crashed holder's lease lapses)
+TICK_ENGINE_LEASE = float(os.getenv("TICK_ENGINE_LEASE", "30"))
+WORKER_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
 
 # Pydantic models
-class TradeRequest(BaseModel):
+class EngineSubscribeRequest(BaseModel):
     strategy: str
-    market_state: Dict[str, Any]
-    dry_run: bool = True
+    symbol: str
+    params: Dict[str, Any] = {}
 
-class TrainRequest(BaseModel):
-    X: List[List[float]]
-    y: List[float]
 
-class PredictRequest(BaseModel):
-    features: List[float]
+@app.on_event("startup")
+async def start_execution_backend():
+    # EXECUTION_BACKEND=deriv sends non-dry-run orders to Deriv (see deriv_client for settings)
+    if os.getenv("EXECUTION_BACKEND", "simulator") == "deriv":
+        from .deriv_client import DerivClient
+        app.state.deriv = DerivClient()
+        await app.state.deriv.start()
+        set_execution_backend(app.state.deriv.place_order)
 
 
-@app.get("/health")
-def health():
-    return {"status": "ok", "service": "profitpilotai"}
+@app.on_event("shutdown")
+async def stop_execution_backend():
+    deriv = getattr(app.state, "deriv", None)
+    if deriv is not None:
+        set_execution_backend(None)
+        await deriv.close()
 
 
-@app.post("/trade")
-async def trade(req: TradeRequest, user=Depends(get_current_user)):
+async def _run_tick_feed(symbols):
     """
-    Evaluate strategy and execute if signal present. Requires auth dependency by default.
+    Keep the Deriv tick stream connected until cancelled: reconnect after errors or a closed
+    stream with capped, jittered exponential backoff (reset once a connection has lasted).
     """
-    strategy = req.strategy
-    if strategy not in default_strategy_manager.list_strategies():
-        raise HTTPException(status_code=400, detail="Strategy not found")
-    res = await evaluate_and_trade(strategy, req.market_state, dry_run=req.dry_run)
-    # optionally log to supabase in supabase_utils (omitted here)
-    return res
-
-
-@app.post("/train")
-def train(req: TrainRequest, user=Depends(get_current_user)):
+    from deriv_ws import connect_deriv
+    delay = min(1.0, TICK_FEED_BACKOFF_MAX)
+    while True:
+        started = time.monotonic()
+        try:
+            await connect_deriv(symbols, on_tick=default_tick_engine.on_tick)
+            logger.warning("tick feed: Deriv stream closed")
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("tick feed: Deriv stream failed")
+        if time.monotonic() - started > TICK_FEED_BACKOFF_MAX:
+            delay = min(1.0, TICK_FEED_BACKOFF_MAX)
+        await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+        delay = min(delay * 2, TICK_FEED_BACKOFF_MAX)
+
+
+async def _start_tick_leader(symbols):
+    await default_tick_engine.start()
+    _sync_engine_subscriptions()
+    if symbols:
+        app.state.tick_feed = asyncio.get_running_loop().create_task(_run_tick_feed(symbols))
+    logger.info("tick engine: leader is worker {}", WORKER_ID)
+
+
+async def _stop_tick_leader():
+    feed = getattr(app.state, "tick_feed", None)
+    if feed is not None:
+        feed.cancel()
+        await asyncio.gather(feed, return_exceptions=True)
+        app.state.tick_feed = None
+    await default_tick_engine.stop()
+
+
+def _sync_engine_subscriptions():
+    for sub in default_shared_state.list_subscriptions():
+        default_tick_engine.subscribe(sub["strategy"], sub["symbol"], sub["params"])
+
+
+async def _tick_leader_loop(symbols):
+    """Run the tick engine (and feed) only while this worker holds the lease."""
+    app.state.tick_leader = False
+    try:
+        while True:
+            try:
+                held = default_shared_state.acquire_lease("tick_engine", WORKER_ID, TICK_ENGINE_LEASE)
+            except Exception:
+                logger.exception("tick engine: lease check failed")
+                held = False
+            if held and not app.state.tick_leader:
+                await _start_tick_leader(symbols)
+            elif app.state.tick_leader and not held:
+                logger.warning("tick engine: lease lost by worker {}", WORKER_ID)
+                await _stop_tick_leader()
+            elif held:
+                _sync_engine_subscriptions()  # picks up /engine/subscribe calls made on other workers
+            app.state.tick_leader = held
+            await asyncio.sleep(TICK_ENGINE_LEASE / 3)
+    finally:
+        if app.state.tick_leader:
+            await _stop_tick_leader()
+            default_shared_state.release_lease("tick_engine", WORKER_ID)
+            app.state.tick_leader = False
+
+
+@app.on_event("startup")
+async def start_tick_engine():
+    # optional live feed: DERIV_TICK_SYMBOLS=frxEURUSD,R_100 (requires running from repo root)
+    symbols = [s.strip() for s in os.getenv("DERIV_TICK_SYMBOLS", "").split(",") if s.strip()]
+    if not SHARED_STATE_DB and int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+        # without a shared state file there is no lease: every worker would trade every tick
+        # and append to the same tick files
+        logger.error("tick engine disabled: WEB_CONCURRENCY > 1 needs SHARED_STATE_DB")
+        app.state.tick_leader = False
+        return
+    app.state.tick_leader_task = asyncio.get_running_loop().create_task(_tick_leader_loop(symbols))
+
+
+@app.on_event("shutdown")
+async def stop_tick_engine():
+    task = getattr(app.state, "tick_leader_task", None)
+    if task is not None:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        app.state.tick_leader_task = None
+
+
+@app.get("/metrics")
+def metrics_endpoint(request: Request):
+    if not metrics.scrape_allowed(request.headers.get("authorization", "")):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/stream")
+async def api_stream(request: Request, topics: str = Query("order,position,signal"), user=Depends(get_current_user)):
     """
-    Train incremental model on provided batch (X,y). Returns summary.
+    Push deltas instead of polling /orders and /portfolio. Starts with a portfolio snapshot;
+    slow clients get coalesced updates and a `missed` event when they fall behind.
     """
-    if not req.X or not req.y or len(req.X) != len(req.y):
-        raise HTTPException(status_code=400, detail="Invalid training batch")
-    train_on_batch(req.X, req.y)
-    return {"status": "trained", "samples": len(req.X)}
-
-
-@app.post("/predict")
-def predict(req: PredictRequest, user=Depends(get_current_user)):
+    kinds = tuple(t.strip() for t in topics.split(",") if t.strip())
+
+    async def events():
+        cursor = default_live_feed.head()
+        yield format_sse("snapshot", json.dumps({"portfolio": get_portfolio()}))
+        while not await request.is_disconnected():
+            if not await default_live_feed.wait(cursor, timeout=15.0):
+                yield ": keep-alive\n\n"
+                continue
+            batch, cursor, missed = default_live_feed.read(cursor, kinds=kinds)
+            if missed:
+                yield format_sse("missed", json.dumps({"count": missed, "portfolio": get_portfolio()}))
+            for kind, data in batch:
+                yield format_sse(kind, data)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@app.post("/engine/subscribe")
+async def engine_subscribe(req: EngineSubscribeRequest, user=Depends(get_current_user)):
     """
-    Predict a numeric score given feature vector.
+    Run `strategy` on every tick of `symbol` (coalesced if evaluation falls behind).
     """
-    if not req.features:
-        raise HTTPException(status_code=400, detail="Empty features")
-    try:
-        score = predict_from_features(req.features)
-        return {"score": float(score)}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-
-@app.get("/orders")
-def api_orders(user=Depends(get_current_user)):
-    return {"orders": list_orders()}
+    if req.strategy not in default_strategy_manager.list_strategies():
+        raise HTTPException(status_code=400, detail="Strategy not found")
+    # stored in shared state; the leader worker subscribes now if it's us, else within a lease tick
+    default_shared_state.add_subscription(req.strategy, req.symbol, req.params)
+    if getattr(app.state, "tick_leader", False):
+        default_tick_engine.subscribe(req.strategy, req.symbol, req.params)
+    subs: Dict[str, list] = {}
+    for sub in default_shared_state.list_subscriptions():
+        subs.setdefault(sub["symbol"], []).append(sub["strategy"])
+    return {"subscriptions": subs}
 
 
-@app.get("/portfolio")
-def api_portfolio(user=Depends(get_current_user)):
-    return {"portfolio": get_portfolio()}
+@app.get("/engine/stats")
+def engine_stats(user=Depends(get_current_user)):
+    # counters are per process: only the leader worker's are live
+    return dict(default_tick_engine.stats(), leader=getattr(app.state, "tick_leader", False), worker=WORKER_ID)
 
 
-@app.get("/strategies")
-def api_strategies():
-    return {"strategies": default_strategy_manager.list_strategies()}
+@app.post("/auth/logout")
+def logout(user=Depends(get_current_user), credentials: HTTPAuthorizationCredentials = Depends(security)):
+    token = credentials.credentials
+    revoke_token(token[7:] if token.lower().startswith("bearer ") else token)
+    return {"ok": True}
 
 
 if __name__ == "__main__":
-    # for dev: run with `python backend/main.py`
-    uvicorn.run("backend.main:app", host="0.0.0.0", port=int(os.getenv("PORT", "8000")), reload=True)
-if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
-
+    # for dev: run with `python -m profitpilot.backend.main`
+    uvicorn.run("profitpilot.backend.main:app", host="0.0.0.0", port=int(os.getenv("PORT", "8000")), reload=True)
@@ -0,0 +1,266 @@
+"""
+backend/metrics.py
+
+Low-overhead in-process metrics with Prometheus text exposition.
+
+- Histogram / Counter with fixed label names; children are cached per label tuple, so
+  recording is a dict lookup + bisect + two adds under a lock (~1us).
+- `timed(hist, *labels)` works as a context manager and as a decorator for sync and
+  async functions.
+- MetricsMiddleware is a plain ASGI middleware that records per-route request latency
+  (route template, not raw path, to keep label cardinality bounded).
+- render() returns the text format scraped from GET /metrics.
+
+Metrics are per process; with several uvicorn workers each worker reports its own series
+(scrape each worker, or sum in the query).
+"""
+
+import asyncio
+import functools
+import math
+import threading
+import time
+from bisect import bisect_left
+import os
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+# seconds: 50us .. 10s
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")  # if set, /metrics requires "Authorization: Bearer <token>"
+
+
+def _fmt(v: float) -> str:
+    return "+Inf" if v == math.inf else repr(float(v))
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.bounds = tuple(sorted(buckets))
+        self._children: Dict[Tuple[str, ...], _HistogramChild] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str) -> _HistogramChild:
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name}: expected labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, _HistogramChild(self.bounds))
+        return child
+
+    def observe(self, value: float, *labelvalues: str):
+        self.labels(*labelvalues).observe(value)
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, child in list(self._children.items()):
+            counts, total, n = child.snapshot()
+            acc = 0
+            for bound, c in zip(self.bounds + (math.inf,), counts):
+                acc += c
+                le = 'le="%s"' % _fmt(bound)
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, values, le)} {acc}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, values)} {total!r}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, values)} {n}")
+        return out
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = list(self._values.items())
+        for values, v in items:
+            out.append(f"{self.name}{_labels(self.labelnames, values)} {_fmt(v)}")
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def histogram(self, name: str, help: str, labelnames: Iterable[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        m = self._metrics.get(name)
+        if m is None:
+            m = self._metrics[name] = Histogram(name, help, labelnames, buckets)
+        return m
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+        m = self._metrics.get(name)
+        if m is None:
+            m = self._metrics[name] = Counter(name, help, labelnames)
+        return m
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for m in list(self._metrics.values()):
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+class timed:
+    """
+    Time a block or a function into `hist` with the given label values:
+
+        with timed(OP_SECONDS, "predict"): ...
+        @timed(OP_SECONDS, "execute_order")
+        async def execute_order(...): ...
+
+    Exceptions are counted in ERRORS under the same op label (first label value).
+    """
+
+    __slots__ = ("child", "op", "t0")
+
+    def __init__(self, hist: Histogram, *labelvalues: str):
+        self.child = hist.labels(*labelvalues)
+        self.op = labelvalues[0] if labelvalues else hist.name
+        self.t0 = 0.0
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.child.observe(time.perf_counter() - self.t0)
+        if exc_type is not None:
+            ERRORS.inc(self.op)
+        return False
+
+    def __call__(self, fn):
+        child, op = self.child, self.op
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def awrapper(*args, **kwargs):
+                t0 = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                except BaseException:
+                    ERRORS.inc(op)
+                    raise
+                finally:
+                    child.observe(time.perf_counter() - t0)
+            return awrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except BaseException:
+                ERRORS.inc(op)
+                raise
+            finally:
+                child.observe(time.perf_counter() - t0)
+        return wrapper
+
+
+# Expose a default registry and the shared series both apps record into
+default_registry = Registry()
+OP_SECONDS = default_registry.histogram("profitpilot_op_seconds", "Latency of hot-path operations.", ["op"])
+ERRORS = default_registry.counter("profitpilot_op_errors_total", "Operations that raised.", ["op"])
+HTTP_SECONDS = default_registry.histogram("profitpilot_http_request_seconds", "HTTP request latency by route.", ["app", "method", "route", "status"])
+
+
+def render() -> str:
+    return default_registry.render()
+
+
+def scrape_allowed(authorization: str) -> bool:
+    return not METRICS_TOKEN or authorization == f"Bearer {METRICS_TOKEN}"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: HTTP_SECONDS per (method, route template, status).
+
+    Pass the wrapped app's own `router`: when the app is mounted inside another one (see
+    backend/app.py), scope["router"] is the outer router, whose routes never hold our endpoints.
+    """
+
+    def __init__(self, app, app_name: str = "app", router=None):
+        self.app = app
+        self.app_name = app_name
+        self.router = router
+        self._routes: Dict[object, str] = {}
+
+    def _route_of(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        path = self._routes.get(endpoint)
+        if path is None:
+            path = "unmatched"
+            router = self.router if self.router is not None else scope.get("router")
+            for r in getattr(router, "routes", ()):
+                if getattr(r, "endpoint", None) is endpoint or getattr(r, "app", None) is endpoint:
+                    path = r.path
+                    break
+            self._routes[endpoint] = path
+        return path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_SECONDS.observe(time.perf_counter() - t0, self.app_name, scope["method"], self._route_of(scope), str(status[0]))
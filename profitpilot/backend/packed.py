@@ -0,0 +1,106 @@
+"""
+backend/packed.py
+
+Compact binary request bodies for array-heavy endpoints (/trade, /train).
+
+Content-Type: application/x-profitpilot-packed
+
+    offset 0   4 bytes   magic b"PPK1"
+    offset 4   uint32 LE length of the JSON header that follows
+    offset 8   JSON header (utf-8): {"fields": {...}, "arrays": [[name, [dim, ...]], ...]}
+               zero padding up to the next multiple of 8
+    then       each array in header order: little-endian float64, C order, padded to 8 bytes
+
+`fields` carries the small scalar parts of the request (strategy, symbol, dry_run, ...).
+Arrays decode with np.frombuffer straight over the request body: no per-element parsing or
+validation, and no copy (the views are read-only). Only shapes, sizes and offsets are
+checked; callers that feed a model should still reject non-finite values (one vectorized
+np.isfinite pass).
+"""
+
+import json
+import math
+import struct
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+CONTENT_TYPE = "application/x-profitpilot-packed"
+MAGIC = b"PPK1"
+MAX_DIMS = 4
+_F64 = np.dtype("<f8")
+
+
+class PackedError(ValueError):
+    pass
+
+
+def _pad8(n: int) -> int:
+    return -n % 8
+
+
+def is_packed(content_type: Optional[str]) -> bool:
+    return (content_type or "").split(";", 1)[0].strip().lower() == CONTENT_TYPE
+
+
+def encode(fields: Optional[Dict[str, Any]] = None, arrays: Optional[Dict[str, Any]] = None) -> bytes:
+    """Build a packed body. Array values may be anything np.asarray accepts."""
+    mats = [(name, np.ascontiguousarray(a, dtype=_F64)) for name, a in (arrays or {}).items()]
+    header = json.dumps({"fields": fields or {}, "arrays": [[name, list(a.shape)] for name, a in mats]},
+                        separators=(",", ":")).encode()
+    parts = [MAGIC, struct.pack("<I", len(header)), header, b"\0" * _pad8(len(header))]
+    for _, a in mats:
+        data = a.tobytes()
+        parts += [data, b"\0" * _pad8(len(data))]
+    return b"".join(parts)
+
+
+def decode(body: bytes) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    """Parse a packed body into (fields, {name: read-only float64 view}). Raises PackedError."""
+    if len(body) < 8 or body[:4] != MAGIC:
+        raise PackedError("not a packed payload (bad magic)")
+    (hlen,) = struct.unpack_from("<I", body, 4)
+    if 8 + hlen > len(body):
+        raise PackedError("truncated header")
+    try:
+        header = json.loads(body[8:8 + hlen])
+        fields = header.get("fields") or {}
+        specs = header.get("arrays") or []
+        if not isinstance(fields, dict):
+            raise TypeError("fields must be an object")
+    except (ValueError, TypeError, AttributeError) as e:
+        raise PackedError(f"bad header: {e}")
+
+    arrays: Dict[str, np.ndarray] = {}
+    offset = 8 + hlen + _pad8(hlen)
+    for spec in specs:
+        try:
+            name, shape = str(spec[0]), tuple(int(d) for d in spec[1])
+        except (TypeError, ValueError, IndexError, OverflowError):
+            raise PackedError(f"bad array spec {spec!r}")
+        if len(shape) > MAX_DIMS or any(d < 0 for d in shape):
+            raise PackedError(f"bad shape for {name}: {shape}")
+        # Python ints: np.prod(..., dtype=int64) wraps around on huge dims and can pass the check
+        count = math.prod(shape)
+        nbytes = count * 8
+        if offset + nbytes > len(body):
+            raise PackedError(f"truncated data for {name}")
+        try:
+            arrays[name] = np.frombuffer(body, dtype=_F64, count=count, offset=offset).reshape(shape)
+        except ValueError as e:  # e.g. a zero-size shape with a dim past NumPy's limit
+            raise PackedError(f"bad shape for {name}: {e}")
+        offset += nbytes + _pad8(nbytes)
+    return fields, arrays
+
+
+def require(arrays: Dict[str, np.ndarray], name: str, ndim: int) -> np.ndarray:
+    a = arrays.get(name)
+    if a is None:
+        raise PackedError(f"missing array '{name}'")
+    if a.ndim != ndim:
+        raise PackedError(f"'{name}' must be {ndim}-d, got shape {a.shape}")
+    return a
+
+
+def all_finite(*arrays: np.ndarray) -> bool:
+    return all(bool(np.isfinite(a).all()) for a in arrays)
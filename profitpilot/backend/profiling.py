@@ -0,0 +1,217 @@
+"""
+backend/profiling.py
+
+In-process diagnostics that can be switched on in a running server.
+
+- SamplingProfiler: a daemon thread wakes every `interval` seconds, grabs every other
+  thread's stack with sys._current_frames() and counts identical stacks. No tracing hooks,
+  so the app runs at full speed between samples (cost ~ stack depth per sample).
+  Output: collapsed stacks ("a;b;c 42", input for flamegraph.pl / speedscope) or a
+  speedscope JSON document.
+- MemoryTracker: tracemalloc start/stop, numbered snapshots and diffs between them
+  (top allocation sites by growth), to find things like an unbounded order store.
+"""
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+MAX_PROFILE_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "300"))
+
+
+def _frame_label(code) -> str:
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}:{code.co_firstlineno}"
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self.stopped_at: Optional[float] = None
+        self.interval = 0.005
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds: float = 10.0, interval: float = 0.005) -> bool:
+        """Start sampling for at most `seconds`. Returns False if a run is already active."""
+        with self._lock:
+            if self.running:
+                return False
+            self._stacks = Counter()
+            self.samples = 0
+            self.interval = max(0.001, float(interval))
+            self.started_at, self.stopped_at = time.time(), None
+            self._stop.clear()
+            seconds = min(max(float(seconds), 0.1), MAX_PROFILE_SECONDS)
+            self._thread = threading.Thread(target=self._run, args=(seconds,), name="sampling-profiler", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        t = self._thread
+        if t is not None:
+            t.join(timeout)
+
+    def _run(self, seconds: float):
+        me = threading.get_ident()
+        names = {}
+        deadline = time.monotonic() + seconds
+        stacks = self._stacks
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                name = names.get(tid)
+                if name is None:
+                    name = names[tid] = next((t.name for t in threading.enumerate() if t.ident == tid), str(tid))
+                parts = []
+                f = frame
+                while f is not None:
+                    parts.append(_frame_label(f.f_code))
+                    f = f.f_back
+                parts.append(name)
+                stacks[tuple(reversed(parts))] += 1
+            self.samples += 1
+            self._stop.wait(self.interval)
+        self.stopped_at = time.time()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "samples": self.samples,
+            "interval": self.interval,
+            "started_at": self.started_at,
+            "stopped_at": self.stopped_at,
+            "distinct_stacks": len(self._stacks),
+        }
+
+    def collapsed(self) -> str:
+        """One line per distinct stack: 'thread;outer;...;inner count' (root first)."""
+        items = sorted(list(self._stacks.items()), key=lambda kv: -kv[1])  # list(): atomic copy while sampling
+        return "".join(f"{';'.join(stack)} {n}\n" for stack, n in items)
+
+    def speedscope(self) -> Dict[str, Any]:
+        """Speedscope 'sampled' profile (https://www.speedscope.app/file-format-schema.json)."""
+        frames: "OrderedDict[str, int]" = OrderedDict()
+        samples: List[List[int]] = []
+        weights: List[int] = []
+        for stack, n in list(self._stacks.items()):
+            samples.append([frames.setdefault(label, len(frames)) for label in stack])
+            weights.append(n)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": [{"name": label} for label in frames]},
+            "profiles": [{
+                "type": "sampled",
+                "name": "profitpilot",
+                "unit": "none",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }],
+        }
+
+
+class MemoryTracker:
+    MAX_SNAPSHOTS = 8
+
+    def __init__(self):
+        self._snapshots: "OrderedDict[int, Tuple[float, tracemalloc.Snapshot]]" = OrderedDict()
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def start(self, frames: int = 10) -> Dict[str, Any]:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(max(1, int(frames)))
+        return self.status()
+
+    def stop(self) -> Dict[str, Any]:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        with self._lock:
+            self._snapshots.clear()
+        return self.status()
+
+    def status(self) -> Dict[str, Any]:
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+        return {
+            "tracing": tracing,
+            "frames": tracemalloc.get_traceback_limit() if tracing else 0,
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "snapshots": [{"id": i, "taken_at": t} for i, (t, _) in self._snapshots.items()],
+        }
+
+    @staticmethod
+    def _filtered(snap: tracemalloc.Snapshot) -> tracemalloc.Snapshot:
+        return snap.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+
+    def snapshot(self, key: str = "lineno", limit: int = 25) -> Dict[str, Any]:
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc is not running; start it first")
+        snap = self._filtered(tracemalloc.take_snapshot())
+        with self._lock:
+            sid = self._next_id
+            self._next_id += 1
+            self._snapshots[sid] = (time.time(), snap)
+            while len(self._snapshots) > self.MAX_SNAPSHOTS:
+                self._snapshots.popitem(last=False)
+        stats = snap.statistics(key)
+        return {
+            "id": sid,
+            "total_bytes": sum(s.size for s in stats),
+            "top": [self._stat(s) for s in stats[:limit]],
+        }
+
+    def diff(self, a: int, b: int, key: str = "lineno", limit: int = 25) -> Dict[str, Any]:
+        with self._lock:
+            if a not in self._snapshots or b not in self._snapshots:
+                raise KeyError(f"unknown snapshot id (have {list(self._snapshots)})")
+            (ta, sa), (tb, sb) = self._snapshots[a], self._snapshots[b]
+        diffs = sb.compare_to(sa, key)
+        return {
+            "a": a,
+            "b": b,
+            "seconds": tb - ta,
+            "size_diff_bytes": sum(d.size_diff for d in diffs),
+            "top": [self._stat_diff(d) for d in diffs[:limit]],
+        }
+
+    @staticmethod
+    def _where(tb: tracemalloc.Traceback) -> List[str]:
+        return [f"{f.filename}:{f.lineno}" for f in tb]
+
+    def _stat(self, s: tracemalloc.Statistic) -> Dict[str, Any]:
+        return {"where": self._where(s.traceback), "size_bytes": s.size, "count": s.count}
+
+    def _stat_diff(self, d: tracemalloc.StatisticDiff) -> Dict[str, Any]:
+        return {
+            "where": self._where(d.traceback),
+            "size_bytes": d.size,
+            "size_diff_bytes": d.size_diff,
+            "count": d.count,
+            "count_diff": d.count_diff,
+        }
+
+
+# Expose default instances
+default_profiler = SamplingProfiler()
+default_memory_tracker = MemoryTracker()
@@ -2,19 +2,94 @@
 backend/routes/api.py
 
 API router for strategy/trade/self-learning endpoints.
+
+/trade and /train also accept Content-Type: application/x-profitpilot-packed (see packed.py):
+prices / X / y arrive as raw float64 and reach the strategy and learner as NumPy views,
+skipping JSON parsing and per-element validation.
+
+/scan and /backtest run declarative strategies (strategy_spec.py) vectorized over many
+symbols / every step of a series.
+
+/train/stream trains on an arbitrarily large upload in fixed-size mini-batches as it arrives
+(NDJSON or binary rows, see train_stream.py).
 """
 
-from fastapi import APIRouter, HTTPException, Depends, Body
-from typing import Dict, Any, List
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+from typing import Dict, Any, List, Optional, Type, TypeVar
+import numpy as np
 
-from ..strategy_service import default_strategy_manager
+from .. import packed, train_stream
+from ..strategy_service import default_strategy_manager, StrategyError
 from ..trading_service import evaluate_and_trade, list_orders, get_portfolio
-from ..self_learning import train_on_batch, predict_from_features
 from ..auth_utils import get_current_user
 
 router = APIRouter()
 
 
+class TradeRequest(BaseModel):
+    strategy: str
+    market_state: Dict[str, Any]
+    dry_run: bool = True
+
+
+class TrainRequest(BaseModel):
+    X: List[List[float]]
+    y: List[float]
+
+
+class PredictRequest(BaseModel):
+    features: List[float]
+
+
+class ScanRequest(BaseModel):
+    strategy: str
+    prices: Dict[str, List[float]]
+    params: Dict[str, float] = {}
+
+
+class BacktestRequest(BaseModel):
+    strategy: str
+    prices: List[float]
+    params: Dict[str, float] = {}
+    fee: float = 0.0
+    equity: bool = False
+
+
+M = TypeVar("M", bound=BaseModel)
+
+
+def _validate(model: Type[M], data: Any, raw: bool = False) -> M:
+    # same 422 body FastAPI produces for a declared body parameter
+    try:
+        return model.model_validate_json(data) if raw else model.model_validate(data)
+    except ValidationError as e:
+        raise RequestValidationError([dict(err, loc=("body",) + tuple(err["loc"])) for err in e.errors(include_url=False, include_input=False)])
+
+
+def _decode_packed(raw: bytes):
+    try:
+        return packed.decode(raw)
+    except packed.PackedError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _require(arrays, name: str, ndim: int):
+    try:
+        return packed.require(arrays, name, ndim)
+    except packed.PackedError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _body_doc(model: Type[BaseModel], arrays: str) -> Dict[str, Any]:
+    return {"requestBody": {"required": True, "content": {
+        "application/json": {"schema": model.model_json_schema()},
+        packed.CONTENT_TYPE: {"schema": {"type": "string", "format": "binary", "description": arrays}},
+    }}}
+
+
 @router.get("/health")
 def health():
     return {"status": "ok", "service": "profitpilotai"}
@@ -25,21 +100,66 @@ def strategies():
     return {"strategies": default_strategy_manager.list_strategies()}
 
 
-class TradePayload:
-    strategy: str
-    market_state: Dict[str, Any]
-    dry_run: bool = True
+@router.post("/trade", openapi_extra=_body_doc(TradeRequest, "fields: strategy, dry_run, market_state (without prices); arrays: prices [n]"))
+async def trade(request: Request, user=Depends(get_current_user)):
+    """
+    Evaluate strategy and execute if signal present. Requires auth dependency by default.
+    """
+    raw = await request.body()
+    if packed.is_packed(request.headers.get("content-type")):
+        fields, arrays = _decode_packed(raw)
+        prices = _require(arrays, "prices", 1)
+        if not packed.all_finite(prices):
+            raise HTTPException(status_code=400, detail="prices contain NaN or inf")
+        req = _validate(TradeRequest, {"market_state": {}, **fields})
+        req.market_state["prices"] = prices
+    else:
+        req = _validate(TradeRequest, raw, raw=True)
+    if req.strategy not in default_strategy_manager.list_strategies():
+        raise HTTPException(status_code=400, detail="Strategy not found")
+    return await evaluate_and_trade(req.strategy, req.market_state, dry_run=req.dry_run)
 
 
-@router.post("/trade")
-async def trade(payload: Dict[str, Any], user=Depends(get_current_user)):
-    strategy = payload.get("strategy")
-    market_state = payload.get("market_state", {})
-    dry_run = payload.get("dry_run", True)
-    if strategy not in default_strategy_manager.list_strategies():
-        raise HTTPException(status_code=400, detail="Strategy not found")
-    res = await evaluate_and_trade(strategy, market_state, dry_run=dry_run)
-    return res
+def _compiled(name: str):
+    try:
+        return default_strategy_manager.get_compiled(name)
+    except StrategyError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/scan")
+async def scan(req: ScanRequest, user=Depends(get_current_user)):
+    """
+    Latest signal for every symbol in `prices` from one declarative strategy, computed in
+    one vectorized pass per history length. Nothing is traded.
+    """
+    compiled = _compiled(req.strategy)
+    signals = await run_in_threadpool(compiled.scan, req.prices, req.params)
+    return {"strategy": req.strategy, "signals": signals}
+
+
+@router.post("/backtest", openapi_extra=_body_doc(BacktestRequest, "fields: strategy, params, fee, equity; arrays: prices [n]"))
+async def backtest(request: Request, user=Depends(get_current_user)):
+    """
+    Replay a declarative strategy over a price series: position = signal * size_pct held to
+    the next step, `fee` charged per unit of position change.
+    """
+    raw = await request.body()
+    if packed.is_packed(request.headers.get("content-type")):
+        fields, arrays = _decode_packed(raw)
+        prices = _require(arrays, "prices", 1)
+        req = _validate(BacktestRequest, {**fields, "prices": []})
+    else:
+        req = _validate(BacktestRequest, raw, raw=True)
+        prices = req.prices
+    compiled = _compiled(req.strategy)
+    if len(prices) < 2 or not packed.all_finite(np.asarray(prices, dtype=float)):
+        raise HTTPException(status_code=400, detail="prices must be at least 2 finite values")
+    res = await run_in_threadpool(compiled.backtest, prices, req.params, req.fee)
+    equity = res.pop("equity")
+    if req.equity:
+        res["equity"] = equity.tolist()
+    return {"strategy": req.strategy, **res}
 
 
 @router.get("/orders")
@@ -52,23 +172,78 @@ def portfolio(user=Depends(get_current_user)):
     return {"portfolio": get_portfolio()}
 
 
-@router.post("/train")
-def train(payload: Dict[str, Any], user=Depends(get_current_user)):
-    X = payload.get("X")
-    y = payload.get("y")
-    if not X or not y or len(X) != len(y):
-        raise HTTPException(status_code=400, detail="Invalid training data")
-    train_on_batch(X, y)
+@router.post("/train", openapi_extra=_body_doc(TrainRequest, "arrays: X [n, features], y [n]"))
+async def train(request: Request, user=Depends(get_current_user)):
+    """
+    Train incremental model on provided batch (X,y). Returns summary.
+    """
+    raw = await request.body()
+    if packed.is_packed(request.headers.get("content-type")):
+        _, arrays = _decode_packed(raw)
+        X, y = _require(arrays, "X", 2), _require(arrays, "y", 1)
+        if not packed.all_finite(X, y):
+            raise HTTPException(status_code=400, detail="Training batch contains NaN or inf")
+    else:
+        req = _validate(TrainRequest, raw, raw=True)
+        X, y = req.X, req.y
+    if not len(X) or not len(y) or len(X) != len(y):
+        raise HTTPException(status_code=400, detail="Invalid training batch")
+    from ..self_learning import train_on_batch  # sklearn: imported on first use, not at startup
+    # the fit is CPU-bound; keep it off the event loop like the previous sync handler did
+    await run_in_threadpool(train_on_batch, X, y)
     return {"status": "trained", "samples": len(X)}
 
 
+@router.post("/train/stream", openapi_extra={"requestBody": {"required": True, "content": {
+    "application/x-ndjson": {"schema": {"type": "string", "description": 'one {"x": [...], "y": number} per line'}},
+    train_stream.ROWS_CONTENT_TYPE: {"schema": {"type": "string", "format": "binary", "description": "rows of features + 1 float64 LE values (?features=k)"}},
+}}})
+async def train_streamed(
+    request: Request,
+    batch_size: int = Query(4096, ge=1, le=65536),
+    features: Optional[int] = Query(None, ge=1, le=4096, description="feature count for binary rows"),
+    checkpoint_every: int = Query(16, ge=1, description="save the model every N batches"),
+    user=Depends(get_current_user),
+):
+    """
+    Train on a streamed upload in mini-batches of `batch_size` rows. Memory stays at one
+    batch regardless of body size. On a malformed row, batches before it stay trained and
+    the 400 reports how many were.
+    """
+    ctype = (request.headers.get("content-type") or "").split(";", 1)[0].strip().lower()
+    if ctype == train_stream.ROWS_CONTENT_TYPE:
+        if features is None:
+            raise HTTPException(status_code=400, detail="binary rows need ?features=<count>")
+        batches_in = train_stream.row_batches(request.stream(), features, batch_size)
+    elif ctype in train_stream.NDJSON_TYPES:
+        batches_in = train_stream.ndjson_batches(request.stream(), batch_size)
+    else:
+        raise HTTPException(status_code=415, detail=f"use application/x-ndjson or {train_stream.ROWS_CONTENT_TYPE}")
+
+    from ..self_learning import train_on_batch, flush_model
+    batches = samples = 0
+    try:
+        async for X, y in batches_in:
+            batches += 1
+            samples += len(y)
+            await run_in_threadpool(train_on_batch, X, y, persist=batches % checkpoint_every == 0)
+    except train_stream.StreamFormatError as e:
+        raise HTTPException(status_code=400, detail={"error": str(e), "samples": samples, "batches": batches})
+    finally:
+        await run_in_threadpool(flush_model)
+    return {"status": "trained", "samples": samples, "batches": batches}
+
+
 @router.post("/predict")
-def predict(payload: Dict[str, Any], user=Depends(get_current_user)):
-    features = payload.get("features")
-    if not features:
-        raise HTTPException(status_code=400, detail="No features provided")
+def predict(req: PredictRequest, user=Depends(get_current_user)):
+    """
+    Predict a numeric score given feature vector.
+    """
+    if not req.features:
+        raise HTTPException(status_code=400, detail="Empty features")
+    from ..self_learning import predict_from_features
     try:
-        score = predict_from_features(features)
+        score = predict_from_features(req.features)
         return {"score": float(score)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
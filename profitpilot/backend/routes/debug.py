@@ -0,0 +1,87 @@
+"""
+backend/routes/debug.py
+
+Diagnostics router (sampling profiler + tracemalloc), mounted under /_debug by both apps.
+Every route depends on the `guard` passed to make_debug_router, so each app brings its
+own admin check.
+
+- POST /_debug/profile/start?seconds=30&interval_ms=5
+- POST /_debug/profile/stop
+- GET  /_debug/profile?format=collapsed|speedscope|status
+- POST /_debug/tracemalloc/start?frames=10
+- POST /_debug/tracemalloc/snapshot?key=lineno&limit=25
+- GET  /_debug/tracemalloc/diff?a=1&b=2&key=lineno&limit=25
+- POST /_debug/tracemalloc/stop
+"""
+
+import hmac
+import os
+from typing import Callable
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
+
+from ..profiling import default_profiler, default_memory_tracker
+
+_KEYS = "^(lineno|filename|traceback)$"
+
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN")
+
+
+def has_debug_token(request: Request) -> bool:
+    """True if DEBUG_TOKEN is set and the request carries `X-Debug-Token: <token>`."""
+    sent = request.headers.get("x-debug-token", "")
+    return bool(DEBUG_TOKEN) and hmac.compare_digest(sent, DEBUG_TOKEN)
+
+
+def require_debug_token(request: Request):
+    # 404 rather than 401/403 so the endpoints don't advertise themselves
+    if not has_debug_token(request):
+        raise HTTPException(status_code=404, detail="Not Found")
+
+
+def make_debug_router(guard: Callable) -> APIRouter:
+    router = APIRouter(prefix="/_debug", dependencies=[Depends(guard)])
+
+    @router.post("/profile/start")
+    def profile_start(seconds: float = Query(10.0, gt=0), interval_ms: float = Query(5.0, ge=1)):
+        if not default_profiler.start(seconds, interval_ms / 1000.0):
+            raise HTTPException(status_code=409, detail="profiler already running")
+        return default_profiler.status()
+
+    @router.post("/profile/stop")
+    def profile_stop():
+        default_profiler.stop()
+        return default_profiler.status()
+
+    @router.get("/profile")
+    def profile_result(format: str = Query("collapsed", pattern="^(collapsed|speedscope|status)$")):
+        if format == "status":
+            return default_profiler.status()
+        if format == "speedscope":
+            return default_profiler.speedscope()
+        return PlainTextResponse(default_profiler.collapsed())
+
+    @router.post("/tracemalloc/start")
+    def tracemalloc_start(frames: int = Query(10, ge=1, le=100)):
+        return default_memory_tracker.start(frames)
+
+    @router.post("/tracemalloc/snapshot")
+    def tracemalloc_snapshot(key: str = Query("lineno", pattern=_KEYS), limit: int = Query(25, ge=1, le=500)):
+        try:
+            return default_memory_tracker.snapshot(key, limit)
+        except RuntimeError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+
+    @router.get("/tracemalloc/diff")
+    def tracemalloc_diff(a: int, b: int, key: str = Query("lineno", pattern=_KEYS), limit: int = Query(25, ge=1, le=500)):
+        try:
+            return default_memory_tracker.diff(a, b, key, limit)
+        except KeyError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+
+    @router.post("/tracemalloc/stop")
+    def tracemalloc_stop():
+        return default_memory_tracker.stop()
+
+    return router
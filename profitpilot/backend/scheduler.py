@@ -0,0 +1,315 @@
+"""
+backend/scheduler.py
+
+In-process scheduler for periodic strategy runs: thousands of (user, strategy, symbol,
+interval) jobs on one event loop, replacing external cron hitting /trade.
+
+- Timer: one heap of (due, seq, job) and a single timer task that sleeps until the earliest
+  due time, so idle jobs cost nothing. Schedules are fixed-rate (next = due + interval, not
+  finish + interval), so runs don't creep later over time; a job that falls more than a whole
+  interval behind skips the missed slots (counted as `missed`) instead of bursting. The first
+  run of a new job lands at a random offset within its interval to spread thundering herds.
+- Fair queue: due jobs enter one priority queue ordered by start-time fair queuing tags
+  (start = max(virtual time, user's last finish), finish = start + 1/weight). A user with
+  2000 jobs and a user with 2 share the workers by weight, not by job count, whenever there is
+  a backlog; each user's own jobs stay FIFO.
+- Workers: a fixed pool of `workers` tasks drains the queue, so at most that many runs are in
+  flight. A job that is still queued or running when it comes due again is coalesced (one
+  pending run per job), which also bounds the queue at the number of jobs.
+- Before running, `is_active(user_id)` is awaited; inactive users' jobs are skipped (counted)
+  and keep their schedule, so they resume on renewal. A run with no prices for its symbol
+  (no live feed for it in this process) is skipped too, counted as `skipped_no_prices`.
+- stats() reports drift (due -> run start), lag (time waiting in the fair queue) and run time
+  percentiles, plus run/skip/error counters.
+
+The default runner is trading_service.evaluate_and_trade on the tick engine's price window for
+the symbol. Run one scheduler per deployment: every process that starts one runs every job.
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+
+DEFAULT_WORKERS = 8
+LATENCY_SAMPLES = 4096
+
+Runner = Callable[[str, Dict[str, Any]], Awaitable[Any]]
+
+
+class Job:
+    __slots__ = ("id", "user_id", "strategy", "symbol", "interval", "params", "due", "pending", "runs", "gen")
+
+    def __init__(self, job_id: str, user_id: str, strategy: str, symbol: str, interval: float, params: Dict[str, Any]):
+        self.id = job_id
+        self.user_id = user_id
+        self.strategy = strategy
+        self.symbol = symbol
+        self.interval = float(interval)
+        self.params = params
+        self.due = 0.0
+        self.pending = False
+        self.runs = 0
+        self.gen = 0  # bumped on reschedule/removal; stale heap entries are dropped when popped
+
+    def key(self) -> Tuple[str, str, str, float, Tuple]:
+        return (self.user_id, self.strategy, self.symbol, self.interval, tuple(sorted(self.params.items())))
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"id": self.id, "user_id": self.user_id, "strategy": self.strategy, "symbol": self.symbol,
+                "interval": self.interval, "params": self.params, "runs": self.runs}
+
+
+async def _always_active(user_id: str) -> bool:
+    return True
+
+
+def _default_prices(symbol: str) -> List[float]:
+    from .tick_engine import default_tick_engine
+    return default_tick_engine.prices(symbol)
+
+
+def _percentiles(samples: Iterable[float]) -> Dict[str, Any]:
+    xs = sorted(samples)
+    n = len(xs)
+    if not n:
+        return {"count": 0}
+    return {
+        "count": n,
+        "p50_ms": xs[n // 2] * 1000.0,
+        "p90_ms": xs[min(n - 1, int(n * 0.9))] * 1000.0,
+        "p99_ms": xs[min(n - 1, int(n * 0.99))] * 1000.0,
+        "max_ms": xs[-1] * 1000.0,
+    }
+
+
+class JobScheduler:
+    def __init__(
+        self,
+        workers: int = DEFAULT_WORKERS,
+        runner: Optional[Runner] = None,
+        is_active: Callable[[str], Awaitable[bool]] = _always_active,
+        prices: Callable[[str], List[float]] = _default_prices,
+        dry_run: bool = True,
+        samples: int = LATENCY_SAMPLES,
+    ):
+        self.workers = max(1, int(workers))
+        self.dry_run = dry_run
+        self._runner = runner or self._evaluate_and_trade
+        self._is_active = is_active
+        self._prices = prices
+        self._jobs: Dict[str, Job] = {}
+        self._timers: List[Tuple[float, int, int, Job]] = []  # (due, seq, gen, job)
+        self._seq = itertools.count()
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._timer_wake: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._running = False
+        # fair queuing state
+        self._weights: Dict[str, float] = {}
+        self._finish: Dict[str, float] = {}  # user -> finish tag of their last queued run
+        self._vtime = 0.0
+        # stats
+        self._drift: Deque[float] = deque(maxlen=samples)
+        self._lag: Deque[float] = deque(maxlen=samples)
+        self._run_time: Deque[float] = deque(maxlen=samples)
+        self.runs = 0
+        self.errors = 0
+        self.skipped_inactive = 0
+        self.skipped_no_prices = 0
+        self.coalesced = 0
+        self.missed = 0
+        self.in_flight = 0
+
+    # -------------------------
+    # Jobs
+    # -------------------------
+    def add_job(self, job_id: str, user_id: str, strategy: str, symbol: str, interval: float,
+                params: Optional[Dict[str, Any]] = None) -> Job:
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        self.remove_job(job_id)
+        job = Job(job_id, user_id, strategy, symbol, interval, dict(params or {}))
+        self._jobs[job_id] = job
+        self._schedule(job, self._now() + random.uniform(0, job.interval))
+        return job
+
+    def remove_job(self, job_id: str) -> bool:
+        job = self._jobs.pop(job_id, None)
+        if job is None:
+            return False
+        job.gen += 1
+        return True
+
+    def sync(self, rows: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Make the job set equal to `rows` (dicts with id, user_id, strategy, symbol, interval and
+        optional params / weight). Unchanged jobs keep their place in the schedule.
+        """
+        seen = set()
+        added = 0
+        for r in rows:
+            job_id = str(r["id"])
+            seen.add(job_id)
+            if r.get("weight") is not None:
+                self.set_weight(str(r["user_id"]), float(r["weight"]))
+            new = Job(job_id, str(r["user_id"]), r["strategy"], r["symbol"], float(r["interval"]), dict(r.get("params") or {}))
+            old = self._jobs.get(job_id)
+            if old is not None and old.key() == new.key():
+                continue
+            self.add_job(new.id, new.user_id, new.strategy, new.symbol, new.interval, new.params)
+            added += 1
+        removed = [jid for jid in self._jobs if jid not in seen]
+        for jid in removed:
+            self.remove_job(jid)
+        return {"jobs": len(self._jobs), "added": added, "removed": len(removed)}
+
+    def jobs(self, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        return [j.as_dict() for j in self._jobs.values() if user_id is None or j.user_id == user_id]
+
+    def set_weight(self, user_id: str, weight: float):
+        """Relative share of the workers for `user_id` under contention (default 1)."""
+        if weight <= 0:
+            raise ValueError("weight must be positive")
+        self._weights[user_id] = weight
+
+    def _schedule(self, job: Job, due: float):
+        job.due = due
+        heapq.heappush(self._timers, (due, next(self._seq), job.gen, job))
+        if self._timer_wake is not None and self._timers[0][3] is job:
+            self._timer_wake.set()
+
+    def _now(self) -> float:
+        return time.monotonic()
+
+    # -------------------------
+    # Lifecycle
+    # -------------------------
+    async def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._queue = asyncio.PriorityQueue()
+        self._timer_wake = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._timer())]
+        self._tasks += [loop.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        self._running = False
+        tasks, self._tasks = self._tasks, []
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for job in self._jobs.values():
+            job.pending = False
+        self._queue = None
+        self._timer_wake = None
+
+    # -------------------------
+    # Timer + fair queue
+    # -------------------------
+    async def _timer(self):
+        wake = self._timer_wake
+        while self._running:
+            now = self._now()
+            while self._timers and self._timers[0][0] <= now:
+                due, _, gen, job = heapq.heappop(self._timers)
+                if gen != job.gen:
+                    continue  # removed or rescheduled
+                self._enqueue(job, due, now)
+                nxt = due + job.interval
+                if nxt <= now:  # more than a whole interval behind: skip to the next slot
+                    skipped = math.ceil((now - nxt) / job.interval) or 1
+                    self.missed += skipped
+                    nxt += skipped * job.interval
+                self._schedule(job, nxt)
+            wake.clear()
+            timeout = self._timers[0][0] - now if self._timers else None
+            try:
+                await asyncio.wait_for(wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _enqueue(self, job: Job, due: float, now: float):
+        if job.pending:
+            self.coalesced += 1
+            return
+        job.pending = True
+        start = max(self._vtime, self._finish.get(job.user_id, 0.0))
+        self._finish[job.user_id] = start + 1.0 / self._weights.get(job.user_id, 1.0)
+        self._queue.put_nowait((start, next(self._seq), job, job.gen, due, now))
+
+    async def _worker(self):
+        queue = self._queue
+        while self._running:
+            start, _, job, gen, due, enqueued = await queue.get()
+            self._vtime = max(self._vtime, start)
+            if gen != job.gen:
+                job.pending = False
+                continue
+            try:
+                await self._run(job, due, enqueued)
+            finally:
+                job.pending = False
+
+    async def _run(self, job: Job, due: float, enqueued: float):
+        try:
+            if not await self._is_active(job.user_id):
+                self.skipped_inactive += 1
+                return
+        except Exception:
+            self.errors += 1
+            logger.exception("scheduler: subscription check failed for {}", job.user_id)
+            return
+        prices = self._prices(job.symbol)
+        if not prices:
+            self.skipped_no_prices += 1
+            return
+        started = self._now()
+        self._drift.append(started - due)
+        self._lag.append(started - enqueued)
+        market_state = dict(job.params, symbol=job.symbol, prices=prices)
+        self.in_flight += 1
+        try:
+            await self._runner(job.strategy, market_state)
+            job.runs += 1
+            self.runs += 1
+        except Exception:
+            self.errors += 1
+            logger.exception("scheduler: job {} ({} on {}) failed", job.id, job.strategy, job.symbol)
+        finally:
+            self.in_flight -= 1
+            self._run_time.append(self._now() - started)
+
+    async def _evaluate_and_trade(self, strategy: str, market_state: Dict[str, Any]):
+        from .trading_service import evaluate_and_trade
+        return await evaluate_and_trade(strategy, market_state, dry_run=self.dry_run)
+
+    # -------------------------
+    # Stats
+    # -------------------------
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._running,
+            "jobs": len(self._jobs),
+            "users": len({j.user_id for j in self._jobs.values()}),
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "in_flight": self.in_flight,
+            "runs": self.runs,
+            "errors": self.errors,
+            "skipped_inactive": self.skipped_inactive,
+            "skipped_no_prices": self.skipped_no_prices,
+            "coalesced": self.coalesced,
+            "missed": self.missed,
+            "drift": _percentiles(self._drift),
+            "lag": _percentiles(self._lag),
+            "run_time": _percentiles(self._run_time),
+        }
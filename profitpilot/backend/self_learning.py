@@ -8,6 +8,9 @@ intended as a lightweight 'self-learning' starter:
 - model predicts a numeric 'signal_score' (higher -> more likely to buy)
 - You provide features + a target label when calling /train
 - Model persists to disk via joblib
+- Several worker processes can share one model directory: saves are atomic and
+  serialized by a lock file, and a learner reloads when another process saved a
+  newer model (checked by file mtime before predict/train)
 
 Notes:
 - This is not RL. It's a supervised incremental learner (Option A).
@@ -15,15 +18,25 @@ Notes:
 """
 
 import os
-from typing import List, Dict, Any, Optional
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Union
 import numpy as np
 from sklearn.linear_model import SGDRegressor
 from sklearn.preprocessing import StandardScaler
 import joblib
 
+from .metrics import OP_SECONDS, timed
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX: single-process only
+    fcntl = None
+
 MODEL_DIR = os.getenv("MODEL_DIR", "./models")
 MODEL_PATH = os.path.join(MODEL_DIR, "sgd_regressor.joblib")
 SCALER_PATH = os.path.join(MODEL_DIR, "scaler.joblib")
+LOCK_PATH = os.path.join(MODEL_DIR, ".model.lock")
 
 DEFAULT_FEATURE_COUNT = 8
 
@@ -36,14 +49,50 @@ class IncrementalLearner:
         self.n_features = n_features
         self.model: Optional[SGDRegressor] = None
         self.scaler: Optional[StandardScaler] = None
+        self._loaded_mtime = None
+        self._dirty = False  # trained since the last save (partial_train(persist=False))
+        self._lock = threading.Lock()
         self._init_or_load()
 
+    @staticmethod
+    def _model_mtime():
+        # (mtime, inode): every save is a rename onto MODEL_PATH, so the inode changes even
+        # when two saves land within the filesystem's mtime resolution
+        try:
+            st = os.stat(MODEL_PATH)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_ino)
+
+    @contextmanager
+    def _file_lock(self):
+        """Cross-process exclusive lock around read-modify-write of the model files."""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(LOCK_PATH, "a+") as fh:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def refresh(self):
+        """Reload if another process saved a newer model since we last loaded/saved."""
+        mtime = self._model_mtime()
+        if mtime and mtime != self._loaded_mtime:
+            self._init_or_load()
+
     def _init_or_load(self):
         if os.path.exists(MODEL_PATH) and os.path.exists(SCALER_PATH):
             try:
+                mtime = self._model_mtime()
                 data = joblib.load(MODEL_PATH)
                 self.model = data
                 self.scaler = joblib.load(SCALER_PATH)
+                self._loaded_mtime = mtime
+                self._dirty = False
                 return
             except Exception:
                 # continue to initialize fresh
@@ -56,28 +105,51 @@ class IncrementalLearner:
         # We'll leave initialization to first train call.
 
     def save(self):
-        if self.model is not None:
-            joblib.dump(self.model, MODEL_PATH)
+        # write-then-rename so a reader in another process never sees a half-written file;
+        # the scaler goes first so a reload triggered by the model mtime sees a matching pair
         if self.scaler is not None:
-            joblib.dump(self.scaler, SCALER_PATH)
+            joblib.dump(self.scaler, SCALER_PATH + ".tmp")
+            os.replace(SCALER_PATH + ".tmp", SCALER_PATH)
+        if self.model is not None:
+            joblib.dump(self.model, MODEL_PATH + ".tmp")
+            os.replace(MODEL_PATH + ".tmp", MODEL_PATH)
+        self._loaded_mtime = self._model_mtime()
+        self._dirty = False
 
     def predict(self, features: List[float]) -> float:
         import numpy as np
-        if self.model is None or self.scaler is None:
-            raise RuntimeError("Model not initialized")
-        x = np.array(features).reshape(1, -1)
-        x_scaled = self.scaler.transform(x)
-        pred = float(self.model.predict(x_scaled)[0])
+        # same lock as training: refresh() swaps and partial_fit mutates model/scaler in place
+        with self._lock:
+            self.refresh()
+            if self.model is None or self.scaler is None:
+                raise RuntimeError("Model not initialized")
+            x = np.array(features).reshape(1, -1)
+            x_scaled = self.scaler.transform(x)
+            pred = float(self.model.predict(x_scaled)[0])
         return pred
 
-    def partial_train(self, X: List[List[float]], y: List[float]):
+    def partial_train(self, X: Union[List[List[float]], np.ndarray], y: Union[List[float], np.ndarray], persist: bool = True):
         """
-        X: list of feature lists (each length n_features or will be padded/truncated)
-        y: list of numeric targets
+        X: list of feature lists or an (n, k) array (padded/truncated to n_features)
+        y: list or array of numeric targets
+        persist=False skips the save (streamed mini-batches checkpoint every few batches and
+        call flush() at the end); if another worker saves in between, the unsaved batches are
+        dropped by the reload, so keep the gap between checkpoints small.
         """
-        import numpy as np
-        Xarr = np.array([self._pad_or_truncate(x) for x in X], dtype=float)
-        yarr = np.array(y, dtype=float)
+        with self._file_lock():
+            # train on top of whatever another worker saved last
+            self.refresh()
+            self._partial_train_locked(X, y, persist)
+
+    def flush(self):
+        """Save if there are batches trained with persist=False that are not on disk yet."""
+        with self._file_lock():
+            if self._dirty:
+                self.save()
+
+    def _partial_train_locked(self, X, y, persist: bool = True):
+        Xarr = self._as_matrix(X)
+        yarr = np.asarray(y, dtype=float)
         # fit scaler incrementally
         if not hasattr(self.scaler, "mean_") or getattr(self.scaler, "mean_", None) is None:
             # first call: fit
@@ -95,7 +167,18 @@ class IncrementalLearner:
         else:
             self.model.partial_fit(Xs, yarr)
         # save after training for persistence
-        self.save()
+        if persist:
+            self.save()
+        else:
+            self._dirty = True
+
+    def _as_matrix(self, X) -> np.ndarray:
+        if isinstance(X, np.ndarray) and X.ndim == 2:
+            # packed payloads: slice / pad the whole block instead of rebuilding row by row
+            Xarr = X.astype(float, copy=False)[:, : self.n_features]
+            missing = self.n_features - Xarr.shape[1]
+            return np.pad(Xarr, ((0, 0), (0, missing))) if missing else Xarr
+        return np.array([self._pad_or_truncate(x) for x in X], dtype=float)
 
     def _pad_or_truncate(self, arr: List[float]) -> List[float]:
         # ensure fixed width
@@ -109,12 +192,18 @@ class IncrementalLearner:
 _default_learner = IncrementalLearner(n_features=DEFAULT_FEATURE_COUNT)
 
 
-def train_on_batch(X: List[List[float]], y: List[float]):
+@timed(OP_SECONDS, "partial_train")
+def train_on_batch(X: Union[List[List[float]], np.ndarray], y: Union[List[float], np.ndarray], persist: bool = True):
     """
     Convenience wrapper to train the default learner on a batch.
     """
-    _default_learner.partial_train(X, y)
+    _default_learner.partial_train(X, y, persist=persist)
+
+
+def flush_model():
+    _default_learner.flush()
 
 
+@timed(OP_SECONDS, "predict")
 def predict_from_features(features: List[float]) -> float:
     return _default_learner.predict(features)
@@ -0,0 +1,254 @@
+"""
+backend/shared_state.py
+
+Order book and portfolio storage shared by every uvicorn worker on the host.
+
+- SHARED_STATE_DB unset: plain in-process dicts (single worker / dev, the old behaviour).
+- SHARED_STATE_DB=/path/state.db: a local SQLite file in WAL mode. Each fill (order row +
+  position update) is one short write transaction, so N workers see one consistent order
+  book and portfolio; readers never block writers.
+
+Both implementations expose the same three calls used by trading_service:
+record_fill(receipt, symbol, d_position, d_usd), list_orders(), get_portfolio().
+
+They also hold what the per-host singletons need (see main.start_tick_engine): named leases
+(acquire_lease / release_lease), so only one worker runs the tick engine, the Deriv feed and
+its recorder, and the tick-engine subscriptions (add_subscription / list_subscriptions), so
+/engine/subscribe works whichever worker receives it. In-memory state is one process: its
+lease is always granted.
+
+And JWT revocations (revoke_token / revoke_subject / is_revoked, see auth_utils): a logout
+or password change handled by one worker is honoured by all of them. Entries are dropped
+once every token they could match has expired.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+SHARED_STATE_DB = os.getenv("SHARED_STATE_DB")
+
+
+class InMemoryState:
+    def __init__(self):
+        self._orders: Dict[str, Dict[str, Any]] = {}
+        self._portfolio: Dict[str, Dict[str, Any]] = {}
+        self._subscriptions: Dict[tuple, Dict[str, Any]] = {}
+        self._revoked_tokens: Dict[bytes, float] = {}  # digest -> exp
+        self._revoked_subjects: Dict[str, Tuple[float, float]] = {}  # sub -> (cutoff, keep_until)
+
+    def record_fill(self, receipt: Dict[str, Any], symbol: Optional[str] = None,
+                    d_position: float = 0.0, d_usd: float = 0.0) -> Optional[Dict[str, Any]]:
+        """Store the receipt; if `symbol` is given, apply the position delta and return the new position."""
+        self._orders[receipt["order_id"]] = receipt
+        if not symbol:
+            return None
+        pos = self._portfolio.get(symbol, {"position": 0.0, "usd_exposure": 0.0})
+        pos["position"] += d_position
+        pos["usd_exposure"] += d_usd
+        self._portfolio[symbol] = pos
+        return dict(pos)
+
+    def list_orders(self) -> Dict[str, Dict[str, Any]]:
+        return dict(self._orders)
+
+    def get_portfolio(self) -> Dict[str, Dict[str, Any]]:
+        return {k: dict(v) for k, v in self._portfolio.items()}
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        return True
+
+    def release_lease(self, name: str, owner: str):
+        pass
+
+    def add_subscription(self, strategy: str, symbol: str, params: Dict[str, Any]):
+        self._subscriptions[(strategy, symbol)] = dict(params)
+
+    def list_subscriptions(self) -> List[Dict[str, Any]]:
+        return [{"strategy": k[0], "symbol": k[1], "params": dict(v)} for k, v in self._subscriptions.items()]
+
+    def revoke_token(self, digest: bytes, exp: float):
+        now = time.time()
+        self._revoked_tokens[digest] = exp
+        for k in [k for k, e in self._revoked_tokens.items() if e <= now]:
+            del self._revoked_tokens[k]
+
+    def revoke_subject(self, subject: str, cutoff: float, keep_until: float):
+        now = time.time()
+        prev = self._revoked_subjects.get(subject)
+        if prev is None or prev[0] < cutoff:
+            self._revoked_subjects[subject] = (cutoff, keep_until)
+        for k in [k for k, (_, keep) in self._revoked_subjects.items() if keep <= now]:
+            del self._revoked_subjects[k]
+
+    def is_revoked(self, digest: bytes, subject: str, iat: float) -> bool:
+        if digest in self._revoked_tokens:
+            return True
+        sub = self._revoked_subjects.get(subject)
+        return sub is not None and iat < sub[0]
+
+    def clear(self):
+        self._orders.clear()
+        self._portfolio.clear()
+        self._subscriptions.clear()
+        self._revoked_tokens.clear()
+        self._revoked_subjects.clear()
+
+
+_SCHEMA = """
+create table if not exists orders (
+  seq integer primary key autoincrement,
+  order_id text not null unique,
+  receipt text not null
+);
+create table if not exists positions (
+  symbol text primary key,
+  position real not null,
+  usd_exposure real not null
+);
+create table if not exists leases (
+  name text primary key,
+  owner text not null,
+  until real not null
+);
+create table if not exists engine_subscriptions (
+  strategy text not null,
+  symbol text not null,
+  params text not null,
+  primary key (strategy, symbol)
+);
+create table if not exists revoked_tokens (
+  digest blob primary key,
+  exp real not null
+);
+create table if not exists revoked_subjects (
+  subject text primary key,
+  cutoff real not null,
+  keep_until real not null
+);
+"""
+
+
+class SQLiteState:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        c = getattr(self._local, "conn", None)
+        if c is None:
+            c = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            c.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = c
+        return c
+
+    def record_fill(self, receipt: Dict[str, Any], symbol: Optional[str] = None,
+                    d_position: float = 0.0, d_usd: float = 0.0) -> Optional[Dict[str, Any]]:
+        c = self._conn()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            c.execute(
+                "insert into orders(order_id, receipt) values (?, ?) on conflict(order_id) do update set receipt = excluded.receipt",
+                (receipt["order_id"], json.dumps(receipt, default=str)),
+            )
+            pos = None
+            if symbol:
+                row = c.execute(
+                    """
+                    insert into positions(symbol, position, usd_exposure) values (?, ?, ?)
+                    on conflict(symbol) do update set
+                      position = position + excluded.position,
+                      usd_exposure = usd_exposure + excluded.usd_exposure
+                    returning position, usd_exposure
+                    """,
+                    (symbol, float(d_position), float(d_usd)),
+                ).fetchone()
+                pos = {"position": row[0], "usd_exposure": row[1]}
+            c.execute("COMMIT")
+        except BaseException:
+            c.execute("ROLLBACK")
+            raise
+        return pos
+
+    def list_orders(self) -> Dict[str, Dict[str, Any]]:
+        rows = self._conn().execute("select order_id, receipt from orders order by seq").fetchall()
+        return {oid: json.loads(r) for oid, r in rows}
+
+    def get_portfolio(self) -> Dict[str, Dict[str, Any]]:
+        rows = self._conn().execute("select symbol, position, usd_exposure from positions").fetchall()
+        return {s: {"position": p, "usd_exposure": u} for s, p, u in rows}
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """Take or renew lease `name` for `ttl` seconds; True if `owner` holds it."""
+        now = time.time()
+        c = self._conn()
+        c.execute(
+            "insert into leases(name, owner, until) values (?, ?, ?) "
+            "on conflict(name) do update set owner = excluded.owner, until = excluded.until "
+            "where leases.owner = excluded.owner or leases.until < ?",
+            (name, owner, now + ttl, now),
+        )
+        row = c.execute("select owner from leases where name = ?", (name,)).fetchone()
+        return row is not None and row[0] == owner
+
+    def release_lease(self, name: str, owner: str):
+        self._conn().execute("delete from leases where name = ? and owner = ?", (name, owner))
+
+    def add_subscription(self, strategy: str, symbol: str, params: Dict[str, Any]):
+        self._conn().execute(
+            "insert into engine_subscriptions(strategy, symbol, params) values (?, ?, ?) "
+            "on conflict(strategy, symbol) do update set params = excluded.params",
+            (strategy, symbol, json.dumps(params, default=str)),
+        )
+
+    def list_subscriptions(self) -> List[Dict[str, Any]]:
+        rows = self._conn().execute("select strategy, symbol, params from engine_subscriptions order by rowid").fetchall()
+        return [{"strategy": st, "symbol": sym, "params": json.loads(p)} for st, sym, p in rows]
+
+    def revoke_token(self, digest: bytes, exp: float):
+        c = self._conn()
+        c.execute("insert or replace into revoked_tokens(digest, exp) values (?, ?)", (digest, exp))
+        c.execute("delete from revoked_tokens where exp <= ?", (time.time(),))
+
+    def revoke_subject(self, subject: str, cutoff: float, keep_until: float):
+        c = self._conn()
+        c.execute(
+            "insert into revoked_subjects(subject, cutoff, keep_until) values (?, ?, ?) "
+            "on conflict(subject) do update set cutoff = excluded.cutoff, keep_until = excluded.keep_until "
+            "where excluded.cutoff > revoked_subjects.cutoff",
+            (subject, cutoff, keep_until),
+        )
+        c.execute("delete from revoked_subjects where keep_until <= ?", (time.time(),))
+
+    def is_revoked(self, digest: bytes, subject: str, iat: float) -> bool:
+        row = self._conn().execute(
+            "select exists(select 1 from revoked_tokens where digest = ?) "
+            "or exists(select 1 from revoked_subjects where subject = ? and cutoff > ?)",
+            (digest, subject, iat),
+        ).fetchone()
+        return bool(row[0])
+
+    def clear(self):
+        c = self._conn()
+        c.execute("delete from orders")
+        c.execute("delete from positions")
+        c.execute("delete from engine_subscriptions")
+        c.execute("delete from revoked_tokens")
+        c.execute("delete from revoked_subjects")
+
+
+def make_shared_state(path: Optional[str] = SHARED_STATE_DB):
+    return SQLiteState(path) if path else InMemoryState()
+
+
+# Expose a default instance
+default_shared_state = make_shared_state()
@@ -4,12 +4,21 @@ backend/strategy_service.py
 Simple strategy registry and a few example strategies.
 - Strategies are simple deterministic functions that accept a market_state dict and return a dict
   containing at least: {symbol, action, confidence, size_pct}
+- Declarative strategies (backend/strategy_spec.py) register through register_spec(); their
+  compiled form also serves batch scans and backtests (get_compiled). JSON spec files in
+  STRATEGY_SPEC_DIR are loaded at import, so every worker sees the same set.
 - This file exposes default_strategy_manager for other modules to use.
 """
 
-from typing import Callable, Dict, Any
+from typing import Callable, Dict, Any, Mapping
+import json
+import os
 import statistics
 
+from .strategy_spec import CompiledStrategy, SpecError, compile_spec, MOMENTUM_SPEC, MEAN_REVERSION_SPEC
+
+STRATEGY_SPEC_DIR = os.getenv("STRATEGY_SPEC_DIR", "")
+
 class StrategyError(Exception):
     pass
 
@@ -17,11 +26,43 @@ class StrategyError(Exception):
 class StrategyManager:
     def __init__(self):
         self._strategies: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {}
+        self._compiled: Dict[str, CompiledStrategy] = {}
 
     def register_strategy(self, name: str, func: Callable[[Dict[str, Any]], Dict[str, Any]]):
         if not callable(func):
             raise StrategyError("Provided strategy is not callable")
         self._strategies[name] = func
+        self._compiled.pop(name, None)
+
+    def register_spec(self, spec: Mapping[str, Any]) -> CompiledStrategy:
+        try:
+            compiled = compile_spec(spec)
+        except SpecError as e:
+            raise StrategyError(f"Invalid strategy spec: {e}")
+        self._strategies[compiled.name] = compiled.evaluate
+        self._compiled[compiled.name] = compiled
+        return compiled
+
+    def load_spec_dir(self, path: str):
+        for fname in sorted(os.listdir(path)):
+            if not fname.endswith(".json"):
+                continue
+            with open(os.path.join(path, fname)) as f:
+                try:
+                    spec = json.load(f)
+                except ValueError as e:
+                    raise StrategyError(f"{fname}: {e}")
+            try:
+                self.register_spec(spec)
+            except StrategyError as e:
+                raise StrategyError(f"{fname}: {e}")
+
+    def get_compiled(self, name: str) -> CompiledStrategy:
+        if name not in self._compiled:
+            if name not in self._strategies:
+                raise StrategyError(f"Strategy '{name}' not registered")
+            raise StrategyError(f"Strategy '{name}' is not a declarative spec")
+        return self._compiled[name]
 
     def evaluate(self, name: str, market_state: Dict[str, Any]) -> Dict[str, Any]:
         if name not in self._strategies:
@@ -105,3 +146,7 @@ def mean_reversion_v1(market_state: Dict[str, Any]) -> Dict[str, Any]:
 default_strategy_manager = StrategyManager()
 default_strategy_manager.register_strategy("momentum_v1", momentum_v1)
 default_strategy_manager.register_strategy("mean_reversion_v1", mean_reversion_v1)
+default_strategy_manager.register_spec(MOMENTUM_SPEC)
+default_strategy_manager.register_spec(MEAN_REVERSION_SPEC)
+if STRATEGY_SPEC_DIR:
+    default_strategy_manager.load_spec_dir(STRATEGY_SPEC_DIR)
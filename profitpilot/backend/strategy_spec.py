@@ -0,0 +1,453 @@
+"""
+backend/strategy_spec.py
+
+Declarative strategies: a JSON-able spec (params, indicators, buy/sell conditions, confidence
+and sizing expressions) compiled once into two code paths that share one definition:
+
+- scalar: CompiledStrategy.evaluate(market_state) -> the same dict the hand-written
+  strategies return, computed with plain floats over only the tail of the price list the
+  indicators need. Registered with StrategyManager, it drops into /trade and tick_engine.
+- vector: CompiledStrategy.series(prices[..., T]) evaluates every time step of every row in
+  NumPy at once; last() / scan() take the final step across many symbols, backtest() turns
+  the series into positions and P&L.
+
+Spec format (see MOMENTUM_SPEC / MEAN_REVERSION_SPEC below):
+
+    {
+      "name": "my_strategy",
+      "params": {"threshold": 0.01, "window": 20},        # overridable per call (market_state keys)
+      "min_history": 3,                                   # fewer prices -> hold
+      "indicators": {"ret": ["change", 5], "z": ["zscore", "window"]},
+      "buy":  [">", "ret", "threshold"],
+      "sell": ["<", "ret", ["neg", "threshold"]],
+      "confidence": ["min", 1, ["/", ["abs", "ret"], ["*", "threshold", 3]]],
+      "size_pct": ["min", 0.5, ["*", "confidence", 0.2]]
+    }
+
+Expressions are numbers, names (params, indicators, "price", and "confidence" inside
+size_pct) or [op, args...] with ops from _OPS. Indicators take a window length or the name
+of a param; near the start of a series they use the shorter window that is available (same
+as min(len(prices), window) in the hand-written strategies). A step where any indicator,
+confidence or size is NaN/inf (zero volatility, zero price...) is a hold with zero size.
+"""
+
+import json
+import math
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+class SpecError(ValueError):
+    pass
+
+
+_NAN = float("nan")
+_INF = float("inf")
+_STD_EPS = 1e-12  # relative: a std this small against the mean is rounding noise, i.e. zero
+
+
+# -------------------------
+# Scalar helpers (NaN/inf semantics matching NumPy)
+# -------------------------
+def _sdiv(a: float, b: float) -> float:
+    if b == 0:
+        return _NAN if a == 0 or a != a else math.copysign(_INF, a)
+    return a / b
+
+
+def _smin(a: float, b: float) -> float:
+    return a if a != a else b if b != b else min(a, b)
+
+
+def _smax(a: float, b: float) -> float:
+    return a if a != a else b if b != b else max(a, b)
+
+
+# -------------------------
+# Indicators: vector f(P[..., T], n, head) -> [..., T] and scalar f(tail, n) -> value at the last price
+# -------------------------
+def _rolling(P: np.ndarray, n: int, reduce: Callable, head: bool = True) -> np.ndarray:
+    """head=False skips the expanding windows before step n (left NaN) when only the last step is wanted."""
+    T = P.shape[-1]
+    out = np.full(P.shape, np.nan)
+    k = min(n, T)
+    for t in range(k - 1 if head else 0):  # expanding head: shorter windows while history < n
+        out[..., t] = reduce(P[..., : t + 1], axis=-1)
+    if T:
+        out[..., k - 1:] = reduce(sliding_window_view(P, k, axis=-1), axis=-1)
+    return out
+
+
+def _v_change(P, n, head=True):
+    start = P[..., np.maximum(np.arange(P.shape[-1]) - (n - 1), 0)]
+    return (P - start) / start
+
+
+def _s_change(p, n):
+    start = p[-min(n, len(p))]
+    return _sdiv(p[-1] - start, start)
+
+
+def _v_sma(P, n, head=True):
+    return _rolling(P, n, np.mean, head)
+
+
+def _s_sma(p, n):
+    w = p[-n:]
+    return sum(w) / len(w)
+
+
+def _v_mean_std(P, n, head=True):
+    m = _rolling(P, n, np.mean, head)
+    sd = _rolling(P, n, np.std, head)
+    sd[sd <= _STD_EPS * np.abs(m)] = 0.0
+    return m, sd
+
+
+def _v_std(P, n, head=True):
+    return _v_mean_std(P, n, head)[1]
+
+
+def _s_std(p, n):
+    w = p[-n:]
+    m = sum(w) / len(w)
+    sd = math.sqrt(sum((x - m) ** 2 for x in w) / len(w))
+    return 0.0 if sd <= _STD_EPS * abs(m) else sd
+
+
+def _v_zscore(P, n, head=True):
+    m, sd = _v_mean_std(P, n, head)
+    return (P - m) / sd
+
+
+def _s_zscore(p, n):
+    return _sdiv(p[-1] - _s_sma(p, n), _s_std(p, n))
+
+
+def _v_highest(P, n, head=True):
+    return _rolling(P, n, np.max, head)
+
+
+def _s_highest(p, n):
+    return max(p[-n:])
+
+
+def _v_lowest(P, n, head=True):
+    return _rolling(P, n, np.min, head)
+
+
+def _s_lowest(p, n):
+    return min(p[-n:])
+
+
+def _v_rsi(P, n, head=True):
+    out = np.full(P.shape, np.nan)
+    if P.shape[-1] > 1:
+        d = np.diff(P, axis=-1)
+        gain = _rolling(np.maximum(d, 0.0), n, np.mean, head)
+        loss = _rolling(np.maximum(-d, 0.0), n, np.mean, head)
+        out[..., 1:] = 100.0 - 100.0 / (1.0 + gain / loss)
+    return out
+
+
+def _s_rsi(p, n):
+    tail = p[-(n + 1):]
+    if len(tail) < 2:
+        return _NAN
+    d = [b - a for a, b in zip(tail, tail[1:])]
+    gain = sum(x for x in d if x > 0) / len(d)
+    loss = sum(-x for x in d if x < 0) / len(d)
+    return 100.0 - _sdiv(100.0, 1.0 + _sdiv(gain, loss))
+
+
+# name -> (vector, scalar, extra history beyond the window)
+INDICATORS: Dict[str, Tuple[Callable, Callable, int]] = {
+    "change": (_v_change, _s_change, 0),
+    "sma": (_v_sma, _s_sma, 0),
+    "std": (_v_std, _s_std, 0),
+    "zscore": (_v_zscore, _s_zscore, 0),
+    "highest": (_v_highest, _s_highest, 0),
+    "lowest": (_v_lowest, _s_lowest, 0),
+    "rsi": (_v_rsi, _s_rsi, 1),
+}
+
+
+# -------------------------
+# Expressions -> Python source, once per mode
+# -------------------------
+# op -> (arity, vector template, scalar template); None arity = 2 or more (folded left)
+_OPS: Dict[str, Tuple[Optional[int], str, str]] = {
+    "+": (None, "({0} + {1})", "({0} + {1})"),
+    "-": (2, "({0} - {1})", "({0} - {1})"),
+    "*": (None, "({0} * {1})", "({0} * {1})"),
+    "/": (2, "({0} / {1})", "_sdiv({0}, {1})"),
+    "neg": (1, "(-{0})", "(-{0})"),
+    "abs": (1, "_np.abs({0})", "abs({0})"),
+    "min": (None, "_np.minimum({0}, {1})", "_smin({0}, {1})"),
+    "max": (None, "_np.maximum({0}, {1})", "_smax({0}, {1})"),
+    ">": (2, "({0} > {1})", "({0} > {1})"),
+    ">=": (2, "({0} >= {1})", "({0} >= {1})"),
+    "<": (2, "({0} < {1})", "({0} < {1})"),
+    "<=": (2, "({0} <= {1})", "({0} <= {1})"),
+    "and": (None, "({0} & {1})", "({0} and {1})"),
+    "or": (None, "({0} | {1})", "({0} or {1})"),
+    "not": (1, "(~{0})", "(not {0})"),
+    "where": (3, "_np.where({0}, {1}, {2})", "({1} if {0} else {2})"),
+}
+
+_RESERVED = {"price", "confidence"}
+
+
+def _source(expr: Any, mode: int, names: Mapping[str, str], where: str) -> str:
+    if isinstance(expr, bool) or not isinstance(expr, (int, float, str, list)):
+        raise SpecError(f"{where}: unsupported expression {expr!r}")
+    if isinstance(expr, (int, float)):
+        return repr(float(expr))
+    if isinstance(expr, str):
+        if expr not in names:
+            raise SpecError(f"{where}: unknown name '{expr}'")
+        return names[expr]
+    if not expr or expr[0] not in _OPS:
+        raise SpecError(f"{where}: unknown operator in {expr!r} (have {', '.join(_OPS)})")
+    arity, *templates = _OPS[expr[0]]
+    args = [_source(a, mode, names, where) for a in expr[1:]]
+    if arity is None:
+        if len(args) < 2:
+            raise SpecError(f"{where}: '{expr[0]}' needs at least 2 arguments")
+        out = args[0]
+        for a in args[1:]:
+            out = templates[mode].format(out, a)
+        return out
+    if len(args) != arity:
+        raise SpecError(f"{where}: '{expr[0]}' takes {arity} argument(s), got {len(args)}")
+    return templates[mode].format(*args)
+
+
+_VECTOR, _SCALAR = 0, 1
+_NAMESPACE = {"_np": np, "_sdiv": _sdiv, "_smin": _smin, "_smax": _smax, "__builtins__": {"abs": abs}}
+
+
+class CompiledStrategy:
+    def __init__(self, spec: Mapping[str, Any]):
+        if not isinstance(spec, Mapping):
+            raise SpecError("spec must be an object")
+        self.spec = json.loads(json.dumps(spec))  # private copy, and proves it is JSON-able
+        self.name = spec.get("name")
+        if not isinstance(self.name, str) or not self.name:
+            raise SpecError("spec needs a non-empty 'name'")
+        params = spec.get("params") or {}
+        if not isinstance(params, Mapping) or not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in params.values()):
+            raise SpecError("'params' must map names to numbers")
+        # names end up inside the compiled source (prm["name"]), so only plain identifiers
+        for k in params:
+            if not isinstance(k, str) or not k.isidentifier():
+                raise SpecError(f"param name {k!r} must be an identifier")
+        self.params: Dict[str, float] = {str(k): float(v) for k, v in params.items()}
+        self.min_history = int(spec.get("min_history", 1))
+
+        self._indicators: List[Tuple[str, str, Any]] = []
+        for name, ind in (spec.get("indicators") or {}).items():
+            if not isinstance(name, str) or not name.isidentifier():
+                raise SpecError(f"indicator name {name!r} must be an identifier")
+            if name in self.params or name in _RESERVED:
+                raise SpecError(f"indicator '{name}' clashes with a param or reserved name")
+            if not isinstance(ind, list) or len(ind) != 2 or ind[0] not in INDICATORS:
+                raise SpecError(f"indicator '{name}': expected [kind, window] with kind in {sorted(INDICATORS)}")
+            window = ind[1]
+            if isinstance(window, str):
+                if window not in self.params:
+                    raise SpecError(f"indicator '{name}': unknown param '{window}'")
+            elif isinstance(window, bool) or not isinstance(window, int) or window < 1:
+                raise SpecError(f"indicator '{name}': window must be a positive int or a param name")
+            self._indicators.append((name, ind[0], window))
+
+        names = {k: f'prm["{k}"]' for k in self.params}
+        names.update({k: f'ind["{k}"]' for k, _, _ in self._indicators})
+        names["price"] = 'ind["price"]'
+        self._param_windows = any(isinstance(w, str) for _, _, w in self._indicators)
+        self._lookback = self.lookback(self.params)
+        self._fns: Dict[str, Tuple[Callable, Callable]] = {}
+        for key, default in (("buy", None), ("sell", None), ("confidence", 1.0), ("size_pct", None)):
+            expr = spec.get(key, default)
+            if expr is None:
+                raise SpecError(f"spec needs '{key}'")
+            if key == "size_pct":
+                names = dict(names, confidence='ind["confidence"]')
+            self._fns[key] = tuple(
+                eval(compile(f"lambda ind, prm: {_source(expr, mode, names, key)}", f"<spec {self.name}.{key}>", "eval"), _NAMESPACE)
+                for mode in (_VECTOR, _SCALAR)
+            )
+
+    def __repr__(self):
+        return f"CompiledStrategy({self.name!r})"
+
+    def resolve_params(self, overrides: Optional[Mapping[str, Any]] = None) -> Dict[str, float]:
+        prm = dict(self.params)
+        for k in prm:
+            v = (overrides or {}).get(k)
+            if v is not None:
+                prm[k] = float(v)
+        return prm
+
+    def _window(self, window: Any, prm: Mapping[str, float]) -> int:
+        return max(1, int(prm[window])) if isinstance(window, str) else window
+
+    def lookback(self, prm: Mapping[str, float]) -> int:
+        """Prices needed for the last step: the longest indicator window (and min_history)."""
+        need = [self._window(w, prm) + INDICATORS[kind][2] for _, kind, w in self._indicators]
+        return max(need + [self.min_history, 1])
+
+    # ---- scalar path (live) ----
+    def evaluate(self, market_state: Dict[str, Any]) -> Dict[str, Any]:
+        prices = market_state.get("prices", [])
+        symbol = market_state.get("symbol", "UNK")
+        if len(prices) < self.min_history:
+            return {"symbol": symbol, "action": "hold", "confidence": 0.0, "size_pct": 0.0, "metric": {"reason": "not enough prices"}}
+        prm = self.resolve_params(market_state)
+        tail = prices[-(self.lookback(prm) if self._param_windows else self._lookback):]
+        tail = tail.tolist() if isinstance(tail, np.ndarray) else [float(x) for x in tail]
+        ind: Dict[str, float] = {"price": tail[-1]}
+        for name, kind, window in self._indicators:
+            ind[name] = INDICATORS[kind][1](tail, self._window(window, prm))
+        buy, sell, confidence, size_pct = (self._fns[k][_SCALAR] for k in ("buy", "sell", "confidence", "size_pct"))
+        ind["confidence"] = conf = float(confidence(ind, prm))
+        size = float(size_pct(ind, prm))
+        metric = {name: ind[name] for name, _, _ in self._indicators}
+        if not all(math.isfinite(v) for v in metric.values()) or not math.isfinite(conf) or not math.isfinite(size):
+            metric = _json_metric(metric)
+            metric["reason"] = "non-finite indicator"
+            return {"symbol": symbol, "action": "hold", "confidence": 0.0, "size_pct": 0.0, "metric": metric}
+        action = "buy" if buy(ind, prm) else "sell" if sell(ind, prm) else "hold"
+        return {"symbol": symbol, "action": action, "confidence": conf, "size_pct": size, "metric": metric}
+
+    __call__ = evaluate
+
+    # ---- vector path (scans, backtests) ----
+    def series(self, prices: Any, params: Optional[Mapping[str, Any]] = None, _head: bool = True) -> Dict[str, np.ndarray]:
+        """
+        Evaluate every step of `prices` (shape [..., T]). Returns arrays of that shape:
+        action (int8: 1 buy, -1 sell, 0 hold), confidence, size_pct, valid, and each indicator.
+        """
+        P = np.asarray(prices, dtype=float)
+        prm = self.resolve_params(params)
+        vprm = {k: np.float64(v) for k, v in prm.items()}
+        with np.errstate(all="ignore"):
+            ind: Dict[str, np.ndarray] = {"price": P}
+            for name, kind, window in self._indicators:
+                ind[name] = INDICATORS[kind][0](P, self._window(window, prm), _head)
+            out = {k: np.broadcast_to(np.asarray(self._fns[k][_VECTOR](ind, vprm)), P.shape) for k in ("buy", "sell", "confidence")}
+            ind["confidence"] = out["confidence"]
+            size = np.broadcast_to(np.asarray(self._fns["size_pct"][_VECTOR](ind, vprm)), P.shape)
+        valid = np.isfinite(out["confidence"]) & np.isfinite(size) & (np.arange(P.shape[-1]) + 1 >= self.min_history)
+        for name, _, _ in self._indicators:
+            valid &= np.isfinite(ind[name])
+        action = np.where(out["buy"], 1, np.where(out["sell"], -1, 0))
+        res = {
+            "action": np.where(valid, action, 0).astype(np.int8),
+            "confidence": np.where(valid, out["confidence"], 0.0),
+            "size_pct": np.where(valid, size, 0.0),
+            "valid": valid,
+        }
+        res.update({name: ind[name] for name, _, _ in self._indicators})
+        return res
+
+    def last(self, prices: Any, params: Optional[Mapping[str, Any]] = None) -> Dict[str, np.ndarray]:
+        """series() at the final step only, computing indicators over just the needed tail."""
+        P = np.asarray(prices, dtype=float)
+        tail = P[..., -self.lookback(self.resolve_params(params)):]
+        return {k: v[..., -1] for k, v in self.series(tail, params, _head=False).items()}
+
+    def scan(self, prices: Mapping[str, Sequence[float]], params: Optional[Mapping[str, Any]] = None) -> Dict[str, Dict[str, Any]]:
+        """Signal for the latest price of every symbol; symbols with equal history length share one pass."""
+        groups: Dict[int, List[str]] = {}
+        for sym, series in prices.items():
+            groups.setdefault(len(series), []).append(sym)
+        out: Dict[str, Dict[str, Any]] = {}
+        for length, syms in groups.items():
+            if length == 0:
+                for sym in syms:
+                    out[sym] = {"symbol": sym, "action": "hold", "confidence": 0.0, "size_pct": 0.0, "metric": {"reason": "not enough prices"}}
+                continue
+            L = min(length, self.lookback(self.resolve_params(params)))
+            r = self.last(np.array([np.asarray(prices[s], dtype=float)[-L:] for s in syms]), params)
+            for i, sym in enumerate(syms):
+                action = ("hold", "buy", "sell")[int(r["action"][i])]
+                if length < self.min_history:
+                    metric = {"reason": "not enough prices"}
+                else:
+                    metric = _json_metric({name: float(r[name][i]) for name, _, _ in self._indicators})
+                    if not r["valid"][i]:
+                        metric["reason"] = "non-finite indicator"
+                out[sym] = {"symbol": sym, "action": action, "confidence": float(r["confidence"][i]), "size_pct": float(r["size_pct"][i]), "metric": metric}
+        return out
+
+    def backtest(self, prices: Any, params: Optional[Mapping[str, Any]] = None, fee: float = 0.0) -> Dict[str, Any]:
+        """
+        Hold action * size_pct of the account from each step to the next. `fee` is charged on
+        every change of position (fraction of the traded size). Works on [..., T] arrays;
+        statistics come back with the leading shape (floats for a single series).
+        """
+        P = np.asarray(prices, dtype=float)
+        s = self.series(P, params)
+        pos = s["action"] * s["size_pct"]
+        turnover = np.abs(np.diff(pos, axis=-1, prepend=0.0))
+        with np.errstate(all="ignore"):
+            ret = P[..., 1:] / P[..., :-1] - 1.0
+        pnl = pos[..., :-1] * ret - fee * turnover[..., :-1]
+        equity = np.cumprod(1.0 + pnl, axis=-1)
+        steps = pnl.shape[-1]
+        if steps:
+            peak = np.maximum.accumulate(equity, axis=-1)
+            sd = pnl.std(axis=-1)
+            stats = {
+                "total_return": equity[..., -1] - 1.0,
+                "max_drawdown": np.max(1.0 - equity / peak, axis=-1),
+                "sharpe_per_step": np.where(sd > 0, pnl.mean(axis=-1) / np.where(sd > 0, sd, 1.0), 0.0),
+            }
+        else:
+            zero = np.zeros(P.shape[:-1])
+            stats = {"total_return": zero, "max_drawdown": zero, "sharpe_per_step": zero}
+        stats["trades"] = np.count_nonzero(turnover > 0, axis=-1)
+        stats["exposure"] = np.mean(pos != 0, axis=-1) if P.shape[-1] else np.zeros(P.shape[:-1])
+        out: Dict[str, Any] = {"steps": steps}
+        for k, v in stats.items():
+            out[k] = v.tolist() if np.ndim(v) else (int(v) if k == "trades" else float(v))
+        out["equity"] = equity
+        return out
+
+
+def _json_metric(metric: Dict[str, float]) -> Dict[str, Optional[float]]:
+    # NaN/inf (flat or zero-price windows) are not valid JSON; responses carry null instead
+    return {k: v if math.isfinite(v) else None for k, v in metric.items()}
+
+
+def compile_spec(spec: Mapping[str, Any]) -> CompiledStrategy:
+    return CompiledStrategy(spec)
+
+
+# -------------------------
+# Spec versions of the built-in strategies
+# -------------------------
+MOMENTUM_SPEC = {
+    "name": "momentum_spec_v1",
+    "params": {"threshold": 0.01},
+    "min_history": 3,
+    "indicators": {"pct_change": ["change", 5]},
+    "buy": [">", "pct_change", "threshold"],
+    "sell": ["<", "pct_change", ["neg", "threshold"]],
+    "confidence": ["min", 1, ["/", ["abs", "pct_change"], ["+", ["*", "threshold", 3], 1e-9]]],
+    "size_pct": ["min", 0.5, ["*", "confidence", 0.2]],
+}
+
+MEAN_REVERSION_SPEC = {
+    "name": "mean_reversion_spec_v1",
+    "params": {"window": 20, "z_threshold": 1.5},
+    "min_history": 3,
+    "indicators": {"z_score": ["zscore", "window"], "mean": ["sma", "window"], "stdev": ["std", "window"]},
+    "buy": ["<", "z_score", ["neg", "z_threshold"]],
+    "sell": [">", "z_score", "z_threshold"],
+    "confidence": ["min", 1, ["/", ["abs", "z_score"], ["*", "z_threshold", 2]]],
+    "size_pct": ["min", 0.3, ["*", "confidence", 0.15]],
+}
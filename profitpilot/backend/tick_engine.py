@@ -0,0 +1,202 @@
+"""
+backend/tick_engine.py
+
+Event-driven strategy execution: every incoming tick wakes the strategies subscribed
+to its symbol and runs them through trading_service.evaluate_and_trade.
+
+- on_tick() is cheap and never blocks the feed: it appends the price to the symbol's
+  rolling window and wakes that symbol's worker.
+- Each symbol has a single worker task. If evaluation falls behind the tick rate the
+  worker only sees the newest tick (latest-wins); skipped ticks are counted as coalesced
+  but their prices are still part of the window.
+- Latency is measured per stage: queue (tick arrival -> evaluation start), evaluate,
+  risk, execute and total (tick arrival -> order receipt).
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from .trading_service import evaluate_and_trade
+
+DEFAULT_WINDOW = 200
+LATENCY_SAMPLES = 2048
+STAGES = ("queue", "evaluate", "risk", "execute", "total")
+
+
+class TickEngine:
+    def __init__(self, window: int = DEFAULT_WINDOW, dry_run: bool = True, samples: int = LATENCY_SAMPLES):
+        self.window = window
+        self.dry_run = dry_run
+        self._subs: Dict[str, Dict[str, Dict[str, Any]]] = {}  # symbol -> strategy -> params
+        self._prices: Dict[str, Deque[float]] = {}
+        self._pending: Dict[str, Tuple[float, float, float]] = {}  # symbol -> (epoch, price, arrived_at)
+        self._wakeups: Dict[str, asyncio.Event] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self._latency: Dict[str, Deque[float]] = {s: deque(maxlen=samples) for s in STAGES}
+        self._running = False
+        self.ticks_in = 0
+        self.ticks_coalesced = 0
+        self.evaluations = 0
+        self.errors = 0
+
+    @property
+    def running(self) -> bool:
+        """True between start() and stop(): in this process the live feed drives the engine."""
+        return self._running
+
+    # -------------------------
+    # Subscriptions / listeners
+    # -------------------------
+    def subscribe(self, strategy: str, symbol: str, params: Optional[Dict[str, Any]] = None):
+        self._subs.setdefault(symbol, {})[strategy] = dict(params or {})
+        if symbol not in self._prices:
+            self._prices[symbol] = deque(maxlen=self.window)
+        if self._running:
+            self._ensure_worker(symbol)
+
+    def unsubscribe(self, strategy: str, symbol: str):
+        subs = self._subs.get(symbol)
+        if subs:
+            subs.pop(strategy, None)
+
+    def prices(self, symbol: str) -> List[float]:
+        """
+        Current price window for `symbol` (oldest..newest). An unknown symbol starts being
+        tracked, without running any strategy on its ticks, so periodic jobs get prices too.
+        """
+        window = self._prices.get(symbol)
+        if window is None:
+            window = self._prices[symbol] = deque(maxlen=self.window)
+        return list(window)
+
+    def subscriptions(self) -> Dict[str, List[str]]:
+        return {sym: list(s.keys()) for sym, s in self._subs.items() if s}
+
+    def add_listener(self, callback: Callable[[Dict[str, Any]], None]):
+        """
+        Register a callback receiving every emitted signal event. Must be fast and non-blocking.
+        """
+        self._listeners.append(callback)
+
+    # -------------------------
+    # Lifecycle
+    # -------------------------
+    async def start(self):
+        self._running = True
+        for symbol in self._subs:
+            self._ensure_worker(symbol)
+
+    async def stop(self):
+        self._running = False
+        tasks = list(self._tasks.values())
+        self._tasks.clear()
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _ensure_worker(self, symbol: str):
+        task = self._tasks.get(symbol)
+        if task is None or task.done():
+            self._wakeups.setdefault(symbol, asyncio.Event())
+            self._tasks[symbol] = asyncio.get_running_loop().create_task(self._worker(symbol))
+
+    # -------------------------
+    # Hot path
+    # -------------------------
+    def on_tick(self, symbol: str, epoch: float, price: float):
+        """
+        Feed one tick. Safe to call from the event loop at any rate.
+        """
+        self.ticks_in += 1
+        window = self._prices.get(symbol)
+        if window is None:
+            return  # nobody subscribed
+        window.append(float(price))
+        if symbol in self._pending:
+            self.ticks_coalesced += 1
+        self._pending[symbol] = (epoch, float(price), time.perf_counter())
+        wake = self._wakeups.get(symbol)
+        if wake is not None:
+            wake.set()
+
+    async def _worker(self, symbol: str):
+        wake = self._wakeups[symbol]
+        while self._running:
+            await wake.wait()
+            wake.clear()
+            tick = self._pending.pop(symbol, None)
+            if tick is None:
+                continue
+            await self._evaluate(symbol, tick)
+
+    async def _evaluate(self, symbol: str, tick: Tuple[float, float, float]):
+        epoch, price, arrived = tick
+        prices = list(self._prices[symbol])
+        for strategy, params in list(self._subs.get(symbol, {}).items()):
+            started = time.perf_counter()
+            timings: Dict[str, float] = {"queue": started - arrived}
+            market_state = dict(params, symbol=symbol, prices=prices)
+            try:
+                res = await evaluate_and_trade(strategy, market_state, dry_run=self.dry_run, timings=timings)
+            except Exception:
+                self.errors += 1
+                logger.exception("tick engine: strategy {} failed on {}", strategy, symbol)
+                continue
+            timings["total"] = time.perf_counter() - arrived
+            self.evaluations += 1
+            for stage, v in timings.items():
+                self._latency[stage].append(v)
+            self._emit({
+                "type": "signal",
+                "strategy": strategy,
+                "symbol": symbol,
+                "epoch": epoch,
+                "price": price,
+                "signal": res.get("signal"),
+                "order_proposal": res.get("order_proposal"),
+                "execute_receipt": res.get("execute_receipt"),
+                "latency_ms": {k: v * 1000.0 for k, v in timings.items()},
+            })
+
+    def _emit(self, event: Dict[str, Any]):
+        for cb in self._listeners:
+            try:
+                cb(event)
+            except Exception:
+                logger.exception("tick engine listener failed")
+
+    # -------------------------
+    # Stats
+    # -------------------------
+    def stats(self) -> Dict[str, Any]:
+        latency = {}
+        for stage, samples in self._latency.items():
+            if not samples:
+                continue
+            xs = sorted(samples)
+            n = len(xs)
+            latency[stage] = {
+                "count": n,
+                "p50_ms": xs[n // 2] * 1000.0,
+                "p90_ms": xs[min(n - 1, int(n * 0.9))] * 1000.0,
+                "p99_ms": xs[min(n - 1, int(n * 0.99))] * 1000.0,
+                "max_ms": xs[-1] * 1000.0,
+            }
+        return {
+            "running": self._running,
+            "subscriptions": self.subscriptions(),
+            "ticks_in": self.ticks_in,
+            "ticks_coalesced": self.ticks_coalesced,
+            "evaluations": self.evaluations,
+            "errors": self.errors,
+            "latency": latency,
+        }
+
+
+# Expose a default engine instance
+default_tick_engine = TickEngine()
@@ -0,0 +1,230 @@
+"""
+backend/tick_store.py
+
+Append-only columnar tick storage and memory-mapped replay.
+
+Layout (one directory per symbol, one pair of column files per UTC day):
+
+    {TICK_DIR}/{symbol}/{YYYYMMDD}.ts   -> little-endian int64 epoch milliseconds
+    {TICK_DIR}/{symbol}/{YYYYMMDD}.px   -> little-endian float64 prices
+
+- TickRecorder buffers ticks in memory and appends them to the column files in bulk
+  (one write per column per flush), so recording costs a list append per tick. The writes
+  run on one writer thread (in order), so a flush never blocks the event loop; flush() and
+  close() wait for them.
+- A crash between the two column writes leaves one file longer than the other. Replay
+  only reads the common length, and the recorder truncates both files back to it the first
+  time it appends to a day, so later appends stay row-aligned.
+- TickReplay memory-maps the column files and yields large NumPy slices, so replaying
+  is bounded by disk bandwidth rather than per-tick Python work.
+"""
+
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date, datetime, timezone
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+TICK_DIR = os.getenv("TICK_DIR", "./ticks")
+FLUSH_EVERY = int(os.getenv("TICK_FLUSH_EVERY", "4096"))  # buffered ticks per symbol before a flush
+
+TS_DTYPE = np.dtype("<i8")
+PX_DTYPE = np.dtype("<f8")
+MS_PER_DAY = 86_400_000
+
+DateLike = Union[date, str]
+
+
+def _day_key(day: DateLike) -> str:
+    if isinstance(day, str):
+        return day.replace("-", "")
+    return day.strftime("%Y%m%d")
+
+
+def _day_of_ms(ts_ms: int) -> str:
+    return datetime.fromtimestamp(ts_ms / 1000.0, tz=timezone.utc).strftime("%Y%m%d")
+
+
+def _safe_symbol(symbol: str) -> str:
+    # symbols are used as directory names
+    return "".join(c for c in symbol if c.isalnum() or c in ("_", "-", ".")) or "UNK"
+
+
+def column_paths(root: str, symbol: str, day: DateLike) -> Tuple[str, str]:
+    base = os.path.join(root, _safe_symbol(symbol), _day_key(day))
+    return base + ".ts", base + ".px"
+
+
+class TickRecorder:
+    def __init__(self, root: str = TICK_DIR, flush_every: int = FLUSH_EVERY):
+        self.root = root
+        self.flush_every = max(1, int(flush_every))
+        self._ts: Dict[str, List[int]] = {}
+        self._px: Dict[str, List[float]] = {}
+        self._writer: Optional[ThreadPoolExecutor] = None
+        self._pending: List[Future] = []
+        self._aligned: set = set()  # day files checked for a torn tail (writer thread only)
+
+    def record(self, symbol: str, epoch: float, price: float):
+        """
+        Buffer a single tick. `epoch` is in seconds (as sent by Deriv).
+        """
+        ts = self._ts.get(symbol)
+        if ts is None:
+            ts = self._ts[symbol] = []
+            self._px[symbol] = []
+        ts.append(int(round(float(epoch) * 1000)))
+        self._px[symbol].append(float(price))
+        if len(ts) >= self.flush_every:
+            self._hand_off(symbol)
+
+    def record_many(self, symbol: str, ts_ms: Sequence[int], prices: Sequence[float]):
+        """
+        Append a batch of ticks directly (timestamps in epoch ms, ascending).
+        """
+        self._hand_off(symbol)
+        self._submit(symbol, np.asarray(ts_ms, dtype=TS_DTYPE), np.asarray(prices, dtype=PX_DTYPE))
+        self._wait()
+
+    def flush(self, symbol: Optional[str] = None):
+        """
+        Write out buffered ticks and wait until they are on disk (blocking: from async code,
+        call it via asyncio.to_thread).
+        """
+        symbols = [symbol] if symbol is not None else list(self._ts.keys())
+        for sym in symbols:
+            self._hand_off(sym)
+        self._wait()
+
+    def close(self):
+        self.flush()
+        if self._writer is not None:
+            self._writer.shutdown(wait=True)
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _hand_off(self, symbol: str):
+        ts = self._ts.get(symbol)
+        if not ts:
+            return
+        px = self._px[symbol]
+        self._ts[symbol] = []
+        self._px[symbol] = []
+        self._submit(symbol, np.array(ts, dtype=TS_DTYPE), np.array(px, dtype=PX_DTYPE))
+
+    def _submit(self, symbol: str, ts: np.ndarray, px: np.ndarray):
+        if len(ts) != len(px):
+            raise ValueError("timestamp and price arrays differ in length")
+        if self._writer is None:
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tick-writer")
+        # surface errors of writes that already finished
+        done = [f for f in self._pending if f.done()]
+        self._pending = [f for f in self._pending if not f.done()]
+        self._pending.append(self._writer.submit(self._append, symbol, ts, px))
+        for f in done:
+            f.result()
+
+    def _wait(self):
+        pending, self._pending = self._pending, []
+        for f in pending:
+            f.result()
+
+    def _append(self, symbol: str, ts: np.ndarray, px: np.ndarray):
+        if not len(ts):
+            return
+        os.makedirs(os.path.join(self.root, _safe_symbol(symbol)), exist_ok=True)
+        # split the batch on UTC day boundaries (ts is ascending within a batch)
+        days = ts // MS_PER_DAY
+        cuts = np.flatnonzero(np.diff(days)) + 1
+        start = 0
+        for end in list(cuts) + [len(ts)]:
+            ts_path, px_path = column_paths(self.root, symbol, _day_of_ms(int(ts[start])))
+            if ts_path not in self._aligned:
+                _align(ts_path, px_path)
+                self._aligned.add(ts_path)
+            # price column is written last: replay trusts min(len(ts), len(px))
+            with open(ts_path, "ab") as f:
+                f.write(ts[start:end].tobytes())
+            with open(px_path, "ab") as f:
+                f.write(px[start:end].tobytes())
+            start = end
+
+
+class TickReplay:
+    def __init__(self, root: str = TICK_DIR):
+        self.root = root
+
+    def symbols(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(d for d in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, d)))
+
+    def days(self, symbol: str) -> List[str]:
+        d = os.path.join(self.root, _safe_symbol(symbol))
+        if not os.path.isdir(d):
+            return []
+        return sorted(name[:-3] for name in os.listdir(d) if name.endswith(".ts"))
+
+    def load(self, symbol: str, day: DateLike) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Memory-map one symbol-day. Returns read-only (ts_ms, prices) views; empty arrays if missing.
+        """
+        ts_path, px_path = column_paths(self.root, symbol, day)
+        n = min(_count(ts_path, TS_DTYPE), _count(px_path, PX_DTYPE))
+        if n == 0:
+            return np.empty(0, dtype=TS_DTYPE), np.empty(0, dtype=PX_DTYPE)
+        ts = np.memmap(ts_path, dtype=TS_DTYPE, mode="r", shape=(n,))
+        px = np.memmap(px_path, dtype=PX_DTYPE, mode="r", shape=(n,))
+        return ts, px
+
+    def iter_slices(
+        self,
+        symbols: Optional[Sequence[str]] = None,
+        start: Optional[DateLike] = None,
+        end: Optional[DateLike] = None,
+        chunk: int = 1 << 20,
+    ) -> Iterator[Tuple[str, np.ndarray, np.ndarray]]:
+        """
+        Yield (symbol, ts_ms, prices) slices of up to `chunk` ticks, symbol by symbol and
+        day by day (inclusive `start`..`end`). Slices are views into the memory maps.
+        """
+        lo = _day_key(start) if start is not None else None
+        hi = _day_key(end) if end is not None else None
+        for symbol in (symbols if symbols is not None else self.symbols()):
+            for day in self.days(symbol):
+                if (lo and day < lo) or (hi and day > hi):
+                    continue
+                ts, px = self.load(symbol, day)
+                for i in range(0, len(ts), chunk):
+                    yield symbol, ts[i:i + chunk], px[i:i + chunk]
+
+    def read_range(self, symbol: str, start: DateLike, end: DateLike) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Concatenate all ticks of `symbol` between `start` and `end` (inclusive days).
+        """
+        parts = [(ts, px) for _, ts, px in self.iter_slices([symbol], start, end, chunk=1 << 62)]
+        if not parts:
+            return np.empty(0, dtype=TS_DTYPE), np.empty(0, dtype=PX_DTYPE)
+        return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+
+def _align(ts_path: str, px_path: str):
+    """Cut both columns of a day back to their common row count (drops a torn tail)."""
+    n = min(_count(ts_path, TS_DTYPE), _count(px_path, PX_DTYPE))
+    for path, dtype in ((ts_path, TS_DTYPE), (px_path, PX_DTYPE)):
+        if os.path.exists(path) and os.path.getsize(path) != n * dtype.itemsize:
+            os.truncate(path, n * dtype.itemsize)
+
+
+def _count(path: str, dtype: np.dtype) -> int:
+    try:
+        return os.path.getsize(path) // dtype.itemsize
+    except OSError:
+        return 0
+
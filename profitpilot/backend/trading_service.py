@@ -7,26 +7,39 @@ Orchestration layer that:
 - executes orders (simulation) or delegates to a real exchange client
 - provides order and portfolio listing utilities
 
-This is intentionally simple and in-memory for development/demo. Replace execution
-with real exchange clients and persist to DB in production.
+This is intentionally simple for development/demo. Orders and positions live in
+shared_state (in-process by default, a shared SQLite file when SHARED_STATE_DB is set so
+several uvicorn workers see one order book and portfolio).
 """
 
 import asyncio
 import uuid
 import time
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Callable, Awaitable
 
 from .strategy_service import default_strategy_manager
-
-# In-memory stores (demo)
-_ORDER_STORE: Dict[str, Dict[str, Any]] = {}
-_PORTFOLIO: Dict[str, Dict[str, Any]] = {}
+from .live_feed import default_live_feed
+from .shared_state import default_shared_state
+from .metrics import OP_SECONDS, timed
 
 # Risk/account settings (can be wired to config/env)
 MAX_POSITION_PCT = float(0.5)   # max exposure per asset
 ACCOUNT_SIZE = float(10000.0)   # default demo account size (USD)
 MIN_ORDER_USD = float(10.0)
 
+# Live execution backend (e.g. DerivClient.place_order); None means simulate everything
+ExecutionBackend = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+_EXECUTION_BACKEND: Optional[ExecutionBackend] = None
+
+
+def set_execution_backend(backend: Optional[ExecutionBackend]):
+    """
+    Route non-dry-run orders to `backend` (an async callable order -> receipt).
+    Dry runs always go to the simulator.
+    """
+    global _EXECUTION_BACKEND
+    _EXECUTION_BACKEND = backend
+
 
 def calculate_order_size_usd(size_pct: float, account_size: Optional[float] = None) -> float:
     a = float(account_size or ACCOUNT_SIZE)
@@ -58,25 +71,28 @@ async def _simulate_exchange_fill(order: Dict[str, Any], dry_run: bool = True) -
         "filled_at": now if dry_run else None,
         "raw": {"simulated": True},
     }
-    # store
-    _ORDER_STORE[order_id] = receipt
+    _record_fill(order, receipt)
+    return receipt
+
+
+def _record_fill(order: Dict[str, Any], receipt: Dict[str, Any]):
+    order_id = receipt["order_id"]
     # update portfolio simply by exposure
     symbol = order.get("symbol")
-    if receipt["status"] == "filled" and symbol:
-        pos = _PORTFOLIO.get(symbol, {"position": 0.0, "usd_exposure": 0.0})
-        if order.get("action") == "buy":
-            pos["position"] += 1
-            pos["usd_exposure"] += receipt["usd_size"]
-        elif order.get("action") == "sell":
-            pos["position"] -= 1
-            pos["usd_exposure"] -= receipt["usd_size"]
-        _PORTFOLIO[symbol] = pos
-    return receipt
+    side = {"buy": 1, "sell": -1}.get(order.get("action"), 0)
+    if receipt["status"] == "filled" and symbol and side:
+        pos = default_shared_state.record_fill(receipt, symbol, side, side * float(receipt["usd_size"]))
+        default_live_feed.publish("position", symbol, dict(pos, symbol=symbol))
+    else:
+        default_shared_state.record_fill(receipt)
+    default_live_feed.publish("order", order_id, receipt)
 
 
+@timed(OP_SECONDS, "execute_order")
 async def execute_order(order: Dict[str, Any], dry_run: bool = True) -> Dict[str, Any]:
     """
-    Accepts an order dict and executes it (simulated).
+    Accepts an order dict and executes it (simulated, or via the live execution backend
+    when one is set and dry_run is False).
     Expected fields: symbol, action ('buy'/'sell'), usd_size, client_order_id (optional)
     """
     # Basic validations
@@ -89,17 +105,28 @@ async def execute_order(order: Dict[str, Any], dry_run: bool = True) -> Dict[str
     # Risk check
     if not risk_check(symbol, usd_size):
         return {"status": "rejected", "reason": "risk_check_failed"}
-    # Execute (simulate)
-    receipt = await _simulate_exchange_fill(order, dry_run=dry_run)
+    if dry_run or _EXECUTION_BACKEND is None:
+        return await _simulate_exchange_fill(order, dry_run=dry_run)
+    receipt = await _EXECUTION_BACKEND(order)
+    _record_fill(order, receipt)
     return receipt
 
 
-async def evaluate_and_trade(strategy_name: str, market_state: Dict[str, Any], dry_run: bool = True) -> Dict[str, Any]:
+async def evaluate_and_trade(strategy_name: str, market_state: Dict[str, Any], dry_run: bool = True,
+                             timings: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
     """
     Evaluate a strategy, create an order proposal, risk-check and execute.
     Returns {"signal": ..., "order_proposal": ..., "execute_receipt": ...}
+    If `timings` is given it is filled with per-stage durations in seconds
+    ("evaluate", "risk", "execute").
     """
+    t0 = time.perf_counter()
     signal = default_strategy_manager.evaluate(strategy_name, market_state)
+    t1 = time.perf_counter()
+    OP_SECONDS.observe(t1 - t0, "strategy_evaluate")
+    if timings is not None:
+        timings["evaluate"] = t1 - t0
+    default_live_feed.publish("signal", f"{strategy_name}:{signal.get('symbol')}", dict(signal, strategy=strategy_name))
     action = signal.get("action", "hold")
     symbol = signal.get("symbol", market_state.get("symbol"))
     size_pct = float(signal.get("size_pct", 0.0))
@@ -124,6 +151,9 @@ async def evaluate_and_trade(strategy_name: str, market_state: Dict[str, Any], d
     if not risk_check(symbol, usd_size):
         proposal["reason"] = "risk_check_failed"
         return {"signal": signal, "order_proposal": proposal, "execute_receipt": None}
+    t2 = time.perf_counter()
+    if timings is not None:
+        timings["risk"] = t2 - t1
 
     receipt = await execute_order({
         "symbol": symbol,
@@ -131,14 +161,16 @@ async def evaluate_and_trade(strategy_name: str, market_state: Dict[str, Any], d
         "usd_size": usd_size,
         "client_order_id": proposal["client_order_id"]
     }, dry_run=dry_run)
+    if timings is not None:
+        timings["execute"] = time.perf_counter() - t2
 
     proposal["approved"] = receipt.get("status") in ("filled", "submitted")
     return {"signal": signal, "order_proposal": proposal, "execute_receipt": receipt}
 
 
 def list_orders() -> Dict[str, Dict[str, Any]]:
-    return dict(_ORDER_STORE)
+    return default_shared_state.list_orders()
 
 
 def get_portfolio() -> Dict[str, Dict[str, Any]]:
-    return dict(_PORTFOLIO)
+    return default_shared_state.get_portfolio()
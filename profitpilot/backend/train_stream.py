@@ -0,0 +1,107 @@
+"""
+backend/train_stream.py
+
+Turn a streamed request body into fixed-size (X, y) mini-batches for /train/stream, so a
+multi-GB upload is trained on in constant memory: at most one network chunk plus one batch
+is held at a time, and the next chunk is not read until the current batch has been fitted
+(TCP backpressure slows the client down instead of the server buffering).
+
+Two body formats:
+- NDJSON (application/x-ndjson): one row per line, {"x": [f1, ..., fk], "y": target}.
+  Rows may have different widths; the learner pads/truncates them.
+- Binary rows (application/x-profitpilot-rows, ?features=k): back-to-back rows of k + 1
+  little-endian float64 values, the k features followed by the target. No framing, so a
+  row may be split across network chunks.
+"""
+
+import json
+import math
+import os
+from typing import AsyncIterator, List, Tuple, Union
+
+import numpy as np
+
+NDJSON_TYPES = ("application/x-ndjson", "application/jsonl", "application/json-seq")
+ROWS_CONTENT_TYPE = "application/x-profitpilot-rows"
+MAX_LINE_BYTES = int(os.getenv("TRAIN_STREAM_MAX_LINE", str(1 << 20)))
+
+Batch = Tuple[Union[np.ndarray, List[List[float]]], np.ndarray]
+
+
+class StreamFormatError(ValueError):
+    def __init__(self, message: str, row: int):
+        super().__init__(f"row {row}: {message}")
+        self.row = row
+
+
+def _ndjson_row(line: bytes, row: int) -> Tuple[List[float], float]:
+    try:
+        obj = json.loads(line)
+        x, y = obj["x"], float(obj["y"])
+        if not isinstance(x, list):
+            raise TypeError("x must be a list")
+        x = [float(v) for v in x]
+    except (ValueError, TypeError, KeyError, OverflowError) as e:
+        raise StreamFormatError(f"expected {{\"x\": [...], \"y\": number}} ({e})", row)
+    # json.loads takes NaN, Infinity and 1e400; keep them out of the scaler like the binary path
+    if not (math.isfinite(y) and all(math.isfinite(v) for v in x)):
+        raise StreamFormatError("NaN or inf", row)
+    return x, y
+
+
+async def ndjson_batches(chunks: AsyncIterator[bytes], batch_size: int) -> AsyncIterator[Batch]:
+    """X comes out as a list of rows (possibly ragged); the learner pads them to its width."""
+    pending = b""
+    xs: List[List[float]] = []
+    ys: List[float] = []
+    row = 0
+    async for chunk in chunks:
+        pending += chunk
+        lines = pending.split(b"\n")
+        pending = lines.pop()
+        if len(pending) > MAX_LINE_BYTES:
+            raise StreamFormatError(f"line longer than {MAX_LINE_BYTES} bytes", row + 1)
+        for line in lines:
+            if not line.strip():
+                continue
+            row += 1
+            x, y = _ndjson_row(line, row)
+            xs.append(x)
+            ys.append(y)
+            if len(xs) == batch_size:
+                yield xs, np.asarray(ys, dtype=float)
+                xs, ys = [], []
+    if pending.strip():
+        row += 1
+        x, y = _ndjson_row(pending, row)
+        xs.append(x)
+        ys.append(y)
+    if xs:
+        yield xs, np.asarray(ys, dtype=float)
+
+
+async def row_batches(chunks: AsyncIterator[bytes], features: int, batch_size: int) -> AsyncIterator[Batch]:
+    width = features + 1
+    batch_bytes = batch_size * width * 8
+    buf = bytearray()
+    rows = 0
+
+    def take(nbytes: int) -> Batch:
+        # copy out of the bytearray (it is resized right after, which a live view would block)
+        block = np.frombuffer(bytes(buf[:nbytes]), dtype="<f8").reshape(-1, width)
+        del buf[:nbytes]
+        if not np.isfinite(block).all():
+            bad = int(np.flatnonzero(~np.isfinite(block).all(axis=1))[0])
+            raise StreamFormatError("NaN or inf", rows + bad + 1)
+        return block[:, :features], block[:, features]
+
+    async for chunk in chunks:
+        buf += chunk
+        while len(buf) >= batch_bytes:
+            X, y = take(batch_bytes)
+            rows += len(y)
+            yield X, y
+    if len(buf) % (width * 8):
+        raise StreamFormatError(f"body ends mid-row ({len(buf) % (width * 8)} trailing bytes)", rows + len(buf) // (width * 8) + 1)
+    if buf:
+        yield take(len(buf))
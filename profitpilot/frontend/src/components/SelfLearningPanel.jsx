@@ -5,8 +5,8 @@ import React, { useState } from "react";
  * SelfLearningPanel.jsx
  *
  * Basic UI to:
- * - send training batches to backend /train
- * - request a prediction from /predict
+ * - send training batches to backend /api/train
+ * - request a prediction from /api/predict
  *
  * Note: This demo expects your backend to be running on the same origin or CORS enabled.
  */
@@ -26,7 +26,7 @@ export default function SelfLearningPanel() {
     setPredictResult(null);
     const features = parseFeatures(featuresText);
     try {
-      const resp = await fetch("/predict", {
+      const resp = await fetch("/api/predict", {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
@@ -47,7 +47,7 @@ export default function SelfLearningPanel() {
     const features = parseFeatures(featuresText);
     const y = [parseFloat(label)];
     try {
-      const resp = await fetch("/train", {
+      const resp = await fetch("/api/train", {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
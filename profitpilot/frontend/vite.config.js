@@ -6,12 +6,8 @@ export default defineConfig({
   server: {
     port: 5173,
     proxy: {
-      "/trade": "http://localhost:8000",
-      "/train": "http://localhost:8000",
-      "/predict": "http://localhost:8000",
-      "/orders": "http://localhost:8000",
-      "/portfolio": "http://localhost:8000",
-      "/strategies": "http://localhost:8000"
+      // trading API is mounted at /api by backend.app.create_app
+      "/api": "http://localhost:8000"
     }
   }
 });
@@ -0,0 +1,58 @@
+import pytest
+from fastapi import HTTPException
+
+from profitpilot.backend import auth_utils
+from profitpilot.backend.auth_utils import VerifiedTokenCache, create_jwt_token
+from profitpilot.backend.shared_state import SQLiteState
+
+
+@pytest.fixture
+def workers(tmp_path):
+    """Two workers' token caches over one shared state file."""
+    state = SQLiteState(str(tmp_path / "state.db"))
+    return VerifiedTokenCache(state=state), VerifiedTokenCache(state=SQLiteState(state.path))
+
+
+@pytest.fixture
+def verify(monkeypatch):
+    """verify_token_cached as run by the worker owning `cache`."""
+    def run(cache, token):
+        monkeypatch.setattr(auth_utils, "default_token_cache", cache)
+        return auth_utils.verify_token_cached(token)
+    return run
+
+
+def test_logout_on_one_worker_rejects_cached_token_on_another(workers, verify):
+    a, b = workers
+    token = create_jwt_token("alice")
+    verify(a, token)
+    verify(b, token)  # now cached on b
+    a.revoke(a.digest(token))
+    with pytest.raises(HTTPException):
+        verify(b, token)
+
+
+def test_subject_revocation_spares_tokens_issued_after(workers, verify):
+    a, b = workers
+    old = create_jwt_token("bob")
+    verify(b, old)
+    a.revoke_subject("bob")
+    new = create_jwt_token("bob")
+    with pytest.raises(HTTPException):
+        verify(b, old)
+    assert verify(b, new)["sub"] == "bob"
+
+
+def test_expired_revocations_are_pruned(workers):
+    a, _ = workers
+    a.state.revoke_token(b"old", 1.0)
+    a.state.revoke_subject("carol", 1.0, 2.0)
+    a.revoke_subject("dave")
+    c = a.state._conn()
+    assert c.execute("select count(*) from revoked_tokens").fetchone()[0] == 0
+    assert [r[0] for r in c.execute("select subject from revoked_subjects")] == ["dave"]
+
+
+def test_token_lifetime_above_cap_is_refused():
+    with pytest.raises(ValueError):
+        create_jwt_token("eve", expires_seconds=auth_utils.MAX_EXPIRES_SECONDS + 1)
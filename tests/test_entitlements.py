@@ -0,0 +1,51 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from backend import entitlements
+
+
+class FakeStorage:
+    def __init__(self, active_until):
+        self.active_until = active_until
+        self.reads = 0
+
+    async def get_entitlement(self, user_id):
+        self.reads += 1
+        return {"user_id": user_id, "plan": "1m", "active_until": self.active_until}
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    def make(delta):
+        st = FakeStorage((datetime.now(timezone.utc) + delta).isoformat())
+        monkeypatch.setattr(entitlements, "get_storage", lambda: st)
+        return st
+    entitlements.clear()
+    yield make
+    entitlements.clear()
+
+
+def test_lapsed_user_is_read_once_per_negative_ttl(storage):
+    st = storage(timedelta(days=-1))
+    for _ in range(100):
+        assert asyncio.run(entitlements.is_entitled("u1")) is False
+    assert st.reads == 1
+
+
+def test_active_user_is_cached(storage):
+    st = storage(timedelta(days=1))
+    for _ in range(100):
+        assert asyncio.run(entitlements.is_entitled("u1")) is True
+    assert st.reads == 1
+
+
+def test_entry_lapsing_in_cache_is_dropped_after_negative_ttl(storage, monkeypatch):
+    monkeypatch.setattr(entitlements, "NEGATIVE_CACHE_TTL", 0.05)
+    st = storage(timedelta(seconds=0.05))
+    assert asyncio.run(entitlements.is_entitled("u1")) is True
+    # past its end plus the negative TTL: re-read, so a renewal elsewhere would show up
+    asyncio.run(asyncio.sleep(0.15))
+    assert asyncio.run(entitlements.is_entitled("u1")) is False
+    assert st.reads == 2
@@ -0,0 +1,115 @@
+"""
+Two uvicorn workers on one SHARED_STATE_DB: trades made through either worker show up in
+both workers' order book and portfolio, and exactly one worker holds the tick-engine lease.
+"""
+
+import asyncio
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+
+import httpx
+import pytest
+
+from profitpilot.backend import auth_utils
+
+WORKERS = 2
+BUY = {"strategy": "momentum_v1", "market_state": {"symbol": "R_100", "prices": [100, 101, 105]}}
+SELL = {"strategy": "momentum_v1", "market_state": {"symbol": "R_100", "prices": [105, 101, 100]}}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture(scope="module")
+def server(tmp_path_factory):
+    tmp = tmp_path_factory.mktemp("multiworker")
+    env = dict(os.environ, SHARED_STATE_DB=str(tmp / "state.db"), MODEL_DIR=str(tmp / "models"),
+               WEB_CONCURRENCY=str(WORKERS), TICK_ENGINE_LEASE="3", JWT_SECRET=auth_utils.SECRET_KEY)
+    for k in ("EXECUTION_BACKEND", "DERIV_TICK_SYMBOLS"):
+        env.pop(k, None)
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "profitpilot.backend.main:app", "--port", str(port),
+         "--workers", str(WORKERS), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        deadline = time.time() + 60
+        while True:
+            try:
+                if httpx.get(f"{base}/health", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.time() > deadline or proc.poll() is not None:
+                pytest.fail("uvicorn did not start")
+            time.sleep(0.3)
+        time.sleep(2.0)  # every worker through startup and one lease round
+        yield base, env["SHARED_STATE_DB"]
+    finally:
+        proc.terminate()
+        proc.wait(10)
+
+
+@pytest.fixture(scope="module")
+def headers():
+    return {"Authorization": f"Bearer {auth_utils.create_jwt_token('multiworker-test')}"}
+
+
+def _fresh(method, url, headers, **kw):
+    # a new connection per call, so requests are spread over the workers
+    with httpx.Client(timeout=30) as c:
+        r = c.request(method, url, headers=headers, **kw)
+        r.raise_for_status()
+        return r.json()
+
+
+def _workers_stats(base, headers):
+    """/engine/stats per worker id, polling until every worker has answered."""
+    seen = {}
+    for _ in range(200):
+        s = _fresh("GET", f"{base}/engine/stats", headers)
+        seen[s["worker"]] = s
+        if len(seen) == WORKERS:
+            break
+    return seen
+
+
+def test_trades_agree_across_workers(server, headers):
+    base, _ = server
+
+    async def trade_all():
+        async def one(body):
+            async with httpx.AsyncClient(timeout=30) as c:
+                r = await c.post(f"{base}/trade", json=body, headers=headers)
+                r.raise_for_status()
+        await asyncio.gather(*[one(BUY) for _ in range(20)], *[one(SELL) for _ in range(10)])
+
+    asyncio.run(trade_all())
+    views = set()
+    for _ in range(12):
+        orders = _fresh("GET", f"{base}/orders", headers)["orders"]
+        position = _fresh("GET", f"{base}/portfolio", headers)["portfolio"]["R_100"]["position"]
+        views.add((len(orders), position))
+    assert views == {(30, 10)}
+
+
+def test_tick_engine_lease_has_one_holder(server, headers):
+    base, db = server
+    stats = _workers_stats(base, headers)
+    assert len(stats) == WORKERS, "requests never reached every worker"
+    leaders = [w for w, s in stats.items() if s["leader"]]
+    assert len(leaders) == 1
+    assert stats[leaders[0]]["running"] is True
+    assert all(s["running"] is False for w, s in stats.items() if w != leaders[0])
+    with sqlite3.connect(db) as c:
+        rows = c.execute("select owner from leases where name = 'tick_engine'").fetchall()
+    assert rows == [(leaders[0],)]
@@ -0,0 +1,115 @@
+import socketserver
+import threading
+import time
+
+import pytest
+
+from backend import emailer, outbox
+from backend.emailer import DeliveryUnknown, SMTPSession
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: EHLO, AUTH, MAIL, RCPT, DATA, RSET, QUIT."""
+
+    def handle(self):
+        srv = self.server
+        say = lambda line: self.wfile.write(line.encode() + b"\r\n")
+        say("220 fake")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            cmd = line.decode().strip().upper()
+            if cmd.startswith("EHLO"):
+                say("250-fake")
+                say("250 AUTH PLAIN LOGIN")
+            elif cmd.startswith("AUTH"):
+                say("235 ok")
+            elif cmd.startswith("MAIL"):
+                if srv.drop_next_mail:
+                    srv.drop_next_mail = False
+                    return  # stale pooled connection
+                say("250 ok")
+            elif cmd.startswith("RCPT"):
+                say(srv.rcpt_reply)
+            elif cmd == "DATA":
+                say("354 go")
+                body = b""
+                while not body.endswith(b"\r\n.\r\n"):
+                    body += self.rfile.readline()
+                srv.received.append(body)
+                if srv.hang_after_data:
+                    time.sleep(1.0)  # past SMTP_TIMEOUT: the client can't know it was queued
+                    return
+                say("250 queued")
+            elif cmd == "QUIT":
+                say("221 bye")
+                return
+            else:
+                say("250 ok")
+
+
+@pytest.fixture
+def smtp(monkeypatch):
+    srv = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _Handler)
+    srv.daemon_threads = True
+    srv.received, srv.rcpt_reply, srv.drop_next_mail, srv.hang_after_data = [], "250 ok", False, False
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    monkeypatch.setattr(emailer, "SMTP_HOST", "127.0.0.1")
+    monkeypatch.setattr(emailer, "SMTP_PORT", srv.server_address[1])
+    monkeypatch.setattr(emailer, "SMTP_TLS", False)
+    monkeypatch.setattr(emailer, "SMTP_TIMEOUT", 0.3)
+    monkeypatch.setattr(emailer, "SMTP_USER", "u")
+    monkeypatch.setattr(emailer, "SMTP_PASS", "p")
+    monkeypatch.setattr(emailer, "SMTP_FROM", "from@example.com")
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.fixture
+def box(tmp_path):
+    ob = outbox.Outbox(str(tmp_path / "outbox.db"))
+    ob._session = SMTPSession()
+    yield ob
+    ob._session.close()
+
+
+def _status(ob, row_id):
+    return ob.db.conn().execute("select status from outbox where id = ?", (row_id,)).fetchone()[0]
+
+
+def test_stale_pooled_connection_is_retried_once(smtp):
+    s = SMTPSession()
+    s.send("a@example.com", "s", "<p>1</p>")
+    smtp.drop_next_mail = True
+    s.send("a@example.com", "s", "<p>2</p>")
+    s.close()
+    assert len(smtp.received) == 2
+
+
+def test_timeout_after_data_is_not_resent(smtp, box):
+    smtp.hang_after_data = True
+    with pytest.raises(DeliveryUnknown):
+        box._session.send("a@example.com", "s", "<p>x</p>")
+    row_id = box.enqueue("b@example.com", "s", "<p>y</p>")
+    box.drain_once()
+    assert _status(box, row_id) == "unknown"
+    assert box.claim(now=time.time() + 10 ** 6) == []
+    assert len(smtp.received) == 2  # one per message, none twice
+
+
+@pytest.mark.parametrize("reply, status", [("451 try later", "pending"), ("550 no such user", "dead")])
+def test_refused_recipient_follows_reply_class(smtp, box, reply, status):
+    smtp.rcpt_reply = reply
+    row_id = box.enqueue("a@example.com", "s", "<p>x</p>")
+    box.drain_once()
+    assert _status(box, row_id) == status
+    assert smtp.received == []
+
+
+def test_connect_failure_is_retried(smtp, box, monkeypatch):
+    monkeypatch.setattr(emailer, "SMTP_PORT", 1)  # nothing listens there
+    row_id = box.enqueue("a@example.com", "s", "<p>x</p>")
+    box.drain_once()
+    assert _status(box, row_id) == "pending"
@@ -0,0 +1,41 @@
+import json
+import struct
+
+import pytest
+from fastapi.testclient import TestClient
+
+from profitpilot.backend import packed
+from profitpilot.backend.auth_utils import create_jwt_token
+from profitpilot.backend.main import app
+
+
+@pytest.fixture(scope="module")
+def client():
+    c = TestClient(app)
+    c.headers["Authorization"] = f"Bearer {create_jwt_token('test')}"
+    return c
+
+
+def _post_trade(client, strategy, prices):
+    body = packed.encode({"strategy": strategy, "dry_run": True}, {"prices": prices})
+    return client.post("/trade", content=body, headers={"Content-Type": packed.CONTENT_TYPE})
+
+
+@pytest.mark.parametrize("strategy", ["momentum_v1", "mean_reversion_v1"])
+@pytest.mark.parametrize("bad", [float("nan"), float("inf")])
+def test_trade_rejects_non_finite_packed_prices(client, strategy, bad):
+    r = _post_trade(client, strategy, [1.0, 1.1, bad, 1.3])
+    assert r.status_code == 400, r.text
+
+
+def test_trade_accepts_finite_packed_prices(client):
+    r = _post_trade(client, "momentum_v1", [1.0, 1.1, 1.2, 1.3])
+    assert r.status_code == 200, r.text
+
+
+def test_decode_rejects_overflowing_shape():
+    # 2**32 * 2**32 wraps to 0 in int64 arithmetic
+    header = json.dumps({"arrays": [["x", [2 ** 32, 2 ** 32]]]}).encode()
+    body = packed.MAGIC + struct.pack("<I", len(header)) + header + b"\0" * (-len(header) % 8) + b"\0" * 16
+    with pytest.raises(packed.PackedError, match="truncated data"):
+        packed.decode(body)
@@ -0,0 +1,38 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from backend.storage import SQLiteStorage, Storage
+
+
+def test_backend_missing_a_method_fails_at_construction():
+    class Partial(Storage):
+        async def get_user(self, field, value):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_sqlite_write_waiting_on_a_lock_does_not_block_the_loop(tmp_path):
+    st = SQLiteStorage(str(tmp_path / "app.db"))
+    st._c()  # schema
+    other = sqlite3.connect(str(tmp_path / "app.db"), isolation_level=None)  # another worker
+    other.execute("begin immediate")
+
+    async def run():
+        ticks = 0
+        write = asyncio.ensure_future(st.add_login_attempt("1.2.3.4"))
+        t0 = time.monotonic()
+        while time.monotonic() - t0 < 0.3:
+            await asyncio.sleep(0.01)
+            ticks += 1
+        assert not write.done()
+        other.execute("commit")
+        await write
+        return ticks
+
+    assert asyncio.run(run()) >= 10
+    assert other.execute("select count(*) from login_attempts").fetchone()[0] == 1
@@ -0,0 +1,34 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from profitpilot.backend.auth_utils import create_jwt_token
+from profitpilot.backend.main import app
+
+FLAT = [1.0, 1.0, 1.0, 1.0]
+ZERO = [0.0, 0.0, 0.0, 0.0]
+
+
+@pytest.fixture(scope="module")
+def client():
+    c = TestClient(app)
+    c.headers["Authorization"] = f"Bearer {create_jwt_token('test')}"
+    return c
+
+
+@pytest.mark.parametrize("strategy", ["momentum_spec_v1", "mean_reversion_spec_v1"])
+@pytest.mark.parametrize("prices", [FLAT, ZERO], ids=["flat", "zero"])
+def test_trade_degenerate_prices_hold(client, strategy, prices):
+    r = client.post("/trade", json={"strategy": strategy, "market_state": {"symbol": "R_100", "prices": prices}})
+    assert r.status_code == 200, r.text
+    assert r.json()["signal"]["action"] == "hold"
+
+
+@pytest.mark.parametrize("strategy", ["momentum_spec_v1", "mean_reversion_spec_v1"])
+def test_scan_degenerate_symbol_does_not_fail_batch(client, strategy):
+    prices = {"FLAT": FLAT, "ZERO": ZERO, "UP": [1.0, 1.1, 1.2, 1.3]}
+    r = client.post("/scan", json={"strategy": strategy, "prices": prices})
+    assert r.status_code == 200, r.text
+    signals = r.json()["signals"]
+    assert set(signals) == set(prices)
+    for sym in ("FLAT", "ZERO"):
+        assert signals[sym]["action"] == "hold"